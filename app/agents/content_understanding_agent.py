@@ -1,23 +1,31 @@
 # app/agents/content_understanding_agent.py
-import os, json
-from typing import Dict, Any, List
+import os, json, time, shutil, threading, traceback
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Any, List, Optional
+import torch
 from PIL import Image
-from transformers import BlipForConditionalGeneration, BlipProcessor
 
-from app.services.video import process_video
-from app.services.asr import transcribe_to_srt
+from app.services.video import dedupe_params, duplicate_groups, frame_hashes, process_video, scene_params
+from app.services.analysis_cache import analysis_cache
+from app.services.asr import ASR_MODE, ASR_SPLIT, asr_params, transcribe_to_srt
+from app.services.metrics import bind, span
+from app.services.models import BLIP_MODEL, MODEL_MEMORY_MB, get_blip
+
+BLIP_BATCH_SIZE = int(os.getenv("BLIP_BATCH_SIZE", "4"))
 
 class ContentUnderstandingAgent:
     """
     Tek ajan içinde:
       - Video: sahne & keyframe
-      - Audio: Whisper -> SRT
+      - Audio: Whisper -> SRT (video/BLIP zinciriyle paralel)
       - Image: BLIP caption & tags
     """
 
-    def __init__(self, blip_model: str = "Salesforce/blip-image-captioning-base"):
-        self.processor = BlipProcessor.from_pretrained(blip_model)
-        self.model = BlipForConditionalGeneration.from_pretrained(blip_model)
+    def __init__(self, blip_model: str = BLIP_MODEL):
+        # BLIP ilk caption'da yüklenir: analysis_cache hit'i modeli hiç yüklemez
+        self.blip_model = blip_model
 
     @staticmethod
     def _tags_from_caption(caption: str) -> List[str]:
@@ -26,44 +34,269 @@ class ContentUnderstandingAgent:
                 "bir","ile","ve","için","bu"}
         return list(dict.fromkeys([w for w in words if len(w) >= 3 and w.isalpha() and w not in stop]))[:10]
 
-    def _vision(self, job_dir: str) -> Dict[str, Any]:
+    def _caption_batch(self, images: List[Image.Image]) -> List[str]:
+        # model süreç başına bir kez yüklenir (app.services.models.registry)
+        processor, model = get_blip(self.blip_model)
+        inputs = processor(images=images, return_tensors="pt")
+        with torch.inference_mode():
+            out = model.generate(**inputs, max_new_tokens=30)
+        return [processor.decode(o, skip_special_tokens=True).strip() for o in out]
+
+    def _vision(self, job_dir: str, batch_size: Optional[int] = None) -> Dict[str, Any]:
+        batch_size = max(1, batch_size or BLIP_BATCH_SIZE)
         frames_dir = os.path.join(job_dir, "results", "frames")
         frames = []
         if os.path.isdir(frames_dir):
             frames = [os.path.join(frames_dir, f) for f in sorted(os.listdir(frames_dir))
                       if f.lower().endswith((".jpg",".png"))][:12]
-        captions = []
+        loaded = []
         for fp in frames:
             try:
-                img = Image.open(fp).convert("RGB")
-                inputs = self.processor(img, return_tensors="pt")
-                out = self.model.generate(**inputs, max_new_tokens=30)
-                text = self.processor.decode(out[0], skip_special_tokens=True).strip()
-                captions.append({"frame": fp, "caption": text, "tags": self._tags_from_caption(text)})
+                loaded.append((fp, Image.open(fp).convert("RGB")))
             except Exception:
                 continue
 
+        # yakın kopyalar (menü, tekrar eden HUD) için BLIP yalnızca temsilciyi yazar
+        with span("frame_dedupe", frames=len(loaded)):
+            rep = duplicate_groups(frame_hashes([img for _, img in loaded]))
+        unique = [item for i, item in enumerate(loaded) if rep[i] == i]
+
+        if unique:
+            get_blip(self.blip_model)   # yükleme süresi batch ölçümlerine karışmasın
+        by_frame: Dict[str, Dict[str, Any]] = {}
+        batches = []
+        for i in range(0, len(unique), batch_size):
+            chunk = unique[i:i + batch_size]
+
+            t0 = time.perf_counter()
+            with span("blip_caption", kind="model", frames=len(chunk)):
+                try:
+                    texts = self._caption_batch([img for _, img in chunk])
+                except Exception:
+                    # batch patlarsa kare kare dene: bozuk bir kare diğerlerini düşürmesin
+                    texts = []
+                    for _, img in chunk:
+                        try:
+                            texts.append(self._caption_batch([img])[0])
+                        except Exception:
+                            texts.append(None)
+            batches.append({"size": len(chunk), "seconds": round(time.perf_counter() - t0, 3)})
+
+            for (fp, _), text in zip(chunk, texts):
+                if text is not None:
+                    by_frame[fp] = {"frame": fp, "caption": text, "tags": self._tags_from_caption(text)}
+
+        captions = []
+        for i, (fp, _) in enumerate(loaded):
+            src = by_frame.get(loaded[rep[i]][0])
+            if src is None:
+                continue
+            captions.append(src if rep[i] == i else {**src, "frame": fp, "duplicate_of": src["frame"]})
+
         agg_tags = []
         for c in captions:
             for t in c["tags"]:
                 if t not in agg_tags:
                     agg_tags.append(t)
-        return {"frames": frames, "captions": captions, "tags": agg_tags[:15]}
+        groups: Dict[str, List[str]] = {}
+        for i, (fp, _) in enumerate(loaded):
+            groups.setdefault(loaded[rep[i]][0], []).append(fp)
+        failed = len(unique) - len(by_frame)
+        return {"frames": frames, "captions": captions, "tags": agg_tags[:15], "caption_failed": failed,
+                "dedupe": {**dedupe_params(), "skipped": len(loaded) - len(unique),
+                           "groups": [g for g in groups.values() if len(g) > 1]},
+                "timing": {"batch_size": batch_size, "batches": batches}}
+
+    def _analyze(self, job_dir: str, video_path: str, whisper_model: str, lang: str) -> Dict[str, Any]:
+        # Audio -> transcript + SRT, sahne/kare/BLIP zinciriyle paralel çalışır
+        # (ASR_SPLIT=scenes ise sahne sınırlarını bekler, BLIP ile paralel kalır)
+        after_scenes = ASR_MODE == "chunked" and ASR_SPLIT == "scenes"
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="asr") as ex:
+            if not after_scenes:
+                asr = ex.submit(bind(transcribe_to_srt), job_dir, video_path, model_name=whisper_model, language=lang)
+
+            # 1) Video sahneleri & keyframe
+            scenes = process_video(job_dir, video_path)
+            if after_scenes:
+                asr = ex.submit(bind(transcribe_to_srt), job_dir, video_path, model_name=whisper_model, language=lang,
+                                scene_times=[s["start"] for s in scenes[1:]])
+
+            # 2) Image understanding (BLIP)
+            vision_data = self._vision(job_dir)
+
+            # 3) ASR'ı bekle
+            srt_path = asr.result()
+        return {"scenes": scenes, "srt_path": srt_path, "vision": vision_data}
 
     def run(self, job_dir: str, video_path: str, whisper_model="base", lang="tr") -> Dict[str, Any]:
         results_dir = os.path.join(job_dir, "results")
         os.makedirs(results_dir, exist_ok=True)
 
-        # 1) Video sahneleri & keyframe
-        scenes = process_video(job_dir, video_path)
+        # aynı video + aynı model/parametreler daha önce analiz edildiyse önbellekten geri yükle
+        key = analysis_cache.key(video_path, whisper_model=whisper_model, lang=lang,
+                                 blip=self.blip_model, scenes=scene_params(), asr=asr_params(),
+                                 dedupe=dedupe_params())
+        with analysis_cache.claim(key):
+            data = analysis_cache.restore(key, job_dir)
+            hit = data is not None
+            if not hit:
+                data = self._analyze(job_dir, video_path, whisper_model, lang)
+                # BLIP caption'ı düşen kare varsa (OOM vb. geçici hata) sonuç önbelleğe
+                # yazılmaz; yoksa boş/eksik vision bu video için kalıcı hit olurdu
+                if not data["vision"]["caption_failed"]:
+                    analysis_cache.store(key, job_dir, data)
 
-        # 2) Audio -> transcript + SRT
-        srt_path = transcribe_to_srt(job_dir, video_path, model_name=whisper_model, language=lang)
-
-        # 3) Image understanding (BLIP)
-        vision_data = self._vision(job_dir)
-
-        data = {"scenes": scenes, "srt_path": srt_path, "vision": vision_data}
+        data["cache"] = {"key": key, "hit": hit}
         with open(os.path.join(results_dir, "content_understanding.json"), "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
         return data
+
+
+# ---- Çoklu video --------------------------------------------------------------
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", "0"))   # 0 = çekirdek sayısı
+VIDEO_WORKER_MODEL_MB = int(os.getenv("VIDEO_WORKER_MODEL_MB", "1500"))   # worker başına BLIP+Whisper tahmini
+
+_VIDEO_POOL: Optional[ProcessPoolExecutor] = None
+_VIDEO_POOL_LOCK = threading.Lock()
+
+def _video_pool_size() -> int:
+    workers = VIDEO_WORKERS or os.cpu_count() or 1
+    if MODEL_MEMORY_MB > 0:
+        # her worker modelleri ayrı tutar: bellek bütçesine sığan kadar worker
+        workers = min(workers, MODEL_MEMORY_MB // max(1, VIDEO_WORKER_MODEL_MB))
+    return max(1, workers)
+
+def _video_worker_init(threads: int) -> None:
+    # N worker x tüm çekirdekler = aşırı abonelik; çekirdekler worker'lar arasında bölünür
+    torch.set_num_threads(threads)
+
+def _video_pool() -> ProcessPoolExecutor:
+    """
+    Süreç ömürlü havuz: worker'lar BLIP/Whisper'ı bir kez yükler, job'lar arasında
+    tutar (asr._pool gibi). Worker'lar ihtiyaç oldukça başlatılır; bir job en
+    fazla video sayısı kadar worker kullanır.
+    """
+    global _VIDEO_POOL
+    with _VIDEO_POOL_LOCK:
+        if _VIDEO_POOL is None:
+            size = _video_pool_size()
+            # fork + torch thread'leri kilitlenebilir; spawn ile temiz süreç
+            _VIDEO_POOL = ProcessPoolExecutor(max_workers=size, mp_context=mp.get_context("spawn"),
+                                              initializer=_video_worker_init,
+                                              initargs=(max(1, (os.cpu_count() or 1) // size),))
+        return _VIDEO_POOL
+
+def _reset_video_pool() -> None:
+    """Çöken (BrokenProcessPool) havuz bir sonraki job'da yeniden kurulur."""
+    global _VIDEO_POOL
+    with _VIDEO_POOL_LOCK:
+        if _VIDEO_POOL is not None:
+            _VIDEO_POOL.shutdown(wait=False, cancel_futures=True)
+            _VIDEO_POOL = None
+
+def _analyze_video_worker(sub_dir: str, video_path: str, whisper_model: str, lang: str) -> Dict[str, Any]:
+    """Process pool içinde tek video; hata traceback'i string olarak döner (picklable)."""
+    try:
+        data = ContentUnderstandingAgent().run(sub_dir, video_path, whisper_model=whisper_model, lang=lang)
+        return {"ok": True, "data": data}
+    except Exception as e:
+        return {"ok": False, "error": "".join(traceback.format_exception(type(e), e, e.__traceback__))}
+
+def _interleave(lists: List[List[str]], limit: int) -> List[str]:
+    """Her videodan sırayla bir tag alarak birleştirir (ilk video listeyi doldurmasın)."""
+    out: List[str] = []
+    for i in range(max((len(x) for x in lists), default=0)):
+        for tags in lists:
+            if i < len(tags) and tags[i] not in out:
+                out.append(tags[i])
+    return out[:limit]
+
+def analyze_videos(job_dir: str, video_paths: List[str], whisper_model: str = "base",
+                   lang: str = "tr") -> Dict[str, Any]:
+    """
+    Her videonun içerik analizi ayrı bir süreçte (<job_dir>/videos/NN) yapılır,
+    sonra sahneler, kareler, transcript ve BLIP tag'leri job'ın results/
+    dizininde birleştirilir. Bir videonun hatası diğerlerini durdurmaz; hatalar
+    "errors" altında döner.
+    """
+    results_dir = os.path.join(job_dir, "results")
+    frames_dir = os.path.join(results_dir, "frames")
+    os.makedirs(frames_dir, exist_ok=True)
+
+    subs = [os.path.join(job_dir, "videos", f"{i:02d}") for i in range(1, len(video_paths) + 1)]
+    futures = [_video_pool().submit(_analyze_video_worker, sub, vp, whisper_model, lang)
+               for sub, vp in zip(subs, video_paths)]
+    outcomes = []
+    for f in futures:
+        try:
+            outcomes.append(f.result())
+        except Exception as e:   # worker süreci çöktü vb.
+            if isinstance(e, BrokenProcessPool):
+                _reset_video_pool()
+            outcomes.append({"ok": False, "error": "".join(
+                traceback.format_exception(type(e), e, e.__traceback__))})
+
+    scenes, captions, frames, tag_lists, per_video, errors = [], [], [], [], [], []
+    srt_lines, transcripts = [], []
+    cue = 1
+    for idx, (vp, sub, res) in enumerate(zip(video_paths, subs, outcomes), start=1):
+        name = os.path.basename(vp)
+        if not res["ok"]:
+            errors.append(f"[content_understanding:{name}] {res['error']}")
+            per_video.append({"index": idx, "video": vp, "tags": [], "error": True})
+            continue
+        data = res["data"]
+        sub_results = os.path.join(sub, "results")
+
+        # kareler: vNN_scene_XX.jpg olarak ortak frames/ altına
+        renamed: Dict[str, str] = {}
+        for fp in data["vision"].get("frames", []) + [s.get("keyframe") for s in data["scenes"]]:
+            if fp and fp not in renamed and os.path.isfile(fp):
+                dst = os.path.join(frames_dir, f"v{idx:02d}_{os.path.basename(fp)}")
+                shutil.copy2(fp, dst)
+                renamed[fp] = dst
+        for s in data["scenes"]:
+            scenes.append({**s, "video": name, "video_index": idx,
+                           "keyframe": renamed.get(s.get("keyframe"), s.get("keyframe"))})
+        for c in data["vision"].get("captions", []):
+            c = {**c, "video": name, "frame": renamed.get(c["frame"], c["frame"])}
+            if "duplicate_of" in c:
+                c["duplicate_of"] = renamed.get(c["duplicate_of"], c["duplicate_of"])
+            captions.append(c)
+        frames.extend(renamed.get(fp, fp) for fp in data["vision"].get("frames", []))
+        tags = data["vision"].get("tags", [])
+        tag_lists.append(tags)
+        per_video.append({"index": idx, "video": vp, "tags": tags})
+
+        # SRT: cue numaraları job genelinde yeniden sıralanır; zamanlar video içi kalır
+        srt = data.get("srt_path")
+        if srt and os.path.isfile(srt):
+            with open(srt, "r", encoding="utf-8") as f:
+                blocks = [b for b in f.read().strip().split("\n\n") if b.strip()]
+            for b in blocks:
+                lines = b.splitlines()
+                srt_lines.append("\n".join([str(cue)] + lines[1:]))
+                cue += 1
+        tj = os.path.join(sub_results, "transcript.json")
+        if os.path.isfile(tj):
+            with open(tj, "r", encoding="utf-8") as f:
+                t = json.load(f)
+            transcripts.append({"video": name, "text": t.get("text", ""), "segments": t.get("segments", [])})
+
+    srt_path = os.path.join(results_dir, "subtitles.srt")
+    with open(srt_path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(srt_lines) + ("\n\n" if srt_lines else ""))
+    with open(os.path.join(results_dir, "transcript.json"), "w", encoding="utf-8") as f:
+        json.dump({"text": " ".join(t["text"].strip() for t in transcripts), "videos": transcripts},
+                  f, ensure_ascii=False, indent=2)
+    with open(os.path.join(results_dir, "scenes.json"), "w", encoding="utf-8") as f:
+        json.dump(scenes, f, ensure_ascii=False, indent=2)
+
+    skipped = sum(r["data"]["vision"].get("dedupe", {}).get("skipped", 0) for r in outcomes if r["ok"])
+    failed = sum(r["data"]["vision"].get("caption_failed", 0) for r in outcomes if r["ok"])
+    vision = {"frames": frames, "captions": captions, "tags": _interleave(tag_lists, 15), "caption_failed": failed,
+              "dedupe": {**dedupe_params(), "skipped": skipped}}
+    data = {"scenes": scenes, "srt_path": srt_path, "vision": vision, "videos": per_video}
+    with open(os.path.join(results_dir, "content_understanding.json"), "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    return {**data, "errors": errors}
@@ -1,5 +1,5 @@
 # app/agents/finalize_agent.py
-import os, json, zipfile
+import os, json
 
 class FinalizeAgent:
     def run(self, job_dir: str, variants, scores):
@@ -18,14 +18,5 @@ class FinalizeAgent:
                        "hashtags": best["hashtags"], "score": scores[best_id]["total"]},
                       f, ensure_ascii=False, indent=2)
 
-        bundle = os.path.join(results, "bundle.zip")
-        with zipfile.ZipFile(bundle, "w", zipfile.ZIP_DEFLATED) as z:
-            for fn in ["captions.json","hashtags.txt","subtitles.srt","scenes.json","summary.json"]:
-                fp = os.path.join(results, fn)
-                if os.path.isfile(fp):
-                    z.write(fp, arcname=fn)
-            frames = os.path.join(results, "frames")
-            if os.path.isdir(frames):
-                for name in sorted(os.listdir(frames))[:6]:
-                    z.write(os.path.join(frames, name), arcname=f"frames/{name}")
-        return bundle
+        # bundle.zip burada üretilmez: /jobs/{id}/bundle istek anında akıtır (app/services/bundle.py)
+        return best_id
@@ -4,10 +4,13 @@ from __future__ import annotations
 import os
 import json
 import re
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Any, Optional
 
 from dotenv import load_dotenv
 
+from app.services.metrics import bind, span
+from app.llm.response_cache import LLM_CACHE_TTL, LLM_MODE, prompt_key, recordings, response_cache
 
 try:
     from app.llm.gemini_llm import get_model as _get_gemini_model  
@@ -30,7 +33,7 @@ SYSTEM_PROMPT = (
 )
 
 USER_PROMPT_TMPL = """
-Aşağıdaki bilgilerle Instagram postu için 3 farklı varyant üret.
+Aşağıdaki bilgilerle Instagram postu için {n} farklı varyant üret.
 
 - Dil: {lang}
 - Oyun adı: {game_name}
@@ -43,9 +46,7 @@ Kurallar:
 1) Yalnızca JSON döndür (code block yok). Biçim:
 {{
   "variants": [
-    {{"id":"v1","caption":"...", "hashtags":["#..."]}},
-    {{"id":"v2","caption":"...", "hashtags":["#..."]}},
-    {{"id":"v3","caption":"...", "hashtags":["#..."]}}
+{variants_example}
   ]
 }}
 2) caption: 1–2 cümle (90–220 karakter), anlaşılır ve aksiyona çağıran bir üslup; emoji serbest ama aşırıya kaçma.
@@ -58,6 +59,12 @@ Kurallar:
 Şimdi sadece geçerli JSON ver.
 """
 
+GEN_VARIANTS = int(os.getenv("GEN_VARIANTS", "3"))        # tek çağrıda üretilecek varyant sayısı
+GEN_CONCURRENCY = int(os.getenv("GEN_CONCURRENCY", "4"))  # revizyonda paralel varyant çağrısı
+
+def variant_ids(n: int = GEN_VARIANTS) -> List[str]:
+    return [f"v{i}" for i in range(1, max(1, n) + 1)]
+
 # -------------------- Yardımcılar --------------------
 FORBIDDEN_PREFIXES = (
     "harika bir görev", "işte", "aşağıda", "öneri",
@@ -91,21 +98,73 @@ def _force_json(text: str) -> Dict[str, Any]:
             cleaned = m.group(0)
     return json.loads(cleaned)
 
+def _clean_variant(it: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    cid = it.get("id")
+    cap = _sanitize_caption(it.get("caption", ""))
+    tags = [h.strip() for h in (it.get("hashtags") or []) if h.strip().startswith("#")]
+    if cid and cap and tags:
+        return {"id": cid, "caption": cap, "hashtags": tags}
+    return None
+
 def _parse_variants(raw_text: str) -> Dict[str, Any]:
     data = _force_json(raw_text)
     out = {"variants": []}
     for it in data.get("variants", []):
-        cid = it.get("id")
-        cap = _sanitize_caption(it.get("caption", ""))
-        tags = [h.strip() for h in (it.get("hashtags") or []) if h.strip().startswith("#")]
-        if cid and cap and tags:
-            out["variants"].append({"id": cid, "caption": cap, "hashtags": tags})
+        v = _clean_variant(it)
+        if v:
+            out["variants"].append(v)
     # En az bir varyant yoksa kaba bir emniyet ağı:
     if not out["variants"]:
         raise ValueError("No valid variants parsed from LLM output.")
     return out
 
 
+class VariantStreamParser:
+    """
+    Akış halinde gelen {"variants":[{...},{...}]} metninde her varyant objesi
+    kapanır kapanmaz onu parse eder. Code fence / önsöz gibi süslü parantez
+    dışındaki metin yok sayılır; string içindeki parantezler sayılmaz.
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0
+        self.stack: List[str] = []
+        self.in_str = False
+        self.esc = False
+        self.obj_start: Optional[int] = None
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        self.buf += chunk
+        done: List[Dict[str, Any]] = []
+        while self.pos < len(self.buf):
+            ch = self.buf[self.pos]
+            if self.in_str:
+                if self.esc:
+                    self.esc = False
+                elif ch == "\\":
+                    self.esc = True
+                elif ch == '"':
+                    self.in_str = False
+            elif ch == '"' and self.stack:
+                self.in_str = True
+            elif ch in "{[":
+                self.stack.append(ch)
+                if ch == "{" and self.stack == ["{", "[", "{"]:
+                    self.obj_start = self.pos
+            elif ch in "}]" and self.stack:
+                self.stack.pop()
+                if ch == "}" and self.stack == ["{", "["] and self.obj_start is not None:
+                    try:
+                        v = _clean_variant(json.loads(self.buf[self.obj_start:self.pos + 1]))
+                    except ValueError:
+                        v = None
+                    if v:
+                        done.append(v)
+                    self.obj_start = None
+            self.pos += 1
+        return done
+
 # -------------------- Agent --------------------
 class GenerationAgentLLM:
     """Gemini tabanlı caption/hashtag üretici."""
@@ -113,12 +172,64 @@ class GenerationAgentLLM:
     def __init__(self, model_name: Optional[str] = None):
         load_dotenv()
         self.model_name = model_name or os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
-        self.model = _get_gemini_model(self.model_name)
+        self.generation_config: Dict[str, Any] = {}
+        # replay modunda ağ/API anahtarı gerekmez: yanıtlar diskteki kayıtlardan gelir
+        self.model = None if LLM_MODE == "replay" else _get_gemini_model(self.model_name)
 
-    def _call_llm(self, prompt: str) -> str:
+    def _call_llm(self, prompt: str, fresh: bool = False,
+                  on_chunk: Optional[Callable[[str], None]] = None) -> str:
+        """
+        Önbellek katmanı: (model, generation_config, prompt) anahtarı.
+        - LLM_MODE=replay: yalnızca kayıtlı yanıtlar; kayıt yoksa hata.
+        - fresh=True: önbellek okunmaz (yeni varyant isteniyor), sonuç yine yazılır.
+        - LLM_MODE=record: canlı ya da önbellekten gelen her yanıt ayrıca kalıcı olarak kaydedilir.
+        on_chunk verilirse canlı yanıt akış halinde, önbellekten gelen yanıt tek parça iletilir.
+        """
+        key = prompt_key(self.model_name, self.generation_config, prompt)
+        if LLM_MODE == "replay":
+            text = recordings.get(key)
+            if text is None:
+                raise RuntimeError(f"No recorded LLM response for key {key[:12]} (LLM_MODE=replay).")
+            if on_chunk:
+                on_chunk(text)
+            return text
+
+        if LLM_CACHE_TTL > 0 and not fresh:
+            text = response_cache.get(key)
+            if text is not None:
+                if LLM_MODE == "record":   # önbellek isabeti de kayda girsin; yoksa replay bu prompt'u bulamaz
+                    recordings.put(key, text, model=self.model_name, config=self.generation_config, prompt=prompt)
+                if on_chunk:
+                    on_chunk(text)
+                return text
+
+        with span("gemini", kind="llm", model=self.model_name, stream=on_chunk is not None) as rec:
+            text = self._generate(prompt, on_chunk=on_chunk)
+            rec["chars"] = len(text)
+        if LLM_CACHE_TTL > 0:
+            response_cache.put(key, text, model=self.model_name)
+        if LLM_MODE == "record":
+            recordings.put(key, text, model=self.model_name, config=self.generation_config, prompt=prompt)
+        return text
+
+    def _generate(self, prompt: str, on_chunk: Optional[Callable[[str], None]] = None) -> str:
         # app.llm.gemini_llm.get_model() genelde .generate_content kullanır
         if hasattr(self.model, "generate_content"):
-            res = self.model.generate_content(prompt)
+            kwargs: Dict[str, Any] = {}
+            if self.generation_config:
+                kwargs["generation_config"] = self.generation_config
+            if on_chunk is not None:
+                parts = []
+                for chunk in self.model.generate_content(prompt, stream=True, **kwargs):
+                    try:
+                        t = chunk.text or ""
+                    except ValueError:   # içerik parçası olmayan (ör. yalnız metadata) chunk
+                        t = ""
+                    if t:
+                        parts.append(t)
+                        on_chunk(t)
+                return "".join(parts)
+            res = self.model.generate_content(prompt, **kwargs)
             # genai: res.text / LangChain wrapper: res.candidates[0].content.parts[0].text olabilir
             text = getattr(res, "text", None)
             if text is None:
@@ -127,33 +238,28 @@ class GenerationAgentLLM:
                     text = res.candidates[0].content.parts[0].text  # type: ignore
                 except Exception:
                     raise RuntimeError("Gemini response has no text field.")
+            if on_chunk:
+                on_chunk(text)
             return text
         # farklı bir wrapper ise:
         if callable(getattr(self.model, "invoke", None)):
-            return self.model.invoke(prompt)  # type: ignore
+            text = self.model.invoke(prompt)  # type: ignore
+            if on_chunk:
+                on_chunk(text)
+            return text
         raise RuntimeError("Unsupported Gemini model client.")
 
-    def run(
-        self,
-        job_dir: str,
-        aso_keywords: List[str],
-        description: str,
-        tags: List[str],
-        trends: List[str],
-        critique: Optional[str] = None,
-        lang: str = "tr",
-        game_name: str = "Game"
-    ) -> Dict[str, Any]:
-        """
-        Sonuç: {"variants":[{"id":"v1","caption":..., "hashtags":[...]}...]}
-        ve results/captions.json dosyası yazılır.
-        """
-        # ---- prompt inşası
+    def _build_prompt(self, aso_keywords: List[str], description: str, tags: List[str], trends: List[str],
+                      critique: Optional[str], lang: str, game_name: str, ids: List[str]) -> str:
         critique_block = ""
         if critique:
             critique_block = f"Revizyon talimatı: {critique}\n"
 
         user_prompt = USER_PROMPT_TMPL.format(
+            n=len(ids),
+            variants_example=",\n".join(
+                f'    {{"id":"{vid}","caption":"...", "hashtags":["#..."]}}' for vid in ids
+            ),
             lang=lang,
             game_name=game_name,
             description=description[:700],
@@ -162,19 +268,139 @@ class GenerationAgentLLM:
             aso=", ".join(aso_keywords[:30]),
             critique_block=critique_block
         )
-        full_prompt = f"{SYSTEM_PROMPT}\n\n{user_prompt}".strip()
+        return f"{SYSTEM_PROMPT}\n\n{user_prompt}".strip()
 
-        # ---- LLM çağrısı
-        raw = self._call_llm(full_prompt)
+    def _generate_variants(self, prompt: str, fresh: bool = False,
+                           on_variant: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        # ---- LLM çağrısı (+ akışta artımlı parse)
+        streamed: List[Dict[str, Any]] = []
+        on_chunk = None
+        if on_variant is not None:
+            parser = VariantStreamParser()
+            def on_chunk(chunk: str):
+                for v in parser.feed(chunk):
+                    streamed.append(v)
+                    on_variant(v)
+        raw = self._call_llm(prompt, fresh=fresh, on_chunk=on_chunk)
 
-        # ---- parse & sanitize
-        data = _parse_variants(raw)
+        # ---- parse & sanitize (tam metin esas; bozuksa akışta yakalananlar)
+        try:
+            return _parse_variants(raw)
+        except ValueError:
+            if not streamed:
+                raise
+            return {"variants": streamed}
 
-        # ---- diske yaz
+    @staticmethod
+    def _write(job_dir: str, data: Dict[str, Any]) -> None:
         results_dir = os.path.join(job_dir, "results")
         os.makedirs(results_dir, exist_ok=True)
         out_path = os.path.join(results_dir, "captions.json")
         with open(out_path, "w", encoding="utf-8") as f:
             json.dump(data, f, ensure_ascii=False, indent=2)
 
+    def run(
+        self,
+        job_dir: str,
+        aso_keywords: List[str],
+        description: str,
+        tags: List[str],
+        trends: List[str],
+        critique: Optional[str] = None,
+        lang: str = "tr",
+        game_name: str = "Game",
+        fresh: bool = False,
+        on_variant: Optional[Callable[[Dict[str, Any]], None]] = None,
+        n_variants: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Sonuç: {"variants":[{"id":"v1","caption":..., "hashtags":[...]}...]}
+        ve results/captions.json dosyası yazılır. fresh=True yanıt önbelleğini atlar.
+        on_variant verilirse yanıt akış halinde alınır ve her varyant tamamlandığı
+        anda (sanitize edilmiş olarak) callback'e iletilir.
+        """
+        ids = variant_ids(n_variants or GEN_VARIANTS)
+        prompt = self._build_prompt(aso_keywords, description, tags, trends, critique, lang, game_name, ids)
+        data = self._generate_variants(prompt, fresh=fresh, on_variant=on_variant)
+        self._write(job_dir, data)
+        return data
+
+    def _generate_each(self, prompts: Dict[str, str], fresh: bool = False,
+                       on_variant: Optional[Callable[[Dict[str, Any]], None]] = None
+                       ) -> Dict[str, Dict[str, Any]]:
+        """
+        Varyant id'si başına ayrı prompt; çağrılar paralel yapılır. Başarısız id
+        sonuçta yer almaz; hiçbiri üretilemezse ilk hata fırlatılır.
+        """
+        def one(vid: str) -> Dict[str, Any]:
+            cb = (lambda v: on_variant({**v, "id": vid})) if on_variant else None
+            data = self._generate_variants(prompts[vid], fresh=fresh, on_variant=cb)
+            return {**data["variants"][0], "id": vid}
+
+        out: Dict[str, Dict[str, Any]] = {}
+        first_err: Optional[Exception] = None
+        with ThreadPoolExecutor(max_workers=max(1, min(GEN_CONCURRENCY, len(prompts)))) as ex:
+            futures = {vid: ex.submit(bind(one), vid) for vid in prompts}
+            for vid, fut in futures.items():
+                try:
+                    out[vid] = fut.result()
+                except Exception as e:
+                    first_err = first_err or e
+        if prompts and not out and first_err is not None:
+            raise first_err
+        return out
+
+    def run_each(
+        self,
+        job_dir: str,
+        tags_by_id: Dict[str, List[str]],
+        aso_keywords: List[str],
+        description: str,
+        trends: List[str],
+        critique: Optional[str] = None,
+        lang: str = "tr",
+        game_name: str = "Game",
+        fresh: bool = False,
+        on_variant: Optional[Callable[[Dict[str, Any]], None]] = None
+    ) -> Dict[str, Any]:
+        """Video başına varyant: her id kendi tag'leriyle ayrı (paralel) bir çağrıda üretilir."""
+        prompts = {vid: self._build_prompt(aso_keywords, description, tags, trends, critique, lang, game_name, [vid])
+                   for vid, tags in tags_by_id.items()}
+        made = self._generate_each(prompts, fresh=fresh, on_variant=on_variant)
+        data = {"variants": [made[vid] for vid in tags_by_id if vid in made]}
+        self._write(job_dir, data)
+        return data
+
+    def revise(
+        self,
+        job_dir: str,
+        current: Dict[str, Any],
+        failing_ids: List[str],
+        aso_keywords: List[str],
+        description: str,
+        tags: List[str],
+        trends: List[str],
+        critique: str,
+        lang: str = "tr",
+        game_name: str = "Game",
+        fresh: bool = False,
+        on_variant: Optional[Callable[[Dict[str, Any]], None]] = None,
+        tags_by_id: Optional[Dict[str, List[str]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Hedefli revizyon: yalnızca failing_ids yeniden üretilir, her biri ayrı
+        bir LLM çağrısıyla ve paralel olarak; geçen varyantlar aynen korunur.
+        Yenisi alınamayan varyant eski haliyle kalır (hepsi başarısızsa hata).
+        """
+        by_id = {v["id"]: v for v in current.get("variants", [])}
+        prompts = {}
+        for vid in failing_ids:
+            prev = by_id.get(vid, {}).get("caption", "")
+            crit = f"{critique} Önceki (yetersiz) caption: {prev}" if prev else critique
+            vid_tags = (tags_by_id or {}).get(vid, tags)
+            prompts[vid] = self._build_prompt(aso_keywords, description, vid_tags, trends, crit, lang, game_name, [vid])
+        replaced = self._generate_each(prompts, fresh=fresh, on_variant=on_variant)
+
+        data = {"variants": [replaced.get(v["id"], v) for v in current.get("variants", [])]}
+        self._write(job_dir, data)
         return data
@@ -1,6 +1,8 @@
 import os, re, json, subprocess, shutil
-from typing import Dict
+from functools import lru_cache
+from typing import Dict, List, Optional
 from app.agents.trend_agent import TrendAgent
+from app.services.metrics import span
 
 def _format_score(caption: str) -> float:
     L = len(caption)
@@ -28,11 +30,18 @@ FFPROBE = _bin("ffprobe", "FFPROBE_PATH")
 def _media_metrics(video_path: str) -> Dict:
     if not FFPROBE or not os.path.isfile(video_path):
         return {"width": 0, "height": 0, "duration": 0.0, "bitrate": 0}
-    out = subprocess.check_output([FFPROBE, "-v", "error",
-                                   "-select_streams", "v:0",
-                                   "-show_entries", "stream=width,height,bit_rate",
-                                   "-show_entries", "format=duration",
-                                   "-of", "json", video_path]).decode("utf-8","ignore")
+    st = os.stat(video_path)
+    # aynı video için ffprobe bir kez (revizyon turları ve akış skorlaması tekrar sormaz)
+    return dict(_probe_media(video_path, st.st_size, st.st_mtime_ns))
+
+@lru_cache(maxsize=64)
+def _probe_media(video_path: str, size: int, mtime_ns: int) -> Dict:
+    with span("ffprobe", kind="subprocess"):
+        out = subprocess.check_output([FFPROBE, "-v", "error",
+                                       "-select_streams", "v:0",
+                                       "-show_entries", "stream=width,height,bit_rate",
+                                       "-show_entries", "format=duration",
+                                       "-of", "json", video_path]).decode("utf-8","ignore")
     import json as _j
     js = _j.loads(out)
     w = js.get("streams",[{}])[0].get("width",0)
@@ -57,20 +66,26 @@ def _media_score(metrics: Dict) -> float:
 BANNED = {"FREE", "BEDAVA", "NO ADS"}  # örnek; genişletilebilir
 
 class QCAgent:
-    def run(self, job_dir: str, variants, trend_terms, video_path: str):
-        # medya metrikleri
-        m = _media_metrics(video_path)
-        mscore = _media_score(m)
+    def score(self, variants: List[Dict], trend_terms, video_path: str,
+              video_by_id: Optional[Dict[str, str]] = None) -> Dict[str, Dict]:
+        """
+        Verilen varyantları skorlar (dosya yazmaz); akış sırasında tek tek de çağrılabilir.
+        video_by_id: video başına varyant modunda medya skoru varyantın kendi videosundan.
+        """
+        # trend uyumu: tüm varyantlar tek seferde
+        trendfits = TrendAgent._trendfit_scores([v["caption"] for v in variants], trend_terms)
 
         out = {}
-        for v in variants["variants"]:
+        for v, trendfit in zip(variants, trendfits):
+            # medya metrikleri
+            m = _media_metrics((video_by_id or {}).get(v["id"], video_path))
+            mscore = _media_score(m)
+
             cap = v["caption"]
             # text skorları
             f = _format_score(cap)
             h = _hashtag_score(v.get("hashtags"))
             r = _repeat_penalty(cap)
-            # trend uyumu
-            trendfit = TrendAgent._trendfit_score(cap, trend_terms)
 
             # banned basit ceza
             banned_pen = 0.9 if any(b.lower() in cap.lower() for b in BANNED) else 1.0
@@ -82,6 +97,15 @@ class QCAgent:
                 "trendfit": round(trendfit,1),
                 "total": round(total,1)
             }
+        return out
+
+    def run(self, job_dir: str, variants, trend_terms, video_path: str, known: Optional[Dict] = None,
+            video_by_id: Optional[Dict[str, str]] = None):
+        """known: önceden (ör. akış sırasında) skorlanmış varyantlar; yalnızca eksikler skorlanır."""
+        known = known or {}
+        todo = [v for v in variants["variants"] if v["id"] not in known]
+        fresh = self.score(todo, trend_terms, video_path, video_by_id) if todo else {}
+        out = {v["id"]: known.get(v["id"]) or fresh[v["id"]] for v in variants["variants"]}
 
         results_dir = os.path.join(job_dir, "results"); os.makedirs(results_dir, exist_ok=True)
         with open(os.path.join(results_dir, "scores.json"), "w", encoding="utf-8") as f:
@@ -1,25 +1,35 @@
 # app/agents/trend_agent.py
 import os, json, time
-from typing import Dict, List, Iterable
+from typing import Dict, List, Iterable, Tuple
 from collections import Counter
 
-from pytrends.request import TrendReq
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from scipy.spatial.distance import cdist
 
-EMBED_MODEL = os.getenv("TREND_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+from app.services.metrics import span
+from app.services.models import EMBED_MODEL, get_embedder
+from app.services.embed_cache import embed_cache
+from app.services.trends import fetch_related
+
+TREND_TIMEFRAME = "now 7-d"
+TREND_PREEMBED = os.getenv("TREND_PREEMBED", "1") == "1"   # trend terimlerini QC için önceden göm
 
 
 # ---- Embedding helper --------------------------------------------------------
-_model_cache = {"emb": None}
 def _embed(texts: List[str]) -> np.ndarray:
-    if _model_cache["emb"] is None:
-        _model_cache["emb"] = SentenceTransformer(EMBED_MODEL)
-    vecs = _model_cache["emb"].encode(
-        texts, normalize_embeddings=True, show_progress_bar=False
-    )
-    return np.array(vecs, dtype="float32")
+    """Önbellekte olmayan metinler tek bir encode çağrısında gömülür."""
+    cached = embed_cache.get_many(EMBED_MODEL, texts)
+    missing = list(dict.fromkeys(t for t, v in zip(texts, cached) if v is None))
+    if missing:
+        embedder = get_embedder(EMBED_MODEL)
+        with span("embed", kind="model", texts=len(missing)):
+            vecs = embedder.encode(missing, normalize_embeddings=True, show_progress_bar=False)
+        vecs = np.array(vecs, dtype="float32")
+        embed_cache.put_many(EMBED_MODEL, missing, vecs)
+        fresh = dict(zip(missing, vecs))
+        cached = [v if v is not None else fresh[t] for t, v in zip(texts, cached)]
+    if not cached:
+        return np.zeros((0, 0), dtype="float32")
+    return np.stack(cached).astype("float32", copy=False)
 
 
 # ---- Trend Agent --------------------------------------------------------------
@@ -41,50 +51,86 @@ class TrendAgent:
 
     # Eski akışla uyumluluk: flow.py -> TrendAgent().run(job_dir, seeds)
     def run(self, job_dir: str, seeds: List[str]) -> Dict:
-        terms = self._google_trends(seeds)
-        trend = {"terms": terms, "ts": int(time.time())}
+        terms, stats = self._google_trends(seeds)
+        trend = {"terms": terms, "seeds": self._normalize_seeds(seeds)[:8], "ts": int(time.time()),
+                 "stats": stats}
+        self._write(job_dir, trend)
+        self._preembed(terms)
+        return trend
 
+    def enrich(self, job_dir: str, trend: Dict, extra_seeds: List[str]) -> Dict:
+        """
+        Meta seed'leriyle erkenden alınmış trend sonucunu (run) sonradan gelen
+        seed'lerle (ör. BLIP tag'leri) genişletir; yalnızca yeni seed'ler sorgulanır.
+        """
+        base_seeds = list(trend.get("seeds") or [])
+        extra = [s for s in self._normalize_seeds(extra_seeds) if s not in base_seeds]
+        if not extra:
+            return trend
+
+        terms = list(trend.get("terms") or [])
+        new_terms, new_stats = self._google_trends(extra)
+        for t in new_terms:
+            if t not in terms:
+                terms.append(t)
+        stats = dict(trend.get("stats") or {})
+        for k, v in new_stats.items():
+            stats[k] = stats.get(k, 0) + v
+        out = {"terms": terms[:40], "seeds": base_seeds + extra[:8], "ts": int(time.time()),
+               "stats": stats}
+        self._write(job_dir, out)
+        self._preembed(out["terms"])
+        return out
+
+    @staticmethod
+    def _write(job_dir: str, trend: Dict) -> None:
         results_dir = os.path.join(job_dir, "results")
         os.makedirs(results_dir, exist_ok=True)
         with open(os.path.join(results_dir, "trends.json"), "w", encoding="utf-8") as f:
             json.dump(trend, f, ensure_ascii=False, indent=2)
-        return trend
+
+    @staticmethod
+    def _preembed(terms: List[str]) -> None:
+        # QC'deki TrendFit bu vektörleri embed_cache'ten hazır bulur
+        if not TREND_PREEMBED or not terms:
+            return
+        try:
+            _embed([t for t in terms if t])
+        except Exception:
+            pass
 
     # ---- Internal -------------------------------------------------------------
-    def _google_trends(self, seeds: List[str], timeframe: str = "now 7-d") -> List[str]:
+    def _google_trends(self, seeds: List[str], timeframe: str = TREND_TIMEFRAME) -> Tuple[List[str], Dict[str, int]]:
         seeds = self._normalize_seeds(seeds)[:8]  # gereksiz gürültüyü azalt
+        stats = {"hits": 0, "misses": 0, "errors": 0, "fallback": 0}
         if not seeds:
-            return []
+            return [], stats
 
         try:
-            pytrends = TrendReq(hl=self.lang, tz=self.tz)
+            # önbellekten + eksikler paralel/rate-limited (app.services.trends)
+            related, fetch_stats = fetch_related([kw for kw in seeds[:5] if kw], geo=self.geo,
+                                                 timeframe=timeframe, hl=self.lang, tz=self.tz)
+            stats.update(fetch_stats)
             bag: Counter = Counter()
-
-            for kw in seeds[:5]:
-                if not kw:
-                    continue
-                pytrends.build_payload([kw], timeframe=timeframe, geo=self.geo)
-                rel = pytrends.related_queries() or {}
-                # {'kw': {'top': DataFrame(query, value), 'rising': DataFrame(...) }}
-                for obj in rel.values():
-                    if obj and obj.get("top") is not None:
-                        df = obj["top"]
-                        for _, row in df.iterrows():
-                            term = str(row.get("query", "")).strip().lower()
-                            val = int(row.get("value", 50) or 50)
-                            if term and term not in seeds:
-                                bag[term] += val
+            for rows in related.values():
+                for row in rows:
+                    term = str(row.get("query", "")).strip().lower()
+                    val = int(row.get("value", 50) or 50)
+                    if term and term not in seeds:
+                        bag[term] += val
 
             # Hiç sonuç gelmediyse sabite DÖNME – seed'leri kullan
             if not bag:
-                return seeds
+                stats["fallback"] = 1
+                return seeds, stats
 
             ranked = [t for t, _ in bag.most_common(40)]
-            return ranked
+            return ranked, stats
 
         except Exception:
             # ağ/quota hatası vs.: sabite düşme yok; mevcut seed'leri kullan
-            return seeds
+            stats["fallback"] = 1
+            return seeds, stats
 
     @staticmethod
     def _normalize_seeds(seeds: Iterable[str]) -> List[str]:
@@ -108,13 +154,25 @@ class TrendAgent:
         Caption ile trend terimleri arasındaki benzerliği ölçer (cosine sim.).
         En iyi 5 terimin ortalamasını % cinsinden döndürür.
         """
+        return TrendAgent._trendfit_scores([caption], trend_terms)[0]
+
+    @staticmethod
+    def _trendfit_scores(captions: List[str], trend_terms: List[str]) -> List[float]:
+        """
+        _trendfit_score'un toplu hali: tüm caption'lar ve terimler tek encode
+        çağrısında gömülür, benzerlik matrisi tek matris çarpımıyla hesaplanır.
+        """
         trend_terms = [t for t in (trend_terms or []) if t]
-        if not caption or not trend_terms:
-            return 50.0  # nötr skor
-
-        vecs = _embed([caption] + trend_terms)
-        cap_vec = vecs[0:1]
-        terms_vec = vecs[1:]
-        sims = 1.0 - cdist(cap_vec, terms_vec, metric="cosine")[0]
-        topk = sorted(sims, reverse=True)[:5]
-        return float(np.mean(topk) * 100.0)
+        scores = [50.0] * len(captions)  # nötr skor
+        idx = [i for i, c in enumerate(captions) if c]
+        if not idx or not trend_terms:
+            return scores
+
+        vecs = _embed([captions[i] for i in idx] + trend_terms)
+        cap_vecs, terms_vec = vecs[:len(idx)], vecs[len(idx):]
+        sims = cap_vecs @ terms_vec.T          # normalize vektörler -> cosine
+        k = min(5, sims.shape[1])
+        topk = -np.sort(-sims, axis=1)[:, :k]
+        for i, s in zip(idx, topk.mean(axis=1) * 100.0):
+            scores[i] = float(s)
+        return scores
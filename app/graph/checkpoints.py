@@ -0,0 +1,66 @@
+# app/graph/checkpoints.py
+import os, json, shutil, threading
+from collections import Counter
+from typing import Any, Dict, Iterable, Optional
+
+CHECKPOINTS = os.getenv("CHECKPOINTS", "1") == "1"
+
+CHECKPOINT_DIR = "checkpoints"
+
+
+class NodeCheckpoints:
+    """
+    Node çıktılarının job dizinindeki kalıcı kopyası: <job_dir>/checkpoints/<node>.<k>.json
+
+    k, node'un bu çalıştırmadaki kaçıncı çağrısı (revizyon döngüsünde generate.0,
+    generate.1 ...). Her kayıt node girdilerinin parmak izini taşır; yeniden
+    çalıştırmada parmak izi aynı olan çağrı kayıttan döner, değişen (ve ondan
+    etkilenen) node'lar yeniden hesaplanır.
+
+    - force=True: tüm checkpoint'ler silinir (baştan çalıştırma).
+    - rerun: bu node'ların kaydı okunmaz, yeniden hesaplanıp üzerine yazılır.
+    """
+
+    def __init__(self, job_dir: str, force: bool = False, rerun: Iterable[str] = ()):
+        self.root = os.path.join(job_dir, CHECKPOINT_DIR)
+        self.rerun = set(rerun)
+        self._lock = threading.Lock()
+        self._calls: Counter = Counter()
+
+        if force:
+            shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root, exist_ok=True)
+
+    def next_key(self, node: str) -> str:
+        with self._lock:
+            k = self._calls[node]
+            self._calls[node] += 1
+        return f"{node}.{k}"
+
+    def load(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        if key.rsplit(".", 1)[0] in self.rerun:
+            return None
+        obj = self._read(f"{key}.json")
+        if obj is None or obj.get("fingerprint") != fingerprint:
+            return None
+        return obj.get("output")
+
+    def save(self, key: str, output: Dict[str, Any], fingerprint: str) -> None:
+        self._write(f"{key}.json", {"node": key.rsplit(".", 1)[0], "fingerprint": fingerprint,
+                                    "output": output})
+
+    # ---- Internal -------------------------------------------------------------
+    def _read(self, name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(self.root, name), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write(self, name: str, obj: Dict[str, Any]) -> None:
+        # yarım yazılmış checkpoint okunmasın diye tmp + replace
+        path = os.path.join(self.root, name)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(obj, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
@@ -1,15 +1,21 @@
 # app/graph/flow.py
 from __future__ import annotations
-from langgraph.graph import StateGraph, END
+from langgraph.graph import StateGraph, START, END
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
-import os, json, traceback
+from typing import List, Dict, Any, Optional, Callable, Annotated
+import os, json, hashlib, operator, traceback
+
+GEN_STREAM = os.getenv("GEN_STREAM", "1") == "1"
 
 # --------------------- STATE ---------------------
 class FlowState(BaseModel):
     job_id: str
     job_dir: str
     video_path: str
+    # çoklu video: first = yalnızca ilki, merge = birleşik analiz, per_video = video başına varyant
+    video_paths: List[str] = Field(default_factory=list)
+    video_mode: str = "first"
+    per_video: List[Dict[str, Any]] = Field(default_factory=list)
 
     # Content Understanding çıktıları
     scenes: List[Dict[str, Any]] = Field(default_factory=list)
@@ -21,127 +27,327 @@ class FlowState(BaseModel):
     variants: Optional[Dict[str, Any]] = None
     scores: Optional[Dict[str, Any]] = None
 
-    # yönetim
-    errors: List[str] = Field(default_factory=list)
+    # yeni varyant iste: LLM yanıt önbelleğini atla
+    fresh_generation: bool = False
+
+    # yönetim — paralel dallar aynı adımda hata ekleyebilir, listeler birleştirilir
+    errors: Annotated[List[str], operator.add] = Field(default_factory=list)
 
     # --- revizyon kontrolü ---
     need_revision: bool = False
+    failing: List[str] = Field(default_factory=list)   # QC eşiklerini geçemeyen varyant id'leri
     revision_count: int = 0          # kaç kez revize edildi
     max_revisions: int = 1           # EN FAZLA 1 kez revize et
 
+    # artımlı çalıştırma: girdi parmak izi değişmediği için kayıttan dönen / yeniden hesaplanan node çağrıları
+    reused: Annotated[List[str], operator.add] = Field(default_factory=list)
+    recomputed: Annotated[List[str], operator.add] = Field(default_factory=list)
+
+# Node'lar state'i yerinde değiştirmez; yalnızca değişen alanları dict olarak
+# döndürür. Paralel dallar (content_understanding || trend) böylece çakışmaz.
+
 # --------------------- HELPERS -------------------
-def _append_error(state: FlowState, err: Exception, label: str) -> FlowState:
+def _append_error(err: Exception, label: str) -> Dict[str, Any]:
     tb = "".join(traceback.format_exception(type(err), err, err.__traceback__))
-    state.errors.append(f"[{label}] {tb}")
-    return state
+    return {"errors": [f"[{label}] {tb}"]}
+
+def _load_meta(state: FlowState) -> Dict[str, Any]:
+    with open(os.path.join(state.job_dir, "meta.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _trend_seeds(meta: Dict[str, Any]) -> List[str]:
+    seeds = []
+    if "aso_keywords" in meta:
+        seeds.extend(meta["aso_keywords"])
+    if "game_name" in meta:
+        seeds.append(meta["game_name"])
+    if "description" in meta and meta["description"]:
+        seeds.append(meta["description"])
+    return seeds
+
+def _multi(state: FlowState) -> bool:
+    return len(state.video_paths) > 1 and state.video_mode != "first"
+
+def _per_video_ids(state: FlowState) -> Dict[str, Dict[str, Any]]:
+    """per_video modunda varyant id'si -> analizi başarılı video kaydı (v1..vN)."""
+    if state.video_mode != "per_video":
+        return {}
+    from app.agents.generation_agent_llm import variant_ids
+    ok = [pv for pv in state.per_video if not pv.get("error")]
+    return dict(zip(variant_ids(len(ok)), ok))
+
+def _video_by_id(state: FlowState) -> Dict[str, str]:
+    return {vid: pv["video"] for vid, pv in _per_video_ids(state).items()}
 
 # --------------------- NODES ---------------------
-def node_content_understanding(state: FlowState) -> FlowState:
-    """Video sahneleri + ASR + BLIP (tek ajan)"""
+def node_content_understanding(state: FlowState) -> Dict[str, Any]:
+    """
+    Video sahneleri + ASR + BLIP (tek ajan; ASR sahne/kare işiyle paralel).
+    Birden çok video varsa (merge/per_video) videolar süreç havuzunda paralel analiz edilir.
+    """
     try:
-        from app.agents.content_understanding_agent import ContentUnderstandingAgent
+        from app.agents.content_understanding_agent import ContentUnderstandingAgent, analyze_videos
         from dotenv import load_dotenv; load_dotenv()
+        if _multi(state):
+            data = analyze_videos(
+                state.job_dir,
+                state.video_paths,
+                whisper_model=os.getenv("WHISPER_MODEL", "base"),
+                lang=os.getenv("WHISPER_LANG", "tr"),
+            )
+            return {"scenes": data["scenes"], "srt_path": data["srt_path"], "vision": data["vision"],
+                    "per_video": data["videos"], "errors": data["errors"]}
         data = ContentUnderstandingAgent().run(
             state.job_dir,
             state.video_path,
             whisper_model=os.getenv("WHISPER_MODEL", "base"),
             lang=os.getenv("WHISPER_LANG", "tr"),
         )
-        state.scenes = data["scenes"]
-        state.srt_path = data["srt_path"]
-        state.vision = data["vision"]
-        return state
+        return {"scenes": data["scenes"], "srt_path": data["srt_path"], "vision": data["vision"]}
     except Exception as e:
-        return _append_error(state, e, "content_understanding")
+        return _append_error(e, "content_understanding")
 
-def node_trend(state: FlowState) -> FlowState:
+def node_trend(state: FlowState) -> Dict[str, Any]:
+    """Meta seed'leri (ASO, oyun adı, açıklama) ile trend; videoyu beklemez."""
     try:
-        meta = json.load(open(os.path.join(state.job_dir, "meta.json"), "r", encoding="utf-8"))
+        meta = _load_meta(state)
         from app.agents.trend_agent import TrendAgent
 
-        seeds = []
-        if "aso_keywords" in meta:
-            seeds.extend(meta["aso_keywords"])
-        if "game_name" in meta:
-            seeds.append(meta["game_name"])
-        if "description" in meta and meta["description"]:
-            seeds.append(meta["description"])
-        if state.vision.get("tags"):
-            seeds.extend(state.vision["tags"])
-
         # Trend agent çağrısı
-        state.trends = TrendAgent().run(state.job_dir, seeds)
+        return {"trends": TrendAgent().run(state.job_dir, _trend_seeds(meta))}
+    except Exception as e:
+        return _append_error(e, "trend")
 
-        return state
+def node_trend_enrich(state: FlowState) -> Dict[str, Any]:
+    """Join: content_understanding + trend bitince görsel tag'lerle zenginleştir."""
+    try:
+        tags = state.vision.get("tags") or []
+        if not tags:
+            return {}
+        from app.agents.trend_agent import TrendAgent
+        return {"trends": TrendAgent().enrich(state.job_dir, state.trends, tags)}
     except Exception as e:
-        return _append_error(state, e, "trend")
+        return _append_error(e, "trend_enrich")
+
 
+# QC eşikleri
+THRESH = 75.0      # toplam skor eşiği
+TREND_MIN = 60.0   # trendfit min
+
+def node_generate(state: FlowState) -> Dict[str, Any]:
+    """
+    Gemini ile caption/hashtag üretimi. Revizyon modunda sayacı artırır ve
+    yalnızca QC'den kalan varyantları (paralel, varyant başına bir çağrı) yeniler.
+    GEN_STREAM=1 iken varyantlar akışta tamamlandıkça yayınlanır (SSE) ve
+    hemen QC'den geçirilir; node_qc yalnızca eksik skorları hesaplar.
+    """
+    critique = None
+    revision_count = state.revision_count
+    if state.need_revision and revision_count < state.max_revisions:
+        critique = "QC/TrendFit düşük: trend terimlerini ve medya kurallarını dikkate alarak tekrar yaz."
+        revision_count += 1  # <<< yalnızca burada artar (LLM çağrısı patlasa da: döngü sonlanır)
 
-def node_generate(state: FlowState) -> FlowState:
-    """Gemini ile caption/hashtag üretimi. Revizyon modunda sayacı artırır."""
     try:
-        meta = json.load(open(os.path.join(state.job_dir, "meta.json"), "r", encoding="utf-8"))
+        meta = _load_meta(state)
         aso   = meta.get("aso_keywords", [])
         desc  = meta.get("description", "")
         tags  = state.vision.get("tags", [])
         trends = state.trends.get("terms", [])
 
-        critique = None
-        if state.need_revision and state.revision_count < state.max_revisions:
-            critique = "QC/TrendFit düşük: trend terimlerini ve medya kurallarını dikkate alarak tekrar yaz."
-            state.revision_count += 1  # <<< yalnızca burada artar
-
         from app.agents.generation_agent_llm import GenerationAgentLLM
-        state.variants = GenerationAgentLLM().run(state.job_dir, aso, desc, tags, trends, critique=critique)
-        state.need_revision = False
-        return state
+        from app.agents.qc_agent import QCAgent
+        from app.services.events import bus
+
+        streamed_scores: Dict[str, Any] = {}
+        per_video = _per_video_ids(state)
+        video_by_id = {vid: pv["video"] for vid, pv in per_video.items()}
+        tags_by_id = {vid: pv["tags"] for vid, pv in per_video.items()}
+
+        def on_variant(v: Dict[str, Any]):
+            if v["id"] in video_by_id:
+                v = {**v, "video": os.path.basename(video_by_id[v["id"]])}
+            bus.publish(state.job_id, "variant", v)
+            try:
+                sc = QCAgent().score([v], trends, state.video_path, video_by_id)[v["id"]]
+            except Exception:
+                return   # node_qc yine skorlar
+            streamed_scores[v["id"]] = sc
+            bus.publish(state.job_id, "score", {"id": v["id"], **sc})
+
+        agent = GenerationAgentLLM()
+        cb = on_variant if GEN_STREAM else None
+        if critique and state.variants and state.failing:
+            variants = agent.revise(state.job_dir, state.variants, state.failing, aso, desc, tags, trends,
+                                    critique=critique, fresh=state.fresh_generation, on_variant=cb,
+                                    tags_by_id=tags_by_id or None)
+        elif per_video:
+            variants = agent.run_each(state.job_dir, tags_by_id, aso, desc, trends, critique=critique,
+                                      fresh=state.fresh_generation, on_variant=cb)
+        else:
+            variants = agent.run(state.job_dir, aso, desc, tags, trends, critique=critique,
+                                 fresh=state.fresh_generation, on_variant=cb)
+        if video_by_id:
+            for v in variants["variants"]:
+                if v["id"] in video_by_id:
+                    v["video"] = os.path.basename(video_by_id[v["id"]])
+            agent._write(state.job_dir, variants)
+
+        # değişmeyen varyantın eski skoru, yenilerin akışta hesaplanan skoru korunur
+        old = {v["id"]: v for v in (state.variants or {}).get("variants", [])} if critique else {}
+        scores = {}
+        for v in variants["variants"]:
+            if old.get(v["id"]) == v and v["id"] in (state.scores or {}):
+                scores[v["id"]] = state.scores[v["id"]]
+            elif v["id"] in streamed_scores:
+                scores[v["id"]] = streamed_scores[v["id"]]
+        return {"variants": variants, "scores": scores, "need_revision": False, "failing": [],
+                "revision_count": revision_count}
     except Exception as e:
-        return _append_error(state, e, "generate_llm")
+        # revizyon başarısızsa ilk turun varyantlarıyla finalize'a geçilir (generate<->qc döngüsü olmaz)
+        return {**_append_error(e, "generate_llm"), "revision_count": revision_count, "need_revision": False}
 
-def node_qc(state: FlowState) -> FlowState:
+def node_qc(state: FlowState) -> Dict[str, Any]:
     """QC: metin + medya + TrendFit. Revizyon hakkı varsa işaretler."""
     try:
         from app.agents.qc_agent import QCAgent
         trend_terms = state.trends.get("terms", [])
-        state.scores = QCAgent().run(state.job_dir, state.variants, trend_terms, state.video_path)
+        scores = QCAgent().run(state.job_dir, state.variants, trend_terms, state.video_path,
+                               known=state.scores, video_by_id=_video_by_id(state))
 
         # karar
-        THRESH = 75.0      # toplam skor eşiği
-        TREND_MIN = 60.0   # trendfit min
-        best_id = max(state.scores.items(), key=lambda x: x[1]["total"])[0]
-        best = state.scores[best_id]
+        best_id = max(scores.items(), key=lambda x: x[1]["total"])[0]
+        best = scores[best_id]
+        failing = [vid for vid, sc in scores.items()
+                   if sc["total"] < THRESH or sc.get("trendfit", 0) < TREND_MIN]
 
         can_revise = state.revision_count < state.max_revisions
-        state.need_revision = ((best["total"] < THRESH) or (best.get("trendfit", 0) < TREND_MIN)) and can_revise
-        return state
+        need_revision = ((best["total"] < THRESH) or (best.get("trendfit", 0) < TREND_MIN)) and can_revise
+        return {"scores": scores, "need_revision": need_revision, "failing": failing}
     except Exception as e:
-        return _append_error(state, e, "qc")
+        return _append_error(e, "qc")
 
-def node_finalize(state: FlowState) -> FlowState:
+def node_finalize(state: FlowState) -> Dict[str, Any]:
     try:
         from app.agents.finalize_agent import FinalizeAgent
         FinalizeAgent().run(state.job_dir, state.variants, state.scores)
-        return state
+        return {}
     except Exception as e:
-        return _append_error(state, e, "finalize")
+        return _append_error(e, "finalize")
+
+# --------------------- FINGERPRINTS --------------
+# Node çıktısını belirleyen girdiler; parmak izi değişmedikçe checkpoint'teki çıktı yeniden kullanılır
+# (ör. yalnızca ASO/açıklama değiştiyse Whisper/BLIP tekrar çalışmaz).
+def _fp_content_understanding(state: FlowState) -> Dict[str, Any]:
+    from app.services.analysis_cache import file_sha256
+    from app.services.asr import asr_params
+    from app.services.models import BLIP_MODEL
+    from app.services.video import dedupe_params, scene_params
+    videos = state.video_paths if _multi(state) else [state.video_path]
+    return {"videos": [file_sha256(p) for p in videos], "mode": state.video_mode if _multi(state) else "first",
+            "whisper": os.getenv("WHISPER_MODEL", "base"), "lang": os.getenv("WHISPER_LANG", "tr"),
+            "blip": BLIP_MODEL, "scenes": scene_params(), "asr": asr_params(),
+            "dedupe": dedupe_params()}
+
+def _fp_trend(state: FlowState) -> Dict[str, Any]:
+    from app.agents.trend_agent import TREND_TIMEFRAME, TrendAgent
+    agent = TrendAgent()
+    return {"seeds": _trend_seeds(_load_meta(state)), "geo": agent.geo, "hl": agent.lang, "tz": agent.tz,
+            "timeframe": TREND_TIMEFRAME}
+
+def _fp_trend_enrich(state: FlowState) -> Dict[str, Any]:
+    return {"trends": state.trends, "tags": state.vision.get("tags") or []}
+
+def _fp_generate(state: FlowState) -> Dict[str, Any]:
+    from app.agents.generation_agent_llm import GEN_VARIANTS
+    meta = _load_meta(state)
+    return {"aso": meta.get("aso_keywords", []), "description": meta.get("description", ""),
+            "tags": state.vision.get("tags", []), "terms": state.trends.get("terms", []),
+            "per_video": {vid: pv["tags"] for vid, pv in _per_video_ids(state).items()},
+            "revision": [state.need_revision, state.revision_count, state.max_revisions],
+            "failing": state.failing, "variants": state.variants if state.need_revision else None,
+            "n": GEN_VARIANTS, "model": os.getenv("GEMINI_MODEL", "gemini-2.5-flash")}
+
+def _fp_qc(state: FlowState) -> Dict[str, Any]:
+    return {"variants": state.variants, "terms": state.trends.get("terms", []), "video": state.video_path,
+            "videos": _video_by_id(state), "known": state.scores,
+            "revision": [state.revision_count, state.max_revisions]}
+
+def _fp_finalize(state: FlowState) -> Dict[str, Any]:
+    return {"variants": state.variants, "scores": state.scores}
+
+FINGERPRINTS = {
+    "content_understanding": _fp_content_understanding,
+    "trend": _fp_trend,
+    "trend_enrich": _fp_trend_enrich,
+    "generate": _fp_generate,
+    "qc": _fp_qc,
+    "finalize": _fp_finalize,
+}
+
+def _fingerprint(name: str, state: FlowState) -> Optional[str]:
+    try:
+        inputs = FINGERPRINTS[name](state)
+    except Exception:
+        return None   # girdiler okunamıyor (ör. meta.json yok): node her zaman çalışır
+    payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
 
 # --------------------- ROUTING -------------------
 def after_qc(state: FlowState) -> str:
     return "revise" if state.need_revision else "done"
 
 # --------------------- GRAPH ---------------------
-def build_graph():
+def _tracked(name: str, fn, on_node: Optional[Callable[[str], None]], checkpoints=None):
+    """
+    Node başlarken on_node(name) çağırır (iş kuyruğu durum takibi için) ve
+    node'u bir metrics span'i içinde çalıştırır (results/timings.json, /metrics).
+    checkpoints verilirse girdi parmak izi aynı olan tamamlanmış çağrı kayıttan
+    döner (reused); aksi halde node çalışır (recomputed) ve hatasız çıktısı kaydedilir.
+    """
+    from app.services.metrics import span
+    def wrapper(state: FlowState):
+        if on_node is not None:
+            on_node(name)
+        if checkpoints is None:
+            with span(name, kind="node") as rec:
+                out = fn(state) or {}
+                rec["errors"] = len(out.get("errors", []))
+            return out
+
+        key = checkpoints.next_key(name)
+        fp = _fingerprint(name, state)
+        saved = checkpoints.load(key, fp) if fp else None
+        if saved is not None:
+            with span(name, kind="node", reused=True):
+                return {**saved, "reused": [key]}
+        with span(name, kind="node") as rec:
+            out = fn(state) or {}
+            rec["errors"] = len(out.get("errors", []))
+        # önceki bir node hata verdiyse bu çıktı eksik girdiyle üretilmiş olabilir: kaydetme
+        if fp and not state.errors and not out.get("errors"):
+            checkpoints.save(key, out, fp)
+        return {**out, "recomputed": [key]}
+    return wrapper
+
+def build_graph(on_node: Optional[Callable[[str], None]] = None, checkpoints=None):
+    """
+    START ─┬─ content_understanding (sahne+kare → BLIP, ASR paralel) ─┐
+           └─ trend (meta seed'leri) ─────────────────────────────────┴─ trend_enrich → generate → qc → finalize
+    """
     g = StateGraph(FlowState)
 
-    g.add_node("content_understanding", node_content_understanding)
-    g.add_node("trend",    node_trend)
-    g.add_node("generate", node_generate)
-    g.add_node("qc",       node_qc)
-    g.add_node("finalize", node_finalize)
+    ck = checkpoints
+    g.add_node("content_understanding", _tracked("content_understanding", node_content_understanding, on_node, ck))
+    g.add_node("trend",        _tracked("trend",        node_trend,        on_node, ck))
+    g.add_node("trend_enrich", _tracked("trend_enrich", node_trend_enrich, on_node, ck))
+    g.add_node("generate",     _tracked("generate",     node_generate,     on_node, ck))
+    g.add_node("qc",           _tracked("qc",           node_qc,           on_node, ck))
+    g.add_node("finalize",     _tracked("finalize",     node_finalize,     on_node, ck))
 
-    g.set_entry_point("content_understanding")
-    g.add_edge("content_understanding", "trend")
-    g.add_edge("trend", "generate")
+    g.add_edge(START, "content_understanding")
+    g.add_edge(START, "trend")
+    g.add_edge(["content_understanding", "trend"], "trend_enrich")   # join
+    g.add_edge("trend_enrich", "generate")
     g.add_edge("generate", "qc")
     g.add_conditional_edges("qc", after_qc, {"revise": "generate", "done": "finalize"})
     g.add_edge("finalize", END)
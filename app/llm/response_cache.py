@@ -0,0 +1,76 @@
+# app/llm/response_cache.py
+import os, json, time, hashlib, threading
+from typing import Any, Dict, Optional
+
+from dotenv import load_dotenv
+from app.services.storage import cache_dir
+
+load_dotenv()
+
+LLM_MODE = os.getenv("LLM_MODE", "live")                         # live | record | replay
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(24 * 3600)))  # sn; 0 = önbellek kapalı
+LLM_CACHE_MAX = int(os.getenv("LLM_CACHE_MAX", "500"))           # en fazla kayıt
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "")
+LLM_RECORD_DIR = os.getenv("LLM_RECORD_DIR", "")
+
+
+def prompt_key(model_name: str, config: Dict[str, Any], prompt: str) -> str:
+    payload = json.dumps({"model": model_name, "config": config or {},
+                          "prompt": hashlib.sha256(prompt.encode("utf-8")).hexdigest()},
+                         sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseStore:
+    """
+    key -> LLM yanıt metni; anahtar başına bir JSON dosyası.
+
+    ttl > 0 ise süresi geçen kayıt yok sayılır; max_entries > 0 ise en eski
+    kayıtlar silinir. ttl=0 ve max_entries=0 -> kalıcı kayıt (record/replay).
+    """
+
+    def __init__(self, root: str, ttl: int = 0, max_entries: int = 0):
+        self.root = root
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                obj = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.ttl and time.time() - obj.get("ts", 0) > self.ttl:
+            return None
+        return obj.get("text")
+
+    def put(self, key: str, text: str, **meta) -> None:
+        p = self._path(key)
+        tmp = f"{p}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"ts": int(time.time()), "text": text, **meta}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, p)
+        self._evict()
+
+    def _evict(self) -> None:
+        if not self.max_entries:
+            return
+        with self._lock:
+            files = [os.path.join(self.root, f) for f in os.listdir(self.root) if f.endswith(".json")]
+            if len(files) <= self.max_entries:
+                return
+            files.sort(key=lambda p: os.path.getmtime(p))
+            for p in files[: len(files) - self.max_entries]:
+                try:
+                    os.remove(p)
+                except OSError:
+                    pass
+
+
+response_cache = ResponseStore(LLM_CACHE_DIR or cache_dir("llm"), ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX)
+recordings = ResponseStore(LLM_RECORD_DIR or cache_dir("llm_recordings"))
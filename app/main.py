@@ -1,22 +1,41 @@
 # app/main.py
-import os, json, uuid
+import os, re, json, uuid
 from fastapi import FastAPI, Body, HTTPException, Request, Form
-from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse
+from fastapi.responses import FileResponse, HTMLResponse, RedirectResponse, Response, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from dotenv import load_dotenv
 
 from app.models.schemas import IngestFolderRequest, IngestResponse, RunRequest
-from app.services.drive import download_folder, index_assets
-from app.orchestrator import run_pipeline
+from app.services.bundle import bundle_cache, bundle_key, bundle_members
+from app.services.drive import download_folder, index_assets, read_text_assets
+from app.services.events import bus
+from app.services.job_index import job_index
+from app.services.jobs import ACTIVE, JobQueue
+from app.services.results import results_cache
+from app.services.metrics import exposition
+from app.services.retention import retention, sweep
+from app.services.warmup import warmup
+from app.services.storage import STORAGE
+from app.orchestrator import VIDEO_MODES, run_pipeline
 
 load_dotenv()
 APP_DIR = os.path.dirname(__file__)
-STORAGE = os.getenv("STORAGE_PATH", os.path.abspath(os.path.join(APP_DIR, "..", "storage")))
 os.makedirs(STORAGE, exist_ok=True)
 
 UI_TITLE = os.getenv("UI_TITLE", "Ai Instagram Content Generator")
 
 app = FastAPI(title="Ai Instagram Content Generator - Multi-Agent (UI)")
+jobs = JobQueue()
+
+@app.on_event("startup")
+def _warm_up():
+    # WARMUP=imports,blip,whisper,embed -> ilk iş import/model yükleme bedelini ödemesin;
+    # varsayılan arka planda: sunucu hemen cevap verir, ilerleme /healthz'de
+    warmup.start()
+    # önceki süreçten queued/running kalan job'lar failed (interrupted) olur
+    jobs.recover()
+    # job indeksi: eski dizinleri ekle, RETENTION_INTERVAL'de bir ara çıktıları temizle
+    retention.start()
 
 # --- UI ---
 TEMPLATES_DIR = os.path.join(APP_DIR, "templates")
@@ -33,102 +52,77 @@ def _guess_game_name(aso: list[str], description: str, fallback: str) -> str:
             return k
     return fallback
 
-@app.get("/ui", response_class=HTMLResponse)
-def ui_form(request: Request):
-    return templates.TemplateResponse("form.html", {"request": request, "ui_title": UI_TITLE})
-
-@app.post("/ui/run")
-def ui_run(request: Request, folder_url: str = Form(...)):
-    job_id = uuid.uuid4().hex[:8]
+def _ingest(folder_url: str, job_id: str, game_name: str | None = None, lang: str | None = None) -> dict:
+    """Drive klasörünü indirir, asset'leri indeksler ve meta.json yazar."""
     job_dir = os.path.join(STORAGE, job_id)
     assets_dir = os.path.join(job_dir, "assets")
     os.makedirs(assets_dir, exist_ok=True)
 
-    download_folder(folder_url, assets_dir)
+    ingest_stats = download_folder(folder_url, assets_dir)
     files = index_assets(assets_dir)
 
-    aso, description = [], ""
-    for p in files.get("texts", []):
-        name = os.path.basename(p).lower()
-        if "aso" in name:
-            with open(p, "r", encoding="utf-8", errors="ignore") as f:
-                aso = [x.strip() for x in f if x.strip()]
-        if name.startswith(("desc", "description")):
-            with open(p, "r", encoding="utf-8", errors="ignore") as f:
-                description = f.read().strip()
-
-    game_name = _guess_game_name(aso, description, fallback=f"Job {job_id}")
-    lang = os.getenv("WHISPER_LANG", "tr")
+    aso, description = read_text_assets(files.get("texts", []))
 
     meta = {
         "job_id": job_id,
-        "game_name": game_name,
-        "lang": lang,
+        "game_name": game_name or _guess_game_name(aso, description, fallback=f"Job {job_id}"),
+        "lang": lang or os.getenv("WHISPER_LANG", "tr"),
         "files": files,
         "aso_keywords": aso,
         "description": description,
+        "ingest": ingest_stats,
     }
     with open(os.path.join(job_dir, "meta.json"), "w", encoding="utf-8") as f:
         json.dump(meta, f, ensure_ascii=False, indent=2)
+    job_index().record_ingest(job_dir, meta)
+    return meta
+
+@app.get("/ui", response_class=HTMLResponse)
+def ui_form(request: Request):
+    return templates.TemplateResponse("form.html", {"request": request, "ui_title": UI_TITLE})
+
+@app.post("/ui/run")
+def ui_run(request: Request, folder_url: str = Form(...)):
+    job_id = uuid.uuid4().hex[:8]
+    job_dir = os.path.join(STORAGE, job_id)
+    os.makedirs(job_dir, exist_ok=True)
 
-    run_pipeline(job_dir)
+    def work(on_node):
+        on_node("ingest")
+        _ingest(folder_url, job_id)
+        run_pipeline(job_dir, on_node=on_node)
+
+    jobs.submit(job_id, job_dir, work)
     return RedirectResponse(url=f"/ui/{job_id}", status_code=303)
 
 @app.get("/ui/{job_id}", response_class=HTMLResponse)
 def ui_results(request: Request, job_id: str):
     job_dir = os.path.join(STORAGE, job_id)
-    results_dir = os.path.join(job_dir, "results")
-    if not os.path.isdir(results_dir):
+    st = jobs.status(job_id, job_dir)
+    if st and st["status"] != "finished":
+        # iş bitmedi: sonuç sayfası durumu yoklar, bitince kendini yeniler
+        return templates.TemplateResponse("pending.html", {
+            "request": request, "ui_title": UI_TITLE, "job_id": job_id, "status": st,
+        })
+    # tek belge (results/results.json), bellekte mtime ile doğrulanarak tutulur
+    doc = results_cache.get(job_dir)
+    if doc is None:
         raise HTTPException(status_code=404, detail="Results not found")
 
-    def jload(name, default=None):
-        p = os.path.join(results_dir, name)
-        return json.load(open(p, "r", encoding="utf-8")) if os.path.isfile(p) else default
-
-    summary   = jload("summary.json", {})
-    captions  = jload("captions.json", {})
-    scores    = jload("scores.json", {})
-    trends    = jload("trends.json", {"terms": []})
-    scenes    = jload("scenes.json", [])
-    state     = jload("state.json", {"errors":[]})
-    cu        = jload("content_understanding.json", {})
-    vision_json = jload("vision.json", {})
-
-    vision_caps = []
-    if isinstance(vision_json, dict) and "captions" in vision_json:
-        vision_caps = vision_json["captions"]
-    elif isinstance(cu, dict):
-        if "vision" in cu and isinstance(cu["vision"], dict) and "captions" in cu["vision"]:
-            vision_caps = cu["vision"]["captions"]
-        elif "captions" in cu:
-            vision_caps = cu["captions"]
-
-    import glob
-    frames = sorted(glob.glob(os.path.join(results_dir, "frames", "*.jpg")))[:12]
-    bundle_ok = os.path.isfile(os.path.join(results_dir, "bundle.zip"))
-
-    meta_path = os.path.join(job_dir, "meta.json")
-    game_name = ""
-    if os.path.isfile(meta_path):
-        try:
-            game_name = json.load(open(meta_path, "r", encoding="utf-8")).get("game_name", "")
-        except Exception:
-            pass
-
     return templates.TemplateResponse("results.html", {
         "request": request,
         "ui_title": UI_TITLE,
         "job_id": job_id,
-        "game_name": game_name,
-        "summary": summary,
-        "captions": captions,
-        "scores": scores,
-        "trends": trends.get("terms", []),
-        "vision_caps": vision_caps,
-        "scenes": scenes,
-        "frames": [f"/jobs/{job_id}/files/results/frames/{os.path.basename(x)}" for x in frames],
-        "bundle_ok": bundle_ok,
-        "errs": state.get("errors", []),
+        "game_name": doc["game_name"],
+        "summary": doc["summary"],
+        "captions": doc["captions"],
+        "scores": doc["scores"],
+        "trends": doc["trends"],
+        "vision_caps": doc["vision_caps"],
+        "scenes": doc["scenes"],
+        "frames": [f"/jobs/{job_id}/files/results/frames/{x}" for x in doc["frames"]],
+        "bundle_ok": doc["bundle_ok"],   # paket istek anında üretilir
+        "errs": doc["errors"],
     })
 
 @app.get("/jobs/{job_id}/files/{path:path}")
@@ -143,51 +137,170 @@ def serve_result(job_id: str, path: str):
 def root():
     return {"status": "ok", "docs": "/docs", "ui": "/ui"}
 
+@app.get("/healthz")
+def healthz():
+    return {"status": "ok", "warmup": warmup.status()}
+
 @app.post("/ingest", response_model=IngestResponse)
 def ingest(req: IngestFolderRequest = Body(...)):
     job_id = uuid.uuid4().hex[:8]
-    job_dir = os.path.join(STORAGE, job_id)
-    assets_dir = os.path.join(job_dir, "assets")
-    os.makedirs(assets_dir, exist_ok=True)
-
-    download_folder(req.folder_url, assets_dir)
-    files = index_assets(assets_dir)
-
-    aso, description = [], ""
-    for p in files.get("texts", []):
-        name = os.path.basename(p).lower()
-        if "aso" in name:
-            with open(p, "r", encoding="utf-8", errors="ignore") as f:
-                aso = [x.strip() for x in f if x.strip()]
-        if name.startswith(("desc", "description")):
-            with open(p, "r", encoding="utf-8", errors="ignore") as f:
-                description = f.read().strip()
-
-    meta = {
-        "job_id": job_id,
-        "game_name": req.game_name,
-        "lang": req.lang,
-        "files": files,
-        "aso_keywords": aso,
-        "description": description,
-    }
-    with open(os.path.join(job_dir, "meta.json"), "w", encoding="utf-8") as f:
-        json.dump(meta, f, ensure_ascii=False, indent=2)
-
-    return {"job_id": job_id, "assets": files}
+    meta = _ingest(req.folder_url, job_id, game_name=req.game_name, lang=req.lang)
+    return {"job_id": job_id, "assets": meta["files"]}
 
 @app.post("/run")
 def run(req: RunRequest = Body(...)):
     job_dir = os.path.join(STORAGE, req.job_id)
     if not os.path.isdir(job_dir):
         raise HTTPException(status_code=404, detail="job not found")
-    run_pipeline(job_dir)
-    return {"job_id": req.job_id, "status": "done"}
+    if req.video_mode and req.video_mode not in VIDEO_MODES:
+        raise HTTPException(status_code=400, detail=f"video_mode must be one of {', '.join(VIDEO_MODES)}")
+    rec = job_index().get(req.job_id)
+    if rec and rec.get("gc_at"):
+        raise HTTPException(status_code=410, detail="job assets were removed by retention; ingest again")
+    st = jobs.submit(req.job_id, job_dir,
+                     lambda on_node: run_pipeline(job_dir, on_node=on_node, fresh=req.fresh,
+                                                  video_mode=req.video_mode, force=req.force))
+    return {"job_id": req.job_id, "status": st["status"], "status_url": f"/jobs/{req.job_id}/status"}
 
-@app.get("/jobs/{job_id}/bundle")
-def bundle(job_id: str):
+@app.get("/jobs")
+def list_jobs(status: str | None = None, q: str | None = None, since: float | None = None,
+              until: float | None = None, min_score: float | None = None, order: str = "created_at",
+              desc: bool = True, limit: int = 50, offset: int = 0):
+    """SQLite job indeksinden sayfalı liste; status virgülle çoklu (ör. finished,failed), q oyun adı/job id."""
+    return job_index().list(status=status, q=q, since=since, until=until, min_score=min_score,
+                            order=order, desc=desc, limit=limit, offset=offset)
+
+@app.post("/jobs/gc")
+def jobs_gc(dry_run: bool = True):
+    """Retention politikasını hemen uygular; varsayılan dry_run yalnızca silinecekleri listeler."""
+    return sweep(dry_run=dry_run)
+
+@app.get("/jobs/{job_id}/status")
+def job_status(job_id: str):
+    st = jobs.status(job_id, os.path.join(STORAGE, job_id))
+    if st is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return st
+
+@app.get("/jobs/{job_id}/results")
+def job_results(job_id: str):
+    """Sonuç sayfasıyla aynı birleşik belge (JSON); iş sürüyorsa 409, başarısız işte kısmi sonuç."""
     job_dir = os.path.join(STORAGE, job_id)
-    bundle_path = os.path.join(job_dir, "results", "bundle.zip")
-    if not os.path.isfile(bundle_path):
+    st = jobs.status(job_id, job_dir)
+    if st and st["status"] in ACTIVE:
+        raise HTTPException(status_code=409, detail=f"job is {st['status']}")
+    doc = results_cache.get(job_dir)
+    if doc is None:
+        raise HTTPException(status_code=404, detail="results not found")
+    return doc
+
+@app.get("/jobs/{job_id}/events")
+def job_events(job_id: str, request: Request):
+    """
+    Server-sent events: status / variant / score olayları; iş bitince "end"
+    olayıyla kapanır (istemci yeniden bağlanmaz). Akış event loop'ta bekler,
+    threadpool thread'i tutmaz.
+    """
+    st = jobs.status(job_id, os.path.join(STORAGE, job_id))
+    if st is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    try:
+        last_id = int(request.headers.get("last-event-id") or 0)
+    except ValueError:
+        last_id = 0
+
+    async def gen():
+        yield "retry: 3000\n\n"
+        if not bus.has(job_id):
+            # bu süreçte olay günlüğü yok (yeniden başlatma / eski iş): diskteki son durum
+            yield f"event: status\ndata: {json.dumps(st, ensure_ascii=False)}\n\n"
+        else:
+            async for ev in bus.stream(job_id, last_id):
+                if ev is None:
+                    yield ": keepalive\n\n"
+                    continue
+                eid, kind, data = ev
+                yield f"id: {eid}\nevent: {kind}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+        yield "event: end\ndata: {}\n\n"
+
+    return StreamingResponse(gen(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def _byte_range(header: str, size: int):
+    """Tek aralıklı 'bytes=a-b' / 'bytes=a-' / 'bytes=-n' -> (start, end) dahil; desteklenmeyen biçim (çok aralık) None -> tam paket."""
+    m = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header or "")
+    if not m or m.group(1) == m.group(2) == "":
+        return None
+    if m.group(1) == "":
+        start, end = max(0, size - int(m.group(2))), size - 1
+    else:
+        start = int(m.group(1))
+        end = min(int(m.group(2)), size - 1) if m.group(2) else size - 1
+    if start > end or start >= size:
+        raise HTTPException(status_code=416, detail="range not satisfiable",
+                            headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+def _file_slice(path: str, start: int, end: int, chunk: int = 256 * 1024):
+    with open(path, "rb") as f:
+        f.seek(start)
+        left = end - start + 1
+        while left > 0:
+            data = f.read(min(chunk, left))
+            if not data:
+                break
+            left -= len(data)
+            yield data
+
+@app.get("/jobs/{job_id}/bundle")
+def bundle(job_id: str, request: Request):
+    """
+    Paket istek anında akıtılır (medya ZIP_STORED, metin deflate). Girdilerin
+    içerik hash'i hem ETag hem önbellek anahtarıdır: If-None-Match -> 304,
+    Range (yarım kalan indirmeyi sürdürme) önbellekteki tam dosyadan 206.
+    """
+    results_dir = os.path.join(STORAGE, job_id, "results")
+    items = bundle_members(results_dir) if os.path.isdir(results_dir) else []
+    if not items:
         raise HTTPException(status_code=404, detail="bundle not found")
-    return FileResponse(bundle_path, filename=f"{job_id}_bundle.zip")
+    key = bundle_key(items)
+    etag = f'"{key}"'
+    headers = {"ETag": etag, "Accept-Ranges": "bytes",
+               "Content-Disposition": f'attachment; filename="{job_id}_bundle.zip"'}
+
+    inm = request.headers.get("if-none-match", "")
+    if etag in [t.strip() for t in inm.split(",")] or inm.strip() == "*":
+        return Response(status_code=304, headers={"ETag": etag})
+
+    rng = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if rng and if_range and if_range.strip() != etag:
+        rng = None   # istemcinin elindeki parça başka bir pakete ait: tamamını gönder
+
+    path = bundle_cache.get(key)
+    if path is None and rng:
+        path = bundle_cache.build(key, items)   # aralık için tam dosya gerekir
+    if path is None:
+        if not bundle_cache.enabled:
+            headers["Accept-Ranges"] = "none"
+        return StreamingResponse(bundle_cache.stream(key, items), media_type="application/zip", headers=headers)
+
+    size = os.path.getsize(path)
+    part = _byte_range(rng, size) if rng else None
+    if part is None:
+        # FileResponse Range'i kendisi yeniden yorumlar (çok aralık, If-Range); kararı burada veriyoruz
+        headers["Content-Length"] = str(size)
+        return StreamingResponse(_file_slice(path, 0, size - 1), media_type="application/zip", headers=headers)
+    start, end = part
+    headers.update({"Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)})
+    return StreamingResponse(_file_slice(path, start, end), status_code=206,
+                             media_type="application/zip", headers=headers)
+
+@app.get("/metrics")
+def metrics():
+    # node / alt adım süre histogramları (Prometheus text formatı)
+    out = exposition()
+    if out is None:
+        raise HTTPException(status_code=501, detail="prometheus_client is not installed")
+    body, content_type = out
+    return Response(content=body, media_type=content_type)
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 class IngestFolderRequest(BaseModel):
     folder_url: str = "https://drive.google.com/drive/folders/1oC9JL4sKlNYtnhYM6JcMEc5Fm_c_T7WX?usp=drive_link"
@@ -12,3 +12,6 @@ class IngestResponse(BaseModel):
 
 class RunRequest(BaseModel):
     job_id: str
+    fresh: bool = False   # True: LLM yanıt önbelleğini atla, yeni varyant üret
+    force: bool = False   # True: checkpoint'leri yok say, tüm node'ları baştan çalıştır
+    video_mode: Optional[str] = None   # first | merge | per_video (varsayılan: VIDEO_MODE env)
@@ -1,17 +1,65 @@
 import os, json
-from app.graph.flow import build_graph, FlowState
+from typing import Callable, Optional
+from app.graph.checkpoints import CHECKPOINTS, NodeCheckpoints
+from app.services.drive import read_text_assets
+from app.services.job_index import job_index
+from app.services.metrics import recording
+from app.services.results import results_cache, write_results
 
-def run_pipeline(job_dir: str):
-    meta = json.load(open(os.path.join(job_dir, "meta.json"), "r", encoding="utf-8"))
+VIDEO_MODES = ("first", "merge", "per_video")
+VIDEO_MODE = os.getenv("VIDEO_MODE", "first")   # first | merge | per_video
+
+def _refresh_meta(meta_path: str, meta: dict) -> None:
+    # asset klasöründeki ASO/açıklama dosyaları düzenlendiyse meta.json'a yansıt
+    texts = [p for p in meta.get("files", {}).get("texts", []) if os.path.isfile(p)]
+    if not texts:
+        return
+    aso, description = read_text_assets(texts)
+    if aso != meta.get("aso_keywords") or description != meta.get("description"):
+        meta.update(aso_keywords=aso, description=description)
+        with open(meta_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+
+def run_pipeline(job_dir: str, on_node: Optional[Callable[[str], None]] = None, fresh: bool = False,
+                 video_mode: Optional[str] = None, force: bool = False):
+    """
+    Girdi parmak izi değişmemiş node'lar <job_dir>/checkpoints'tan geri yüklenir;
+    yalnızca tamamlanmamış ya da girdisi değişen node'lar çalışır (state.reused /
+    state.recomputed). force=True baştan çalıştırır, fresh=True üretim ve
+    sonrasını (generate, qc, finalize) yeniden hesaplar.
+    """
+    meta_path = os.path.join(job_dir, "meta.json")
+    with open(meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    _refresh_meta(meta_path, meta)
     videos = meta.get("files", {}).get("videos", [])
     if not videos:
         raise RuntimeError("No video found in assets.")
     video_path = videos[0]
+    video_mode = video_mode or VIDEO_MODE
+    if video_mode not in VIDEO_MODES:
+        raise ValueError(f"Unknown video_mode: {video_mode} (expected one of {', '.join(VIDEO_MODES)})")
+
+    # langgraph + ajan zinciri ağır: sunucu açılışında değil ilk işte yüklenir
+    from app.graph.flow import build_graph, FlowState
+
+    state = FlowState(job_id=os.path.basename(job_dir), job_dir=job_dir, video_path=video_path,
+                      video_paths=videos if video_mode != "first" else [video_path],
+                      video_mode=video_mode, fresh_generation=fresh)
+    results_dir = os.path.join(job_dir, "results")
+    os.makedirs(results_dir, exist_ok=True)
 
-    state = FlowState(job_id=os.path.basename(job_dir), job_dir=job_dir, video_path=video_path)
-    graph = build_graph()
-    final_state = graph.invoke(state)  
-    print("FINAL_STATE_TYPE:", type(final_state))
+    checkpoints = None
+    if CHECKPOINTS:
+        checkpoints = NodeCheckpoints(job_dir, force=force, rerun=("generate", "qc", "finalize") if fresh else ())
+
+    # node + alt adım süreleri (wall/CPU/RSS, ffmpeg, model yükleme, LLM) -> results/timings.json
+    graph = build_graph(on_node=on_node, checkpoints=checkpoints)
+    with recording() as rec:
+        try:
+            final_state = graph.invoke(state)
+        finally:
+            rec.write(os.path.join(results_dir, "timings.json"))
 
     if isinstance(final_state, dict):
         dumpable = final_state
@@ -25,7 +73,10 @@ def run_pipeline(job_dir: str):
         except Exception:
             dumpable = {"value": str(final_state)}
 
-    results_dir = os.path.join(job_dir, "results")
-    os.makedirs(results_dir, exist_ok=True)
     with open(os.path.join(results_dir, "state.json"), "w", encoding="utf-8") as f:
-        json.dump(dumpable, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+        json.dump(dumpable, f, ensure_ascii=False, indent=2)
+
+    # sonuç sayfası / API tek belge okur (results/results.json)
+    doc = write_results(job_dir)
+    results_cache.invalidate(job_dir)
+    job_index().record_results(job_dir, doc)
\ No newline at end of file
@@ -0,0 +1,210 @@
+# app/services/analysis_cache.py
+import os, json, time, shutil, hashlib, threading, uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Optional, Tuple
+
+from app.services.storage import cache_dir
+
+try:
+    import fcntl
+except ImportError:   # Windows: claim() yalnızca süreç içinde tekilleştirir
+    fcntl = None
+
+ANALYSIS_CACHE = os.getenv("ANALYSIS_CACHE", "1") == "1"
+ANALYSIS_CACHE_DIR = os.getenv("ANALYSIS_CACHE_DIR", "")
+ANALYSIS_CACHE_MB = int(os.getenv("ANALYSIS_CACHE_MB", "2048"))
+ANALYSIS_VERSION = 1   # önbellek biçimi/analiz mantığı değişince artır
+
+# content understanding'in results/ altına yazdığı ve önbelleğe alınan çıktılar
+CACHED_FILES = ("scenes.json", "subtitles.srt", "transcript.json")
+CACHED_DIRS = ("frames",)
+RESULTS_TOKEN = "{results}"
+
+
+# ---- Dosya hash'i ----------------------------------------------------------------
+_hash_memo: Dict[Tuple[str, int, int], str] = {}
+_hash_lock = threading.Lock()
+
+def file_sha256(path: str) -> str:
+    """Dosya içeriğinin sha256'sı; (path, size, mtime) aynı kaldıkça tekrar okunmaz."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    with _hash_lock:
+        if memo_key in _hash_memo:
+            return _hash_memo[memo_key]
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    digest = h.hexdigest()
+    with _hash_lock:
+        _hash_memo[memo_key] = digest
+    return digest
+
+
+def _rebase(obj: Any, old: str, new: str) -> Any:
+    """JSON ağacındaki old ile başlayan yolları new ile değiştirir."""
+    if isinstance(obj, str):
+        return new + obj[len(old):] if obj.startswith(old) else obj
+    if isinstance(obj, list):
+        return [_rebase(x, old, new) for x in obj]
+    if isinstance(obj, dict):
+        return {k: _rebase(v, old, new) for k, v in obj.items()}
+    return obj
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for fn in files:
+            try:
+                total += os.path.getsize(os.path.join(root, fn))
+            except OSError:
+                pass
+    return total
+
+
+class AnalysisCache:
+    """
+    Video başına içerik analizi (sahneler, kareler, SRT/transcript, BLIP
+    caption'ları) için içerik-adresli önbellek.
+
+    - Anahtar: video sha256 + model/parametre sürümleri (key()).
+    - Hit olursa çıktılar job'ın results/ dizinine kopyalanır ve yollar yeniden
+      yazılır; hiçbir şey yeniden hesaplanmaz.
+    - Toplam boyut max_mb'yi aşarsa en uzun süredir kullanılmayan girdiler silinir.
+    - claim(key): aynı anahtar için aynı anda gelen işler tek hesaplamaya iner;
+      kilit .locks/<key>.lock üzerinde flock olduğundan video worker süreçleri
+      ve birden fazla sunucu süreci arasında da geçerlidir.
+    """
+
+    def __init__(self, root: str, max_mb: int = ANALYSIS_CACHE_MB, enabled: bool = True):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.max_bytes = max(0, max_mb) * 1024 * 1024
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._key_locks: Dict[str, threading.Lock] = {}
+
+    def key(self, video_path: str, **params) -> str:
+        payload = {"v": ANALYSIS_VERSION, "video": file_sha256(video_path), "params": params}
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    @contextmanager
+    def claim(self, key: str):
+        with self._lock:
+            lock = self._key_locks.setdefault(key, threading.Lock())
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            locks = os.path.join(self.root, ".locks")
+            os.makedirs(locks, exist_ok=True)
+            with open(os.path.join(locks, f"{key}.lock"), "a") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def restore(self, key: str, job_dir: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        entry = os.path.join(self.root, key)
+        data_path = os.path.join(entry, "analysis.json")
+        if not os.path.isfile(data_path):
+            return None
+
+        results_dir = os.path.join(job_dir, "results")
+        os.makedirs(results_dir, exist_ok=True)
+        for d in CACHED_DIRS:
+            src = os.path.join(entry, d)
+            if os.path.isdir(src):
+                shutil.copytree(src, os.path.join(results_dir, d), dirs_exist_ok=True)
+        for fn in CACHED_FILES:
+            src = os.path.join(entry, fn)
+            if not os.path.isfile(src):
+                continue
+            if fn.endswith(".json"):
+                with open(src, "r", encoding="utf-8") as f:
+                    obj = _rebase(json.load(f), RESULTS_TOKEN, results_dir)
+                with open(os.path.join(results_dir, fn), "w", encoding="utf-8") as f:
+                    json.dump(obj, f, ensure_ascii=False, indent=2)
+            else:
+                shutil.copy2(src, os.path.join(results_dir, fn))
+
+        with open(data_path, "r", encoding="utf-8") as f:
+            data = _rebase(json.load(f), RESULTS_TOKEN, results_dir)
+        self._touch(entry)
+        return data
+
+    def store(self, key: str, job_dir: str, data: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        entry = os.path.join(self.root, key)
+        if os.path.isdir(entry):
+            self._touch(entry)
+            return
+
+        results_dir = os.path.join(job_dir, "results")
+        tmp = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(tmp)
+        try:
+            for d in CACHED_DIRS:
+                src = os.path.join(results_dir, d)
+                if os.path.isdir(src):
+                    shutil.copytree(src, os.path.join(tmp, d))
+            for fn in CACHED_FILES:
+                src = os.path.join(results_dir, fn)
+                if not os.path.isfile(src):
+                    continue
+                if fn.endswith(".json"):
+                    with open(src, "r", encoding="utf-8") as f:
+                        obj = _rebase(json.load(f), results_dir, RESULTS_TOKEN)
+                    with open(os.path.join(tmp, fn), "w", encoding="utf-8") as f:
+                        json.dump(obj, f, ensure_ascii=False)
+                else:
+                    shutil.copy2(src, os.path.join(tmp, fn))
+            with open(os.path.join(tmp, "analysis.json"), "w", encoding="utf-8") as f:
+                json.dump(_rebase(data, results_dir, RESULTS_TOKEN), f, ensure_ascii=False)
+            self._touch(tmp)
+            os.rename(tmp, entry)
+        except OSError:
+            # başka bir süreç aynı anahtarı bizden önce yazdıysa onunki kalsın
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+        self._evict(keep=key)
+
+    # ---- Internal -------------------------------------------------------------
+    @staticmethod
+    def _touch(entry: str) -> None:
+        marker = os.path.join(entry, ".used")
+        with open(marker, "a"):
+            pass
+        os.utime(marker, None)
+
+    def _evict(self, keep: str) -> None:
+        if not self.max_bytes:
+            return
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                used = os.path.getmtime(os.path.join(path, ".used"))
+            except OSError:
+                used = 0.0
+            entries.append((used, name, _dir_size(path)))
+        total = sum(sz for _, _, sz in entries)
+        for _, name, sz in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+            total -= sz
+
+
+analysis_cache = AnalysisCache(ANALYSIS_CACHE_DIR or cache_dir("analysis"),
+                               max_mb=ANALYSIS_CACHE_MB, enabled=ANALYSIS_CACHE)
@@ -1,8 +1,13 @@
 # app/services/asr.py
-import os, json, subprocess, shutil
-from typing import Optional
+import os, json, subprocess, shutil, threading, wave
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+import numpy as np
 from dotenv import load_dotenv
-import whisper
+
+from app.services.metrics import span
+from app.services.models import get_whisper
 
 load_dotenv()  # .env oku
 
@@ -11,36 +16,175 @@ def _bin(name: str, env_name: str) -> str:
     return os.getenv(env_name) or shutil.which(name) or ""
 
 FFMPEG = _bin("ffmpeg", "FFMPEG_PATH")
-if not FFMPEG:
-    raise RuntimeError("ffmpeg bulunamadı. FFMPEG_PATH ortam değişkenini ayarla veya ffmpeg'i PATH'e ekle.")
-ffmpeg_dir = os.path.dirname(FFMPEG)
-os.environ["PATH"] = ffmpeg_dir + os.pathsep + os.environ.get("PATH", "")
+if FFMPEG:
+    ffmpeg_dir = os.path.dirname(FFMPEG)
+    os.environ["PATH"] = ffmpeg_dir + os.pathsep + os.environ.get("PATH", "")
 
-def extract_audio_wav16(video_path: str, wav_path: str):
-    os.makedirs(os.path.dirname(wav_path), exist_ok=True)
+SAMPLE_RATE = 16000
+
+# chunked: ses sessiz noktalardan / sahne sınırlarından parçalanır, parçalar süreç havuzunda deşifre edilir
+ASR_MODE = os.getenv("ASR_MODE", "single")                 # single | chunked
+ASR_SPLIT = os.getenv("ASR_SPLIT", "silence")              # silence | scenes
+ASR_CHUNK_SECONDS = float(os.getenv("ASR_CHUNK_SECONDS", "30"))
+ASR_WORKERS = int(os.getenv("ASR_WORKERS", "2"))           # her worker kendi Whisper kopyasını yükler
+ASR_KEEP_WAV = os.getenv("ASR_KEEP_WAV", "0") == "1"       # results/audio_16k.wav'ı diske de yaz
+
+# whisper decode sırasında modele kv-cache hook'ları takar; paylaşılan model
+# aynı anda iki transcribe çağrısında kullanılmamalı
+_TRANSCRIBE_LOCK = threading.Lock()
+
+def asr_params() -> Dict[str, Any]:
+    """Transcript'i etkileyen ayarlar (analiz önbelleği anahtarı için)."""
+    if ASR_MODE != "chunked":
+        return {"mode": "single"}
+    return {"mode": "chunked", "split": ASR_SPLIT, "chunk_s": ASR_CHUNK_SECONDS}
+
+def decode_audio(video_path: str) -> np.ndarray:
+    """
+    Videonun sesini tek ffmpeg çağrısıyla mono 16 kHz float32 diziye çözer
+    (whisper.load_audio ile aynı biçim); dosyaya yazılmaz, model.transcribe'a
+    doğrudan verilir.
+    """
+    if not FFMPEG:
+        raise RuntimeError("ffmpeg bulunamadı. FFMPEG_PATH ortam değişkenini ayarla veya ffmpeg'i PATH'e ekle.")
     cmd = [
-        FFMPEG, "-y", "-i", video_path,
-        "-ac", "1", "-ar", "16000",   # mono, 16 kHz
-        "-vn", wav_path
+        FFMPEG, "-nostdin", "-i", video_path,
+        "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),   # mono, 16 kHz
+        "-f", "s16le", "-acodec", "pcm_s16le", "-"
     ]
-    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+    with span("ffmpeg:audio", kind="subprocess"):
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=False)
+    if proc.returncode != 0 and not proc.stdout:
+        raise RuntimeError(f"ffmpeg sesi çözemedi: {proc.stderr.decode(errors='ignore')[-500:]}")
+    return np.frombuffer(proc.stdout, np.int16).astype(np.float32) / 32768.0
 
-def transcribe_to_srt(job_dir: str, video_path: str, model_name: str = "base", language: Optional[str] = None):
-    results_dir = os.path.join(job_dir, "results")
-    os.makedirs(results_dir, exist_ok=True)
+def write_wav16(audio: np.ndarray, wav_path: str):
+    """float32 ses dizisini 16-bit PCM WAV olarak yazar (ASR_KEEP_WAV=1)."""
+    os.makedirs(os.path.dirname(wav_path), exist_ok=True)
+    pcm = (np.clip(audio, -1.0, 1.0) * 32767).astype("<i2")
+    with wave.open(wav_path, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(SAMPLE_RATE)
+        w.writeframes(pcm.tobytes())
+
+# ---- Parçalama ------------------------------------------------------------------
+def silence_cuts(audio: np.ndarray, chunk_s: float = ASR_CHUNK_SECONDS, search_s: float = 5.0,
+                 frame_s: float = 0.02) -> List[float]:
+    """
+    Her ~chunk_s saniyede bir, hedefin ±search_s çevresindeki en düşük enerjili
+    (RMS) 20 ms'lik çerçeveden keser. Kesim zamanlarını (sn) döndürür.
+    """
+    hop = int(frame_s * SAMPLE_RATE)
+    n = len(audio) // hop
+    if n == 0:
+        return []
+    rms = np.sqrt(np.mean(audio[: n * hop].reshape(n, hop).astype(np.float32) ** 2, axis=1))
+    total = len(audio) / SAMPLE_RATE
+    cuts, last = [], 0.0
+    while total - last > chunk_s * 1.5:
+        target = last + chunk_s
+        lo = max(int((target - search_s) / frame_s), int(last / frame_s) + 1)
+        hi = min(int((target + search_s) / frame_s), n - 1)
+        if hi <= lo:
+            break
+        cut = (lo + int(np.argmin(rms[lo:hi]))) * frame_s
+        cuts.append(round(cut, 3))
+        last = cut
+    return cuts
+
+def scene_cuts(scene_starts: Sequence[float], total_s: float, chunk_s: float = ASR_CHUNK_SECONDS) -> List[float]:
+    """Sahne başlangıçlarını, parçalar en az chunk_s olacak şekilde gruplar."""
+    cuts, last = [], 0.0
+    for t in sorted(scene_starts):
+        if t - last >= chunk_s and total_s - t >= chunk_s * 0.5:
+            cuts.append(round(float(t), 3))
+            last = t
+    return cuts
 
-    # 1) sesi çıkar
-    wav_path = os.path.join(results_dir, "audio_16k.wav")
-    extract_audio_wav16(video_path, wav_path)
+def _split(audio: np.ndarray, cuts: Sequence[float]) -> List[Tuple[float, np.ndarray]]:
+    bounds = [0] + [int(c * SAMPLE_RATE) for c in cuts] + [len(audio)]
+    return [(b0 / SAMPLE_RATE, audio[b0:b1]) for b0, b1 in zip(bounds, bounds[1:]) if b1 > b0]
 
-    # 2) whisper modelini yükle
-    model = whisper.load_model(model_name)
+# ---- Deşifre --------------------------------------------------------------------
+_POOL: Optional[ProcessPoolExecutor] = None
+_POOL_LOCK = threading.Lock()
+
+def _pool() -> ProcessPoolExecutor:
+    """Worker'lar Whisper'ı bir kez yükler ve job'lar arasında tutar; bu yüzden havuz süreç ömürlü."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(max_workers=max(1, ASR_WORKERS), mp_context=mp.get_context("spawn"))
+        return _POOL
+
+def _transcribe_chunk(model_name: str, audio: np.ndarray, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    # worker sürecinde: tek thread, kilit gerekmez
+    return get_whisper(model_name).transcribe(audio, **kwargs)
+
+def _merge(parts: List[Tuple[float, Dict[str, Any]]]) -> Dict[str, Any]:
+    """Parça sonuçlarını offset'lerle kaydırıp tek pass çıktısı biçiminde birleştirir."""
+    segments = []
+    for offset, res in parts:
+        for seg in res.get("segments", []):
+            seg = dict(seg)
+            seg["id"] = len(segments)
+            seg["start"] = round(seg["start"] + offset, 3)
+            seg["end"] = round(seg["end"] + offset, 3)
+            if "seek" in seg:
+                seg["seek"] += int(round(offset * 100))   # whisper seek: 10 ms'lik çerçeve
+            if seg.get("words"):
+                seg["words"] = [{**w, "start": round(w["start"] + offset, 3), "end": round(w["end"] + offset, 3)}
+                                for w in seg["words"]]
+            segments.append(seg)
+    language = next((r.get("language") for _, r in parts if r.get("language")), None)
+    return {"text": "".join(r.get("text", "") for _, r in parts), "segments": segments, "language": language}
+
+def transcribe(audio: np.ndarray, model_name: str = "base", language: Optional[str] = None,
+               mode: Optional[str] = None, scene_times: Optional[Sequence[float]] = None,
+               chunk_s: float = ASR_CHUNK_SECONDS) -> Dict[str, Any]:
+    """
+    mode=single: tüm ses tek model.transcribe çağrısı.
+    mode=chunked: ses parçalanır (scene_times verilirse ve ASR_SPLIT=scenes ise sahne
+    sınırlarından, yoksa sessiz noktalardan), parçalar süreç havuzunda deşifre edilir
+    ve zaman damgaları parçanın başlangıcına göre kaydırılır.
+    """
+    mode = mode or ASR_MODE
     kwargs = dict(temperature=0.0, fp16=False)
     if language:
         kwargs["language"] = language
 
-    # 3) deşifre
-    res = model.transcribe(wav_path, **kwargs)
+    if mode == "chunked":
+        total = len(audio) / SAMPLE_RATE
+        cuts: List[float] = []
+        if ASR_SPLIT == "scenes" and scene_times:
+            cuts = scene_cuts(scene_times, total, chunk_s)
+        # sahne listesi kısaysa (MAX_SCENES) kalan kuyruk sessiz noktalardan bölünür
+        tail = cuts[-1] if cuts else 0.0
+        cuts += [round(tail + c, 3) for c in silence_cuts(audio[int(tail * SAMPLE_RATE):], chunk_s)]
+        chunks = _split(audio, cuts)
+        if len(chunks) > 1:
+            with span("whisper", kind="model", mode="chunked", chunks=len(chunks), audio_s=round(total, 1)):
+                futures = [(offset, _pool().submit(_transcribe_chunk, model_name, a, kwargs)) for offset, a in chunks]
+                return _merge([(offset, f.result()) for offset, f in futures])
+        # kısa ses: parçalamaya değmez, tek pass
+
+    model = get_whisper(model_name)
+    with _TRANSCRIBE_LOCK, span("whisper", kind="model", mode="single", audio_s=round(len(audio) / SAMPLE_RATE, 1)):
+        return model.transcribe(audio, **kwargs)
+
+def transcribe_to_srt(job_dir: str, video_path: str, model_name: str = "base", language: Optional[str] = None,
+                      scene_times: Optional[Sequence[float]] = None):
+    results_dir = os.path.join(job_dir, "results")
+    os.makedirs(results_dir, exist_ok=True)
+
+    # 1) sesi belleğe çöz (WAV yalnızca ASR_KEEP_WAV=1 ise yazılır)
+    audio = decode_audio(video_path)
+    if ASR_KEEP_WAV:
+        write_wav16(audio, os.path.join(results_dir, "audio_16k.wav"))
+
+    # 2-3) whisper (süreç içinde paylaşılan registry'den) ile deşifre
+    res = transcribe(audio, model_name, language, scene_times=scene_times)
     segments = res.get("segments", [])
 
     # 4) SRT yaz
@@ -0,0 +1,174 @@
+# app/services/bundle.py
+import os, json, hashlib, uuid, zipfile
+from typing import IO, Iterator, List, Optional, Tuple
+
+from app.services.analysis_cache import file_sha256
+from app.services.storage import cache_dir
+
+BUNDLE_CACHE = os.getenv("BUNDLE_CACHE", "1") == "1"
+BUNDLE_CACHE_DIR = os.getenv("BUNDLE_CACHE_DIR", "")
+BUNDLE_CACHE_MB = int(os.getenv("BUNDLE_CACHE_MB", "512"))
+BUNDLE_FRAMES = int(os.getenv("BUNDLE_FRAMES", "6"))
+BUNDLE_VERSION = 2   # paket içeriği/düzeni değişince artır
+
+BUNDLE_FILES = ("captions.json", "hashtags.txt", "subtitles.srt", "scenes.json", "summary.json")
+# zaten sıkıştırılmış biçimler: deflate CPU harcar ama boyut düşmez -> ZIP_STORED
+STORED_EXT = {".jpg", ".jpeg", ".png", ".webp", ".gif", ".mp4", ".mov", ".m4v", ".mp3", ".m4a", ".zip", ".gz"}
+CHUNK = 256 * 1024
+ZIP_EPOCH = (1980, 1, 1, 0, 0, 0)   # zip'in yazabildiği en eski tarih; ETag içerik hash'i olduğundan sabit
+
+
+def bundle_members(results_dir: str) -> List[Tuple[str, str]]:
+    """Pakete girecek (dosya yolu, arşiv adı) çiftleri."""
+    items = []
+    for fn in BUNDLE_FILES:
+        fp = os.path.join(results_dir, fn)
+        if os.path.isfile(fp):
+            items.append((fp, fn))
+    frames = os.path.join(results_dir, "frames")
+    if os.path.isdir(frames):
+        for name in sorted(os.listdir(frames))[:BUNDLE_FRAMES]:
+            items.append((os.path.join(frames, name), f"frames/{name}"))
+    return items
+
+
+def bundle_key(items: List[Tuple[str, str]]) -> str:
+    """Girdilerin içerik hash'i; aynı çıktılar aynı paket (ve aynı ETag) demektir."""
+    payload = {"v": BUNDLE_VERSION, "files": [[arc, file_sha256(fp)] for fp, arc in items]}
+    return hashlib.sha256(json.dumps(payload).encode("utf-8")).hexdigest()
+
+
+def _compress_type(arcname: str) -> int:
+    return zipfile.ZIP_STORED if os.path.splitext(arcname)[1].lower() in STORED_EXT else zipfile.ZIP_DEFLATED
+
+
+class _Sink:
+    """ZipFile'ın yazdığını biriktirir (drain ile boşaltılır); tee verilirse diske de yazar."""
+
+    def __init__(self, tee: Optional[IO[bytes]] = None):
+        self._buf: List[bytes] = []
+        self._tee = tee
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._buf.append(data)
+        if self._tee is not None:
+            self._tee.write(data)
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        out = b"".join(self._buf)
+        self._buf.clear()
+        return out
+
+
+def stream_zip(items: List[Tuple[str, str]], tee: Optional[IO[bytes]] = None) -> Iterator[bytes]:
+    """
+    Zip'i parça parça üretir; seek gerektirmez (boyutlar data descriptor'da),
+    böylece ilk baytlar paket bitmeden gönderilebilir. Girdilerin mtime'ı
+    yazılmaz: aynı içerik her seferinde bayt bayt aynı zip'i (aynı ETag) verir.
+    """
+    sink = _Sink(tee)
+    with zipfile.ZipFile(sink, "w") as z:
+        for fp, arcname in items:
+            zi = zipfile.ZipInfo.from_file(fp, arcname)
+            zi.date_time = ZIP_EPOCH
+            zi.compress_type = _compress_type(arcname)
+            with open(fp, "rb") as src, z.open(zi, "w", force_zip64=zi.file_size > zipfile.ZIP64_LIMIT) as dst:
+                for chunk in iter(lambda: src.read(CHUNK), b""):
+                    dst.write(chunk)
+                    data = sink.drain()
+                    if data:
+                        yield data
+            data = sink.drain()
+            if data:
+                yield data
+    data = sink.drain()   # central directory
+    if data:
+        yield data
+
+
+class BundleCache:
+    """
+    İçerik hash'ine (bundle_key) göre saklanan hazır paketler.
+
+    - stream(): paketi üretirken istemciye akıtır ve aynı anda tmp dosyaya yazar;
+      akış tamamlanınca tmp yerine konur (yarıda kesilen indirme kayıt bırakmaz).
+    - build(): Range isteği gibi tam dosya gerektiren durumlarda paketi önce diske yazar.
+    - Toplam boyut max_mb'yi aşarsa en uzun süredir kullanılmayan paketler silinir.
+    """
+
+    def __init__(self, root: str, max_mb: int = BUNDLE_CACHE_MB, enabled: bool = True):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.max_bytes = max(0, max_mb) * 1024 * 1024
+        self.enabled = enabled
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.zip")
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        path = self.path(key)
+        if not os.path.isfile(path):
+            return None
+        os.utime(path, None)
+        return path
+
+    def stream(self, key: str, items: List[Tuple[str, str]]) -> Iterator[bytes]:
+        if not self.enabled:
+            yield from stream_zip(items)
+            return
+        tmp = os.path.join(self.root, f".tmp-{uuid.uuid4().hex}")
+        done = False
+        try:
+            with open(tmp, "wb") as f:
+                yield from stream_zip(items, tee=f)
+            os.replace(tmp, self.path(key))
+            done = True
+        finally:
+            if not done:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+        self._evict(keep=key)
+
+    def build(self, key: str, items: List[Tuple[str, str]]) -> Optional[str]:
+        for _ in self.stream(key, items):
+            pass
+        return self.get(key)
+
+    # ---- Internal -------------------------------------------------------------
+    def _evict(self, keep: str) -> None:
+        if not self.max_bytes:
+            return
+        entries = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith(".") or not os.path.isfile(path):
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, name, st.st_size))
+        total = sum(sz for _, _, sz in entries)
+        for _, name, sz in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == f"{keep}.zip":
+                continue
+            try:
+                os.remove(os.path.join(self.root, name))
+            except OSError:
+                pass
+            total -= sz
+
+
+bundle_cache = BundleCache(BUNDLE_CACHE_DIR or cache_dir("bundles"),
+                           max_mb=BUNDLE_CACHE_MB, enabled=BUNDLE_CACHE)
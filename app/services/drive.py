@@ -1,19 +1,226 @@
-import os
-from typing import Dict, List
-import gdown
+import os, json, time, shutil, inspect, threading
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.services.analysis_cache import file_sha256
+from app.services.metrics import bind, span
+from app.services.storage import cache_dir
 
 VIDEO_EXT = {".mp4", ".mov", ".mkv"}
 IMAGE_EXT = {".jpg", ".jpeg", ".png"}
+TEXT_EXT = {".txt", ".json"}
+
+DRIVE_CONCURRENCY = int(os.getenv("DRIVE_CONCURRENCY", "4"))
+# dosya indirme adresi; yerel bir HTTP taklidine yönlendirmek için ör. http://127.0.0.1:8001/{id}
+DRIVE_URL_TEMPLATE = os.getenv("DRIVE_URL_TEMPLATE", "https://drive.google.com/uc?id={id}")
+DRIVE_STORE = os.getenv("DRIVE_STORE", "1") == "1"         # job'lar arası dosya deposu (file id + sha256)
+DRIVE_STORE_TTL = int(os.getenv("DRIVE_STORE_TTL", "0"))   # sn; 0 = file id kaydı süresiz geçerli
+DRIVE_STORE_DIR = os.getenv("DRIVE_STORE_DIR", "")
+DRIVE_PROBE_TIMEOUT = float(os.getenv("DRIVE_PROBE_TIMEOUT", "10"))   # sürüm için HEAD isteği (sn)
+
+
+def _wanted(name: str) -> bool:
+    return os.path.splitext(name)[1].lower() in VIDEO_EXT | IMAGE_EXT | TEXT_EXT
+
+
+def _place(src: str, dst: str, link: bool) -> None:
+    """Medya hard-link ile (aynı inode, kopya yok); metinler kopyalanır ki job'da düzenlenebilsin."""
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    if os.path.exists(dst) and os.path.samefile(src, dst):
+        return   # zaten aynı inode (rename iki link arasında hiçbir şey yapmaz)
+    tmp = f"{dst}.{threading.get_ident()}.tmp"
+    if link:
+        try:
+            os.link(src, tmp)
+            os.replace(tmp, dst)
+            return
+        except OSError:   # farklı dosya sistemi / desteklenmiyor
+            pass
+    shutil.copyfile(src, tmp)
+    os.replace(tmp, dst)
+
+
+class AssetStore:
+    """
+    İndirilmiş Drive dosyalarının içerik adresli deposu.
+
+    blobs/<sha256>        dosya içeriği (job asset'leri buna hard-link'lenir)
+    ids/<file_id>.json    {"sha256", "name", "size", "version", "ts"}
+
+    Drive'da düzenlenen dosya id'sini korur; bu yüzden bir kayıt yalnızca
+    uzak sürüm (boyut, değişiklik zamanı / ETag) aynıysa kullanılır. Sürümü
+    bilinmeyen dosya her seferinde indirilir; farklı id ama aynı içerik yine
+    tek blob olarak tutulur.
+    """
+
+    def __init__(self, root: str, ttl: int = DRIVE_STORE_TTL):
+        self.root = root
+        self.ttl = ttl
+        os.makedirs(os.path.join(root, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(root, "ids"), exist_ok=True)
+
+    def _id_path(self, file_id: str) -> str:
+        return os.path.join(self.root, "ids", f"{file_id}.json")
+
+    def lookup(self, file_id: str, version: Optional[Dict[str, Any]]) -> Optional[str]:
+        if not version:
+            return None
+        try:
+            with open(self._id_path(file_id), "r", encoding="utf-8") as f:
+                rec = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if rec.get("version") != version:
+            return None
+        if self.ttl and time.time() - rec.get("ts", 0) > self.ttl:
+            return None
+        blob = os.path.join(self.root, "blobs", rec["sha256"])
+        return blob if os.path.isfile(blob) else None
+
+    def add(self, file_id: str, path: str, link: bool = True, version: Optional[Dict[str, Any]] = None) -> str:
+        sha = file_sha256(path)
+        blob = os.path.join(self.root, "blobs", sha)
+        if not os.path.isfile(blob):
+            _place(path, blob, link=link)
+        rec = {"sha256": sha, "name": os.path.basename(path), "size": os.path.getsize(path),
+               "version": version, "ts": int(time.time())}
+        tmp = f"{self._id_path(file_id)}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(rec, f)
+        os.replace(tmp, self._id_path(file_id))
+        return blob
+
+    def prune(self, max_age: float) -> int:
+        """Hiçbir job'a link'li olmayan (nlink == 1) ve max_age sn'dir dokunulmamış blob'ları siler."""
+        freed, now = 0, time.time()
+        blobs = os.path.join(self.root, "blobs")
+        for name in os.listdir(blobs):
+            path = os.path.join(blobs, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if st.st_nlink == 1 and now - max(st.st_mtime, st.st_ctime) > max_age:
+                try:
+                    os.remove(path)
+                    freed += st.st_size
+                except OSError:
+                    pass
+        return freed   # ids/ kayıtları kalır; lookup() blob yoksa indirmeye düşer
 
-def download_folder(folder_url: str, dest_dir: str) -> None:
+
+_store: Optional[AssetStore] = None
+
+def _asset_store() -> Optional[AssetStore]:
+    global _store
+    if DRIVE_STORE and _store is None:
+        _store = AssetStore(DRIVE_STORE_DIR or cache_dir("drive"))
+    return _store
+
+
+def _can_list(download_folder: Any) -> bool:
+    """gdown.download_folder indirmeden listeleyebiliyor mu (skip_download, gdown >= 5)."""
+    try:
+        return "skip_download" in inspect.signature(download_folder).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+def list_folder(folder_url: str, dest_dir: str) -> Optional[List[Tuple[str, str]]]:
+    """
+    Klasörü indirmeden listeler: [(file_id, dest_dir'e göre yol)]. gdown'ın
+    kaydı yalnızca id/path/local_path taşır; sürüm _probe() ile alınır.
+    Kurulu gdown listelemeyi desteklemiyorsa None.
+    """
+    import gdown   # requests/bs4 zinciri; yalnızca ingest'te gerekir
+    if not _can_list(gdown.download_folder):
+        return None
+    with span("drive:list", kind="external"):
+        files = gdown.download_folder(url=folder_url, output=dest_dir, quiet=True, use_cookies=False,
+                                      skip_download=True) or []
+    return [(f.id, os.path.relpath(f.local_path, dest_dir)) for f in files]
+
+
+def _probe(file_id: str) -> Optional[Dict[str, Any]]:
+    """İndirme adresine HEAD: Content-Length + ETag/Last-Modified; HTML ara sayfası ya da hata -> None."""
+    req = urllib.request.Request(DRIVE_URL_TEMPLATE.format(id=file_id), method="HEAD")
+    try:
+        with span("drive:probe", kind="external"):
+            with urllib.request.urlopen(req, timeout=DRIVE_PROBE_TIMEOUT) as r:
+                headers = r.headers
+    except (OSError, ValueError):
+        return None
+    if (headers.get("Content-Type") or "").startswith("text/html"):
+        return None
+    version = {"size": headers.get("Content-Length"), "etag": headers.get("ETag"),
+               "modified": headers.get("Last-Modified")}
+    version = {k: v for k, v in version.items() if v}
+    return version if ("etag" in version or "modified" in version) else None
+
+
+def _fetch(file_id: str, out_path: str) -> None:
+    import gdown
+    os.makedirs(os.path.dirname(out_path), exist_ok=True)
+    tmp = f"{out_path}.part"
+    try:
+        with span("drive:download", kind="external"):
+            got = gdown.download(url=DRIVE_URL_TEMPLATE.format(id=file_id), output=tmp, quiet=True,
+                                 use_cookies=False)
+        if not got or not os.path.isfile(tmp):
+            raise RuntimeError(f"Drive download failed: {file_id}")
+        os.replace(tmp, out_path)
+    finally:
+        if os.path.exists(tmp):   # yarım indirme assets/'te kalmasın
+            os.remove(tmp)
+
+
+def download_folder(folder_url: str, dest_dir: str) -> Dict[str, Any]:
+    """
+    Klasörü önce listeler; yalnızca index_assets'in tanıdığı uzantılar
+    (video, görsel, txt/json) DRIVE_CONCURRENCY paralel indirmeyle çekilir.
+    Medya dosyası depoda aynı file id + aynı uzak sürümle varsa indirilmez,
+    job'ın assets/ dizinine hard-link'lenir. Metinler (ASO, açıklama) küçüktür
+    ve Drive'da düzenlenebilir: her ingest'te yeniden indirilir.
+    Dönüş: {"listed", "skipped", "linked", "downloaded", "errors"}
+    """
     os.makedirs(dest_dir, exist_ok=True)
-    gdown.download_folder(
-        url=folder_url,
-        output=dest_dir,
-        quiet=False,
-        use_cookies=False,
-        remaining_ok=True,
-    )
+    entries = list_folder(folder_url, dest_dir)
+    if entries is None:
+        # skip_download desteklemeyen eski gdown: klasörün tamamı sırayla indirilir
+        import gdown
+        gdown.download_folder(url=folder_url, output=dest_dir, quiet=False, use_cookies=False)
+        return {"legacy": True}
+    wanted = [(fid, rel) for fid, rel in entries if _wanted(rel)]
+    stats = {"listed": len(entries), "skipped": len(entries) - len(wanted),
+             "linked": 0, "downloaded": 0, "errors": 0}
+    store = _asset_store()
+
+    def one(fid: str, rel: str) -> str:
+        dst = os.path.join(dest_dir, rel)
+        if store is None or rel.lower().endswith(tuple(TEXT_EXT)):
+            _fetch(fid, dst)   # metinler depoya girmez: her zaman güncel, job'da düzenlenebilir kopya
+            return "downloaded"
+        version = _probe(fid)
+        blob = store.lookup(fid, version)
+        if blob:
+            _place(blob, dst, link=True)
+            return "linked"
+        _fetch(fid, dst)
+        blob = store.add(fid, dst, version=version)
+        _place(blob, dst, link=True)   # aynı içerik başka id ile depodaysa tek inode
+        return "downloaded"
+
+    if wanted:
+        with ThreadPoolExecutor(max_workers=max(1, min(DRIVE_CONCURRENCY, len(wanted))),
+                                thread_name_prefix="drive") as ex:
+            futures = [ex.submit(bind(one), fid, rel) for fid, rel in wanted]
+            for fut in futures:
+                try:
+                    stats[fut.result()] += 1
+                except Exception:
+                    stats["errors"] += 1
+    return stats
 
 def index_assets(dest_dir: str) -> Dict[str, List[str]]:
     videos, images, texts = [], [], []
@@ -25,6 +232,19 @@ def index_assets(dest_dir: str) -> Dict[str, List[str]]:
                 videos.append(p)
             elif any(low.endswith(ext) for ext in IMAGE_EXT):
                 images.append(p)
-            elif low.endswith(".txt") or low.endswith(".json"):
+            elif any(low.endswith(ext) for ext in TEXT_EXT):
                 texts.append(p)
     return {"videos": videos, "images": images, "texts": texts}
+
+def read_text_assets(texts: List[str]) -> Tuple[List[str], str]:
+    """aso*.txt -> satır satır ASO anahtar kelimeleri, desc*/description* -> açıklama."""
+    aso, description = [], ""
+    for p in texts:
+        name = os.path.basename(p).lower()
+        if "aso" in name:
+            with open(p, "r", encoding="utf-8", errors="ignore") as f:
+                aso = [x.strip() for x in f if x.strip()]
+        if name.startswith(("desc", "description")):
+            with open(p, "r", encoding="utf-8", errors="ignore") as f:
+                description = f.read().strip()
+    return aso, description
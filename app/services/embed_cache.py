@@ -0,0 +1,176 @@
+# app/services/embed_cache.py
+import os, json, hashlib, threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:   # Windows: disk deposu tek süreçle kullanılmalı
+    fcntl = None
+
+EMBED_CACHE_MAX = int(os.getenv("EMBED_CACHE_MAX", "50000"))   # bellekteki vektör sayısı
+EMBED_CACHE_DIR = os.getenv("EMBED_CACHE_DIR", "")              # boşsa diske yazılmaz
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class _DiskStore:
+    """
+    Tek model için diskte vektör deposu: vectors.f32 (satır satır float32) +
+    index.json (text hash -> satır). Okuma np.memmap ile yapılır.
+
+    Birden fazla süreç (uvicorn worker'ları, video worker'ları) aynı dizini
+    paylaşabilir: add() .lock üzerinde flock tutar, index.json'ı kilit altında
+    yeniden okur ve satır numarasını dosya boyutundan hesaplar. vectors.f32'ye
+    yazılıp index.json'a geçmeden kalan satırlar (çökme) bir sonraki add()'de
+    kesilir; dosya sonunu aşan index girdileri yüklenirken atılır.
+    """
+
+    def __init__(self, root: str, model: str):
+        self.dir = os.path.join(root, hashlib.sha1(model.encode("utf-8")).hexdigest()[:16])
+        os.makedirs(self.dir, exist_ok=True)
+        self.vec_path = os.path.join(self.dir, "vectors.f32")
+        self.idx_path = os.path.join(self.dir, "index.json")
+        self.lock_path = os.path.join(self.dir, ".lock")
+        self.rows: Dict[str, int] = {}
+        self.dim: Optional[int] = None
+        self.mm: Optional[np.memmap] = None
+        self._idx_mtime: Optional[int] = None
+        self._load()
+
+    def _load(self) -> None:
+        try:
+            mtime = os.stat(self.idx_path).st_mtime_ns
+            with open(self.idx_path, "r", encoding="utf-8") as f:
+                idx = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.dim, self._idx_mtime = idx.get("dim"), mtime
+        n = self._file_rows()
+        self.rows = {k: r for k, r in idx.get("rows", {}).items() if r < n}
+        self._remap(self._used_rows())
+
+    def _file_rows(self) -> int:
+        """vectors.f32'deki tam satır sayısı."""
+        if not self.dim or not os.path.isfile(self.vec_path):
+            return 0
+        return os.path.getsize(self.vec_path) // (self.dim * 4)
+
+    def _used_rows(self) -> int:
+        """index.json'ın kullandığı satır sayısı; ötesi çökmeden kalmış artıktır."""
+        return max(self.rows.values(), default=-1) + 1
+
+    def _remap(self, n: int) -> None:
+        self.mm = None
+        if n and self.dim:
+            self.mm = np.memmap(self.vec_path, dtype="float32", mode="r", shape=(n, self.dim))
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        row = self.rows.get(key)
+        if row is None:
+            try:   # başka bir süreç eklemiş olabilir
+                changed = os.stat(self.idx_path).st_mtime_ns != self._idx_mtime
+            except OSError:
+                changed = False
+            if changed:
+                self._load()
+                row = self.rows.get(key)
+        if row is None or self.mm is None:
+            return None
+        return np.array(self.mm[row])
+
+    def add(self, keys: List[str], vecs: np.ndarray) -> None:
+        with open(self.lock_path, "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self._load()
+                new, seen = [], set(self.rows)
+                for k, v in zip(keys, vecs):
+                    if k not in seen:
+                        seen.add(k)
+                        new.append((k, v))
+                if not new:
+                    return
+                self.dim = self.dim or int(vecs.shape[1])
+                n = self._used_rows()
+                with open(self.vec_path, "ab") as f:
+                    f.truncate(n * self.dim * 4)   # index'e girmemiş / yarım satırlar
+                    for i, (k, v) in enumerate(new):
+                        self.rows[k] = n + i
+                        f.write(np.asarray(v, dtype="float32").tobytes())
+                tmp = f"{self.idx_path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim, "rows": self.rows}, f)
+                os.replace(tmp, self.idx_path)
+                self._idx_mtime = os.stat(self.idx_path).st_mtime_ns
+                self._remap(n + len(new))
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class EmbeddingCache:
+    """
+    (model, text) -> normalize edilmiş embedding önbelleği.
+
+    Bellekte LRU (max_items) tutulur; root verilmişse vektörler ayrıca diske
+    yazılır ve süreç yeniden başladığında memory-mapped olarak okunur.
+    """
+
+    def __init__(self, root: str = EMBED_CACHE_DIR, max_items: int = EMBED_CACHE_MAX):
+        self.root = root
+        self.max_items = max(1, max_items)
+        self._lock = threading.Lock()
+        self._mem: "OrderedDict[Tuple[str, str], np.ndarray]" = OrderedDict()
+        self._disk: Dict[str, _DiskStore] = {}
+
+    def _store(self, model: str) -> Optional[_DiskStore]:
+        if not self.root:
+            return None
+        if model not in self._disk:
+            self._disk[model] = _DiskStore(self.root, model)
+        return self._disk[model]
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[np.ndarray]]:
+        out: List[Optional[np.ndarray]] = []
+        with self._lock:
+            disk = self._store(model)
+            for t in texts:
+                key = (model, _text_key(t))
+                vec = self._mem.get(key)
+                if vec is None and disk is not None:
+                    vec = disk.get(key[1])
+                    if vec is not None:
+                        self._put(key, vec)
+                if vec is not None:
+                    self._mem.move_to_end(key)
+                out.append(vec)
+        return out
+
+    def put_many(self, model: str, texts: List[str], vecs: np.ndarray) -> None:
+        with self._lock:
+            keys = [_text_key(t) for t in texts]
+            for k, v in zip(keys, vecs):
+                self._put((model, k), np.asarray(v, dtype="float32"))
+            disk = self._store(model)
+            if disk is not None:
+                disk.add(keys, vecs)
+
+    def clear(self) -> None:
+        """Bellekteki vektörleri bırakır (disk deposu korunur)."""
+        with self._lock:
+            self._mem.clear()
+
+    def _put(self, key: Tuple[str, str], vec: np.ndarray) -> None:
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.max_items:
+            self._mem.popitem(last=False)
+
+
+embed_cache = EmbeddingCache()
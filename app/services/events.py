@@ -0,0 +1,98 @@
+# app/services/events.py
+import asyncio, threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
+
+Event = Tuple[int, str, Any]   # (id, kind, data)
+
+
+class EventBus:
+    """
+    Job başına sıralı olay günlüğü (status, variant, score ...).
+
+    SSE endpoint'i stream() ile okur; Last-Event-ID'den devam edebilir.
+    Bellekte en fazla max_jobs job ve job başına max_events olay tutulur.
+
+    publish() iş thread'lerinden çağrılır; stream() ise event loop üzerinde
+    bekler (asyncio.Event, call_soon_threadsafe ile uyandırılır): açık sayfa
+    başına threadpool thread'i tutulmaz.
+    """
+
+    def __init__(self, max_jobs: int = 200, max_events: int = 500):
+        self.max_jobs = max_jobs
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._logs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._waiters: Dict[str, Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]]] = {}
+
+    def publish(self, job_id: str, kind: str, data: Any, final: bool = False) -> None:
+        """final=True: job bitti; açık stream'ler kalan olayları verip kapanır."""
+        with self._lock:
+            log = self._logs.get(job_id)
+            if log is None:
+                log = self._logs[job_id] = {"events": [], "next": 1, "closed": False}
+                while len(self._logs) > self.max_jobs:
+                    self._logs.popitem(last=False)
+            self._logs.move_to_end(job_id)
+            log["events"].append((log["next"], kind, data))
+            log["next"] += 1
+            del log["events"][:-self.max_events]
+            log["closed"] = final
+            self._wake(job_id)
+
+    def reset(self, job_id: str) -> None:
+        """Job yeniden kuyruğa alınınca önceki çalıştırmanın olayları tekrar oynatılmasın."""
+        with self._lock:
+            self._logs.pop(job_id, None)
+            self._wake(job_id)
+
+    def has(self, job_id: str) -> bool:
+        """Bu süreçte job'ın olay günlüğü var mı (yoksa stream() hemen kapanır)."""
+        with self._lock:
+            return job_id in self._logs
+
+    async def stream(self, job_id: str, last_id: int = 0, keepalive: float = 15.0) -> AsyncIterator[Optional[Event]]:
+        """Olayları sırayla verir; beklerken her keepalive saniyede bir None üretir."""
+        loop = asyncio.get_running_loop()
+        waiter = (loop, asyncio.Event())
+        with self._lock:
+            self._waiters.setdefault(job_id, set()).add(waiter)
+        try:
+            while True:
+                waiter[1].clear()
+                with self._lock:
+                    pending, closed = self._pending(job_id, last_id)
+                if pending:
+                    for ev in pending:
+                        last_id = ev[0]
+                        yield ev
+                    continue
+                if closed:
+                    return
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            with self._lock:
+                waiters = self._waiters.get(job_id)
+                if waiters is not None:
+                    waiters.discard(waiter)
+                    if not waiters:
+                        del self._waiters[job_id]
+
+    def _wake(self, job_id: str) -> None:
+        for loop, ev in self._waiters.get(job_id, ()):
+            try:
+                loop.call_soon_threadsafe(ev.set)
+            except RuntimeError:   # loop kapanmış
+                pass
+
+    def _pending(self, job_id: str, last_id: int):
+        log = self._logs.get(job_id)
+        if log is None:
+            return [], True
+        return [e for e in log["events"] if e[0] > last_id], log["closed"]
+
+
+bus = EventBus()
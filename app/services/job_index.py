@@ -0,0 +1,201 @@
+# app/services/job_index.py
+import os, json, sqlite3, threading, time
+from typing import Any, Dict, Iterable, List, Optional
+
+from app.services.storage import STORAGE
+
+JOB_INDEX_PATH = os.getenv("JOB_INDEX_PATH", "") or os.path.join(STORAGE, "_jobs.sqlite3")
+
+COLUMNS = {
+    "job_id": "TEXT PRIMARY KEY",
+    "status": "TEXT",             # ingested | queued | running | finished | failed
+    "game_name": "TEXT",
+    "lang": "TEXT",
+    "videos": "INTEGER",
+    "created_at": "REAL",
+    "queued_at": "REAL",
+    "started_at": "REAL",
+    "finished_at": "REAL",
+    "updated_at": "REAL",
+    "wall_s": "REAL",             # kuyruktan bağımsız çalışma süresi (finished_at - started_at)
+    "best_score": "REAL",
+    "selected": "TEXT",
+    "size_bytes": "INTEGER",      # job dizininin yalnızca kendine ait (hard-link'siz) baytları
+    "error": "TEXT",
+    "gc_at": "REAL",              # retention ara çıktıları sildiyse zamanı
+    "gc_freed_bytes": "INTEGER",
+}
+ORDERS = {"created_at", "finished_at", "updated_at", "best_score", "size_bytes", "wall_s"}
+
+
+def job_size(job_dir: str) -> int:
+    """Job dizininin boyutu; başka yerle paylaşılan (hard-link'li) dosyalar sayılmaz."""
+    total = 0
+    for root, _, files in os.walk(job_dir):
+        for fn in files:
+            try:
+                st = os.stat(os.path.join(root, fn))
+            except OSError:
+                continue
+            if st.st_nlink == 1:
+                total += st.st_size
+    return total
+
+
+def _read_json(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class JobIndex:
+    """
+    storage/<job_id> dizinlerinin SQLite indeksi: listeleme/arama dosya
+    sistemini dolaşmaz. Ingest, iş kuyruğu (durum değişimleri) ve pipeline
+    sonu günceller; sync() indekste olmayan eski dizinleri ekler.
+
+    İndeks yardımcıdır: yazma hataları işi düşürmez, sync() ile onarılır.
+    """
+
+    def __init__(self, path: str = JOB_INDEX_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            cols = ", ".join(f"{k} {v}" for k, v in COLUMNS.items())
+            self._db.execute(f"CREATE TABLE IF NOT EXISTS jobs ({cols})")
+            have = {r["name"] for r in self._db.execute("PRAGMA table_info(jobs)")}
+            for k, v in COLUMNS.items():
+                if k not in have:   # eski indekse sonradan eklenen kolonlar
+                    self._db.execute(f"ALTER TABLE jobs ADD COLUMN {k} {v}")
+            for k in ("status", "created_at", "game_name"):
+                self._db.execute(f"CREATE INDEX IF NOT EXISTS jobs_{k} ON jobs({k})")
+
+    def upsert(self, job_id: str, keep: Iterable[str] = (), **fields) -> None:
+        """keep: satır zaten varsa üzerine yazılmayacak kolonlar (ör. ingest'in status'u)."""
+        fields = {k: v for k, v in fields.items() if k in COLUMNS and k != "job_id"}
+        fields["updated_at"] = round(time.time(), 3)
+        names = ["job_id", *fields]
+        update = ", ".join(f"{k}=excluded.{k}" for k in fields if k not in set(keep))
+        sql = (f"INSERT INTO jobs ({', '.join(names)}) VALUES ({', '.join('?' * len(names))}) "
+               f"ON CONFLICT(job_id) DO UPDATE SET {update}")
+        try:
+            with self._lock:
+                self._db.execute(sql, [job_id, *fields.values()])
+        except sqlite3.Error:
+            pass
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE job_id=?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def list(self, status: Optional[str] = None, q: Optional[str] = None, since: Optional[float] = None,
+             until: Optional[float] = None, min_score: Optional[float] = None, order: str = "created_at",
+             desc: bool = True, limit: int = 50, offset: int = 0) -> Dict[str, Any]:
+        where, args = [], []
+        statuses = [s.strip() for s in (status or "").split(",") if s.strip()]   # "finished, failed"
+        if statuses:
+            where.append(f"status IN ({', '.join('?' * len(statuses))})")
+            args += statuses
+        if q:
+            where.append("(game_name LIKE ? OR job_id LIKE ?)")
+            args += [f"%{q}%", f"{q}%"]
+        if since is not None:
+            where.append("created_at >= ?")
+            args.append(since)
+        if until is not None:
+            where.append("created_at < ?")
+            args.append(until)
+        if min_score is not None:
+            where.append("best_score >= ?")
+            args.append(min_score)
+        cond = f"WHERE {' AND '.join(where)}" if where else ""
+        order = order if order in ORDERS else "created_at"
+        limit = max(1, min(int(limit), 500))
+        offset = max(0, int(offset))
+        with self._lock:
+            total = self._db.execute(f"SELECT COUNT(*) FROM jobs {cond}", args).fetchone()[0]
+            rows = self._db.execute(
+                f"SELECT * FROM jobs {cond} ORDER BY {order} IS NULL, {order} {'DESC' if desc else 'ASC'}, job_id "
+                f"LIMIT ? OFFSET ?", [*args, limit, offset]).fetchall()
+        return {"total": total, "limit": limit, "offset": offset, "items": [dict(r) for r in rows]}
+
+    def gc_candidates(self, active: Iterable[str]) -> List[Dict[str, Any]]:
+        """Ara çıktıları henüz silinmemiş, çalışmayan job'lar; en eskiden yeniye."""
+        active = list(active)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT * FROM jobs WHERE gc_at IS NULL AND status NOT IN ({', '.join('?' * len(active))}) "
+                f"ORDER BY COALESCE(finished_at, created_at, updated_at)", active).fetchall()
+        return [dict(r) for r in rows]
+
+    def total_size(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM jobs").fetchone()[0]
+
+    # ---- Kayıt noktaları --------------------------------------------------------
+    def record_ingest(self, job_dir: str, meta: Dict[str, Any], created_at: Optional[float] = None) -> None:
+        self.upsert(meta["job_id"], keep=("status", "created_at"), status="ingested",
+                    created_at=created_at or round(time.time(), 3), game_name=meta.get("game_name"),
+                    lang=meta.get("lang"), videos=len(meta.get("files", {}).get("videos", [])), size_bytes=job_size(job_dir))
+
+    def record_status(self, st: Dict[str, Any]) -> None:
+        wall = None
+        if st.get("started_at") and st.get("finished_at"):
+            wall = round(st["finished_at"] - st["started_at"], 3)
+        error = (st.get("error") or "").strip().splitlines()
+        self.upsert(st["job_id"], keep=("created_at",), status=st["status"], created_at=st.get("queued_at"),
+                    queued_at=st.get("queued_at"), started_at=st.get("started_at"),
+                    finished_at=st.get("finished_at"), wall_s=wall, error=error[-1] if error else None)
+
+    def record_results(self, job_dir: str, doc: Dict[str, Any]) -> None:
+        summary = doc.get("summary") or {}
+        fields = {"game_name": doc.get("game_name"), "best_score": summary.get("score"),
+                  "selected": summary.get("selected")}
+        self.upsert(doc["job_id"], size_bytes=job_size(job_dir), **{k: v for k, v in fields.items() if v is not None})
+
+    def sync(self, storage: str = STORAGE) -> int:
+        """İndekste olmayan job dizinlerini (meta/status/results dosyalarından) ekler."""
+        with self._lock:
+            known = {r[0] for r in self._db.execute("SELECT job_id FROM jobs")}
+        added = 0
+        for name in sorted(os.listdir(storage)) if os.path.isdir(storage) else []:
+            job_dir = os.path.join(storage, name)
+            if name in known or name.startswith("_") or not os.path.isdir(job_dir):
+                continue
+            meta = _read_json(os.path.join(job_dir, "meta.json"))
+            st = _read_json(os.path.join(job_dir, "status.json"))
+            if meta is None and st is None:
+                continue
+            created = min(t for t in [os.path.getmtime(job_dir), (st or {}).get("queued_at")] if t)
+            if meta is not None:
+                meta["job_id"] = name
+                self.record_ingest(job_dir, meta, created_at=created)
+            if st is not None:
+                st["job_id"] = name
+                self.record_status(st)
+            # results.json'dan önceki job'larda yalnızca summary.json var
+            doc = (_read_json(os.path.join(job_dir, "results", "results.json"))
+                   or {"summary": _read_json(os.path.join(job_dir, "results", "summary.json"))})
+            if doc.get("summary"):
+                self.record_results(job_dir, {**doc, "job_id": name})
+            added += 1
+        return added
+
+
+_index: Optional[JobIndex] = None
+_index_lock = threading.Lock()
+
+def job_index() -> JobIndex:
+    """Tek süreç içi indeks; ilk kullanımda açılır (import sırasında dosya oluşturulmaz)."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = JobIndex()
+        return _index
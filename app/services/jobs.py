@@ -0,0 +1,153 @@
+# app/services/jobs.py
+import os, json, time, threading, traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.services.events import bus
+from app.services.job_index import job_index
+from app.services.storage import STORAGE
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+
+STATUS_FILE = "status.json"
+ACTIVE = ("queued", "running")
+INTERRUPTED = "interrupted: server restarted before the job finished"
+
+
+def _now() -> float:
+    return round(time.time(), 3)
+
+
+def _snapshot(st: Dict[str, Any]) -> Dict[str, Any]:
+    return {**st, "nodes": list(st["nodes"])}
+
+
+def _write_status(job_dir: str, st: Dict[str, Any]) -> None:
+    # yarım yazılmış status.json okunmasın diye tmp + replace
+    path = os.path.join(job_dir, STATUS_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(st, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def read_status(job_dir: str) -> Optional[Dict[str, Any]]:
+    path = os.path.join(job_dir, STATUS_FILE)
+    if not os.path.isfile(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception:
+        return None
+
+
+class JobQueue:
+    """
+    Süreç içi iş kuyruğu.
+
+    - İşler sabit boyutlu bir thread havuzunda çalışır (JOB_WORKERS); istek
+      handler'ı job_id'yi hemen döndürür.
+    - Durum: queued -> running -> finished | failed. Çalışan node adı ve
+      zaman damgaları hem bellekte hem <job_dir>/status.json içinde tutulur.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._dirs: Dict[str, str] = {}
+
+    def submit(self, job_id: str, job_dir: str, fn: Callable[[Callable[[str], None]], Any]) -> Dict[str, Any]:
+        """
+        fn(on_node) arka planda çalıştırılır; on_node(name) çağrıları durumu
+        günceller. Aynı job zaten kuyrukta/çalışıyorsa mevcut durum döner.
+        """
+        with self._lock:
+            cur = self._jobs.get(job_id)
+            if cur and cur["status"] in ACTIVE:
+                return dict(cur)
+            st = {
+                "job_id": job_id,
+                "status": "queued",
+                "node": None,
+                "error": None,
+                "queued_at": _now(),
+                "started_at": None,
+                "finished_at": None,
+                "updated_at": _now(),
+                "nodes": [],
+            }
+            self._jobs[job_id] = st
+            self._dirs[job_id] = job_dir
+            _write_status(job_dir, st)
+            job_index().record_status(st)
+            bus.reset(job_id)
+            bus.publish(job_id, "status", _snapshot(st))
+        self._pool.submit(self._work, job_id, fn)
+        return dict(st)
+
+    def status(self, job_id: str, job_dir: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            st = self._jobs.get(job_id)
+            if st is not None:
+                return json.loads(json.dumps(st))
+        # süreç yeniden başladıysa diskteki son durumu oku
+        return read_status(job_dir) if job_dir else None
+
+    def recover(self, storage: str = STORAGE) -> int:
+        """
+        Açılışta çağrılır: önceki süreçte queued/running kalmış job'lar artık
+        çalışmıyor; failed (interrupted) işaretlenir. Yoksa bekleme sayfası
+        sonsuza kadar bekler ve retention bu job'ları hiç toplamaz.
+        """
+        index = job_index()
+        with self._lock:
+            mine = set(self._jobs)
+        stale = {r["job_id"] for r in index.list(status=",".join(ACTIVE), limit=500)["items"]}
+        for name in os.listdir(storage) if os.path.isdir(storage) else []:
+            st = read_status(os.path.join(storage, name))
+            if st and st.get("status") in ACTIVE:
+                stale.add(name)
+        recovered = 0
+        for job_id in sorted(stale - mine):
+            job_dir = os.path.join(storage, job_id)
+            st = read_status(job_dir)
+            now = _now()
+            if st is None:   # yalnızca indekste kalmış
+                index.upsert(job_id, status="failed", error=INTERRUPTED, finished_at=now)
+            else:
+                st.update(job_id=job_id, status="failed", error=INTERRUPTED, finished_at=now, updated_at=now)
+                _write_status(job_dir, st)
+                index.record_status(st)
+            recovered += 1
+        return recovered
+
+    # ---- Internal -------------------------------------------------------------
+    def _update(self, job_id: str, **fields) -> None:
+        with self._lock:
+            st = self._jobs[job_id]
+            st.update(fields)
+            st["updated_at"] = _now()
+            _write_status(self._dirs[job_id], st)
+            job_index().record_status(st)
+            bus.publish(job_id, "status", _snapshot(st), final=st["status"] not in ACTIVE)
+
+    def _on_node(self, job_id: str, name: str) -> None:
+        with self._lock:
+            st = self._jobs[job_id]
+            st["node"] = name
+            st["nodes"].append({"node": name, "at": _now()})
+            st["updated_at"] = _now()
+            _write_status(self._dirs[job_id], st)
+            bus.publish(job_id, "status", _snapshot(st))
+
+    def _work(self, job_id: str, fn: Callable[[Callable[[str], None]], Any]) -> None:
+        self._update(job_id, status="running", started_at=_now())
+        try:
+            fn(lambda name: self._on_node(job_id, name))
+        except Exception as e:
+            tb = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+            self._update(job_id, status="failed", error=tb, finished_at=_now())
+            return
+        self._update(job_id, status="finished", node=None, finished_at=_now())
@@ -0,0 +1,159 @@
+# app/services/metrics.py
+import json, os, threading, time, contextvars
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+try:
+    import resource   # Windows'ta yok: RSS/child CPU alanları None kalır
+except ImportError:
+    resource = None
+
+try:
+    from prometheus_client import CONTENT_TYPE_LATEST, Histogram, generate_latest
+except ImportError:
+    Histogram = None
+
+_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+if Histogram is not None:
+    SPAN_SECONDS = Histogram("pipeline_span_seconds", "Wall time of pipeline nodes and sub-steps",
+                             ["kind", "name"], buckets=_BUCKETS)
+    SPAN_CPU_SECONDS = Histogram("pipeline_span_cpu_seconds", "Process + child CPU time of pipeline spans",
+                                 ["kind", "name"], buckets=_BUCKETS)
+
+
+def _rusage() -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    """(child CPU sn, süreç tepe RSS MB, child tepe RSS MB); Linux'ta ru_maxrss KB."""
+    if resource is None:
+        return None, None, None
+    me = resource.getrusage(resource.RUSAGE_SELF)
+    ch = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return ch.ru_utime + ch.ru_stime, me.ru_maxrss / 1024, ch.ru_maxrss / 1024
+
+
+_PAGE_MB = os.sysconf("SC_PAGE_SIZE") / 1024 ** 2 if hasattr(os, "sysconf") else None
+
+def _rss_mb() -> Optional[float]:
+    """Sürecin o anki RSS'i (MB, /proc/self/statm); Linux dışında None."""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * _PAGE_MB
+    except (OSError, ValueError, IndexError, TypeError):
+        return None
+
+
+class Recorder:
+    """
+    Bir pipeline çalıştırmasının span kayıtları (node, model yükleme, LLM,
+    ffmpeg ...). Thread-safe; paralel node'lar aynı kayda yazabilir.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.spans: List[Dict[str, Any]] = []
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self._cpu0 = time.process_time()
+
+    def add(self, rec: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(rec)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = list(self.spans)
+        by_name: Dict[str, Dict[str, Any]] = {}
+        for s in spans:
+            agg = by_name.setdefault(s["name"], {"kind": s["kind"], "count": 0, "wall_s": 0.0,
+                                                 "cpu_s": 0.0, "max_s": 0.0})
+            agg["count"] += 1
+            agg["wall_s"] = round(agg["wall_s"] + s["wall_s"], 3)
+            agg["cpu_s"] = round(agg["cpu_s"] + s["cpu_s"], 3)
+            agg["max_s"] = max(agg["max_s"], s["wall_s"])
+        _, rss, child_rss = _rusage()
+        return {
+            "started_at": round(self.started_at, 3),
+            "wall_s": round(time.perf_counter() - self._t0, 3),
+            "cpu_s": round(time.process_time() - self._cpu0, 3),
+            "rss_peak_mb": rss and round(rss, 1),
+            "child_rss_peak_mb": child_rss and round(child_rss, 1),
+            "by_name": by_name,
+            "spans": spans,
+        }
+
+    def write(self, path: str) -> None:
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, path)
+
+
+_recorder: contextvars.ContextVar[Optional[Recorder]] = contextvars.ContextVar("metrics_recorder", default=None)
+_parent: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("metrics_parent", default=None)
+
+
+@contextmanager
+def recording() -> Iterator[Recorder]:
+    """Bu blok (ve bind() ile geçilen thread'ler) içindeki span'ler tek Recorder'da toplanır."""
+    rec = Recorder()
+    token = _recorder.set(rec)
+    try:
+        yield rec
+    finally:
+        _recorder.reset(token)
+
+
+@contextmanager
+def span(name: str, kind: str = "step", **attrs) -> Iterator[Dict[str, Any]]:
+    """
+    Wall + CPU süresi ölçer. cpu_s süreç genelidir (paralel node'lar çakışabilir);
+    child_cpu_s bu sırada biten alt süreçlerin (ffmpeg) CPU'sudur. rss_delta_mb
+    span başı/sonu arasındaki RSS farkıdır (tepe RSS yalnızca summary()'de,
+    süreç ömrü boyunca). Çağıran dönen dict'e ek alan yazabilir (ör. frames=4).
+    """
+    rec = dict(attrs)
+    parent = _parent.get()
+    token = _parent.set(f"{parent}/{name}" if parent else name)
+    child0, rss0 = _rusage()[0], _rss_mb()
+    cpu0, t0 = time.process_time(), time.perf_counter()
+    error = None
+    try:
+        yield rec
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        wall = time.perf_counter() - t0
+        cpu = time.process_time() - cpu0
+        child1, rss1 = _rusage()[0], _rss_mb()
+        _parent.reset(token)
+        rec.update({
+            "name": name, "kind": kind, "parent": parent,
+            "start": round(time.time() - wall, 3),
+            "wall_s": round(wall, 4), "cpu_s": round(cpu, 4),
+            "child_cpu_s": None if child0 is None else round(child1 - child0, 4),
+            "rss_delta_mb": None if rss0 is None or rss1 is None else round(rss1 - rss0, 1),
+        })
+        if error:
+            rec["error"] = error
+        current = _recorder.get()
+        if current is not None:
+            current.add(rec)
+        if Histogram is not None:
+            SPAN_SECONDS.labels(kind, name).observe(wall)
+            SPAN_CPU_SECONDS.labels(kind, name).observe(cpu + (rec["child_cpu_s"] or 0.0))
+
+
+def bind(fn: Callable) -> Callable:
+    """ThreadPoolExecutor'a verilecek fonksiyonu çağıranın recorder/parent bağlamıyla sarar."""
+    ctx = contextvars.copy_context()
+    def run(*args, **kwargs):
+        return ctx.copy().run(fn, *args, **kwargs)
+    return run
+
+
+def exposition() -> Optional[Tuple[bytes, str]]:
+    """Prometheus text formatı (gövde, content-type); prometheus_client yoksa None."""
+    if Histogram is None:
+        return None
+    return generate_latest(), CONTENT_TYPE_LATEST
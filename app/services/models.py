@@ -0,0 +1,131 @@
+# app/services/models.py
+import os, threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from app.services.metrics import span
+
+BLIP_MODEL = os.getenv("BLIP_MODEL", "Salesforce/blip-image-captioning-base")
+EMBED_MODEL = os.getenv("TREND_EMBED_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+MODEL_MEMORY_MB = int(os.getenv("MODEL_MEMORY_MB", "0"))  # 0 = sınır yok
+
+
+def _model_bytes(obj: Any) -> int:
+    """torch modülleri için parametre + buffer boyutu; diğerleri 0 sayılır."""
+    if isinstance(obj, (tuple, list)):
+        return sum(_model_bytes(o) for o in obj)
+    params = getattr(obj, "parameters", None)
+    buffers = getattr(obj, "buffers", None)
+    if not callable(params):
+        return 0
+    total = 0
+    try:
+        for p in params():
+            total += p.numel() * p.element_size()
+        if callable(buffers):
+            for b in buffers():
+                total += b.numel() * b.element_size()
+    except Exception:
+        return 0
+    return total
+
+
+class ModelRegistry:
+    """
+    Süreç genelinde model kayıt defteri.
+
+    - Her model (key) süreç başına bir kez yüklenir ve sonraki işlerde
+      yeniden kullanılır; aynı anda gelen yüklemeler tek yüklemeye iner.
+    - budget_mb > 0 ise toplam tahmini boyut bütçeyi aşınca en uzun süredir
+      kullanılmayan (LRU) modeller bellekten çıkarılır.
+    """
+
+    def __init__(self, budget_mb: int = MODEL_MEMORY_MB):
+        self.budget = max(0, budget_mb) * 1024 * 1024
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[Any, int]]" = OrderedDict()
+        self._loading: Dict[Tuple[str, str], threading.Lock] = {}
+
+    def get(self, kind: str, name: str, loader: Callable[[], Any]) -> Any:
+        key = (kind, name)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key][0]
+            key_lock = self._loading.setdefault(key, threading.Lock())
+
+        with key_lock:
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key][0]
+            with span(f"load:{kind}", kind="model_load", model=name):
+                obj = loader()
+            size = _model_bytes(obj)
+            with self._lock:
+                self._entries[key] = (obj, size)
+                self._evict(keep=key)
+                self._loading.pop(key, None)
+            return obj
+
+    def stats(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [{"kind": k, "name": n, "mb": round(sz / 1024 / 1024, 1)}
+                    for (k, n), (_, sz) in self._entries.items()]
+
+    def _evict(self, keep: Tuple[str, str]) -> None:
+        if not self.budget:
+            return
+        total = sum(sz for _, sz in self._entries.values())
+        for key in list(self._entries.keys()):
+            if total <= self.budget:
+                break
+            if key == keep:
+                continue
+            _, sz = self._entries.pop(key)
+            total -= sz
+
+
+registry = ModelRegistry()
+
+
+# ---- Model yükleyiciler -------------------------------------------------------
+def get_blip(name: str = BLIP_MODEL):
+    """(processor, model) çifti."""
+    def load():
+        from transformers import BlipForConditionalGeneration, BlipProcessor
+        processor = BlipProcessor.from_pretrained(name)
+        model = BlipForConditionalGeneration.from_pretrained(name)
+        model.eval()
+        return processor, model
+    return registry.get("blip", name, load)
+
+
+def get_whisper(name: str = WHISPER_MODEL):
+    def load():
+        import whisper
+        return whisper.load_model(name)
+    return registry.get("whisper", name, load)
+
+
+def get_embedder(name: str = EMBED_MODEL):
+    def load():
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(name)
+    return registry.get("embed", name, load)
+
+
+_LOADERS = {"blip": get_blip, "whisper": get_whisper, "embed": get_embedder}
+
+
+def preload(kinds: Iterable[str]) -> None:
+    """MODEL_PRELOAD=blip,whisper,embed gibi bir listeyi varsayılan adlarla ısıtır."""
+    for kind in kinds:
+        loader = _LOADERS.get(kind.strip().lower())
+        if loader is None:
+            raise ValueError(f"Unknown model kind for preload: {kind}")
+        loader()
@@ -0,0 +1,115 @@
+# app/services/results.py
+import os, json, glob, threading, time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+RESULTS_FILE = "results.json"
+RESULTS_VERSION = 1   # belge alanları değişince artır: eski results.json'lar yeniden üretilir
+RESULTS_CACHE_MAX = int(os.getenv("RESULTS_CACHE_MAX", "256"))   # bellekte tutulan job sayısı
+RESULTS_FRAMES = 12
+
+
+def _load(path: str, default: Any = None) -> Any:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def _vision_captions(vision_json: Any, cu: Any) -> list:
+    if isinstance(vision_json, dict) and "captions" in vision_json:
+        return vision_json["captions"]
+    if isinstance(cu, dict):
+        if isinstance(cu.get("vision"), dict) and "captions" in cu["vision"]:
+            return cu["vision"]["captions"]
+        if "captions" in cu:
+            return cu["captions"]
+    return []
+
+
+def build_results(job_dir: str) -> Dict[str, Any]:
+    """Sonuç sayfasının ihtiyaç duyduğu her şey tek belgede (ayrı JSON'lar + meta + kare listesi)."""
+    results_dir = os.path.join(job_dir, "results")
+    load = lambda name, default: _load(os.path.join(results_dir, name), default)
+    state = load("state.json", {}) or {}
+    frames = sorted(glob.glob(os.path.join(results_dir, "frames", "*.jpg")))[:RESULTS_FRAMES]
+    return {
+        "version": RESULTS_VERSION,
+        "job_id": os.path.basename(os.path.normpath(job_dir)),
+        "game_name": (_load(os.path.join(job_dir, "meta.json"), {}) or {}).get("game_name", ""),
+        "generated_at": round(time.time(), 3),
+        "summary": load("summary.json", {}),
+        "captions": load("captions.json", {}),
+        "scores": load("scores.json", {}),
+        "trends": (load("trends.json", {}) or {}).get("terms", []),
+        "scenes": load("scenes.json", []),
+        "vision_caps": _vision_captions(load("vision.json", {}), load("content_understanding.json", {})),
+        "frames": [os.path.basename(x) for x in frames],
+        "bundle_ok": os.path.isfile(os.path.join(results_dir, "summary.json")),
+        "errors": state.get("errors", []),
+        "reused": state.get("reused", []),
+        "recomputed": state.get("recomputed", []),
+    }
+
+
+def write_results(job_dir: str) -> Dict[str, Any]:
+    """results/results.json'ı yeniden üretir (tmp + replace: okuyan yarım belge görmez)."""
+    doc = build_results(job_dir)
+    path = os.path.join(job_dir, "results", RESULTS_FILE)
+    tmp = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(doc, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    return doc
+
+
+class ResultsCache:
+    """
+    results.json'ların bellek içi LRU'su. Girdi (mtime_ns, size) ile doğrulanır;
+    dosya yeniden yazılınca (yeniden çalıştırma) bir sonraki istekte tekrar okunur.
+    results.json'ı olmayan ya da sürümü eski job'lar için belge üretilip yazılır.
+    """
+
+    def __init__(self, max_entries: int = RESULTS_CACHE_MAX):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[Tuple[int, int], Dict[str, Any]]]" = OrderedDict()
+
+    def get(self, job_dir: str) -> Optional[Dict[str, Any]]:
+        results_dir = os.path.join(job_dir, "results")
+        if not os.path.isdir(results_dir):
+            return None
+        path = os.path.join(results_dir, RESULTS_FILE)
+        stamp = self._stamp(path)
+        with self._lock:
+            hit = self._entries.get(job_dir)
+            if hit and hit[0] == stamp:
+                self._entries.move_to_end(job_dir)
+                return hit[1]
+
+        doc = _load(path) if stamp else None
+        if not isinstance(doc, dict) or doc.get("version") != RESULTS_VERSION:
+            doc = write_results(job_dir)
+            stamp = self._stamp(path)
+        with self._lock:
+            self._entries[job_dir] = (stamp, doc)
+            self._entries.move_to_end(job_dir)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return doc
+
+    def invalidate(self, job_dir: str) -> None:
+        with self._lock:
+            self._entries.pop(job_dir, None)
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+
+results_cache = ResultsCache()
@@ -0,0 +1,121 @@
+# app/services/retention.py
+import os, shutil, threading, time
+from typing import Any, Dict, List, Optional
+
+from app.services.job_index import job_index, job_size
+from app.services.jobs import ACTIVE
+from app.services.results import results_cache
+from app.services.storage import STORAGE
+
+RETENTION_DAYS = float(os.getenv("RETENTION_DAYS", "0"))       # bitişten bu kadar gün sonra ara çıktılar silinir; 0 = kapalı
+RETENTION_MAX_GB = float(os.getenv("RETENTION_MAX_GB", "0"))   # job'ların toplam boyut sınırı; aşılırsa en eskiler; 0 = yok
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "3600"))   # arka plan taraması (sn); 0 = yalnızca POST /jobs/gc
+
+# yeniden üretilebilir / yalnızca çalıştırma sırasında gereken çıktılar
+INTERMEDIATE_DIRS = ("assets", "videos", "checkpoints")
+INTERMEDIATE_FILES = (os.path.join("results", "audio_16k.wav"), os.path.join("results", "transcript.json"))
+
+
+def _remove(path: str) -> int:
+    """Silinen ve gerçekten boşalan (başka link'i olmayan) baytlar."""
+    if os.path.isdir(path):
+        freed = job_size(path)
+        shutil.rmtree(path, ignore_errors=True)
+        return freed
+    try:
+        st = os.stat(path)
+        os.remove(path)
+    except OSError:
+        return 0
+    return st.st_size if st.st_nlink == 1 else 0
+
+
+def collect_job(job_dir: str) -> int:
+    """
+    Bir job'ın ara çıktılarını siler; nihai çıktılar (results/*.json, SRT,
+    results.json'daki kareler) kalır, sonuç sayfası ve bundle çalışmaya devam eder.
+    """
+    results_dir = os.path.join(job_dir, "results")
+    doc = results_cache.get(job_dir)   # results.json yoksa silmeden önce yazılır (sayfa bunu okur)
+
+    freed = 0
+    for d in INTERMEDIATE_DIRS:
+        freed += _remove(os.path.join(job_dir, d))
+    for fn in INTERMEDIATE_FILES:
+        freed += _remove(os.path.join(job_dir, fn))
+    frames = os.path.join(results_dir, "frames")
+    if os.path.isdir(frames):
+        keep = set((doc or {}).get("frames", []))
+        for name in os.listdir(frames):
+            if name not in keep:
+                freed += _remove(os.path.join(frames, name))
+    return freed
+
+
+def sweep(dry_run: bool = False, now: Optional[float] = None, storage: str = STORAGE) -> Dict[str, Any]:
+    """
+    Yaşa (RETENTION_DAYS) sonra toplam boyuta (RETENTION_MAX_GB) göre en eski
+    job'lardan başlayarak ara çıktıları siler. Çalışan job'lara dokunulmaz.
+    """
+    now = now or time.time()
+    index = job_index()
+    index.sync(storage)
+    candidates = index.gc_candidates(ACTIVE)
+
+    chosen: List[Dict[str, Any]] = []
+    if RETENTION_DAYS > 0:
+        cutoff = now - RETENTION_DAYS * 86400
+        chosen = [j for j in candidates if (j["finished_at"] or j["created_at"] or now) < cutoff]
+    if RETENTION_MAX_GB > 0:
+        total = index.total_size() - sum(j["size_bytes"] or 0 for j in chosen)
+        for j in candidates:
+            if total <= RETENTION_MAX_GB * 1024 ** 3:
+                break
+            if j not in chosen:
+                chosen.append(j)
+                total -= j["size_bytes"] or 0
+
+    report = {"dry_run": dry_run, "jobs": [], "freed_bytes": 0}
+    for j in chosen:
+        job_dir = os.path.join(storage, j["job_id"])
+        freed = 0 if dry_run else collect_job(job_dir)
+        if not dry_run:
+            index.upsert(j["job_id"], gc_at=round(now, 3), gc_freed_bytes=freed, size_bytes=job_size(job_dir))
+        report["jobs"].append({"job_id": j["job_id"], "size_bytes": j["size_bytes"], "freed_bytes": freed})
+        report["freed_bytes"] += freed
+
+    if not dry_run and RETENTION_DAYS > 0:
+        from app.services.drive import _asset_store
+        store = _asset_store()
+        if store is not None:
+            report["drive_store_freed_bytes"] = store.prune(RETENTION_DAYS * 86400)
+    return report
+
+
+class Retention:
+    """Açılışta indeksi senkronlar, sonra RETENTION_INTERVAL'de bir sweep() çalıştırır (arka plan)."""
+
+    def __init__(self, interval: int = RETENTION_INTERVAL):
+        self.interval = interval
+        self._started = False
+        self._lock = threading.Lock()
+        self.last: Optional[Dict[str, Any]] = None
+
+    def start(self) -> None:
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        threading.Thread(target=self._run, name="retention", daemon=True).start()
+
+    def _run(self) -> None:
+        job_index().sync()
+        while self.interval > 0:
+            try:
+                self.last = sweep()
+            except Exception as e:   # temizlik hatası sunucuyu düşürmesin; sonraki turda tekrar denenir
+                self.last = {"error": f"{type(e).__name__}: {e}"}
+            time.sleep(self.interval)
+
+
+retention = Retention()
@@ -0,0 +1,14 @@
+# app/services/storage.py
+import os
+from dotenv import load_dotenv
+load_dotenv()
+
+APP_DIR = os.path.dirname(os.path.dirname(__file__))
+STORAGE = os.getenv("STORAGE_PATH", os.path.abspath(os.path.join(APP_DIR, "..", "storage")))
+CACHE_ROOT = os.path.join(STORAGE, "_cache")   # job'lar arası paylaşılan önbellekler
+
+
+def cache_dir(name: str) -> str:
+    path = os.path.join(CACHE_ROOT, name)
+    os.makedirs(path, exist_ok=True)
+    return path
@@ -0,0 +1,148 @@
+# app/services/trends.py
+import os, json, time, random, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from app.services.metrics import bind, span
+from app.services.storage import cache_dir
+
+TRENDS_CACHE_DIR = os.getenv("TRENDS_CACHE_DIR", "")
+TRENDS_CACHE_TTL = int(os.getenv("TRENDS_CACHE_TTL", str(6 * 3600)))   # sn; 0 = önbellek kapalı
+TRENDS_CONCURRENCY = int(os.getenv("TRENDS_CONCURRENCY", "3"))
+TRENDS_RATE = float(os.getenv("TRENDS_RATE", "0.5"))        # saniyede istek (token dolum hızı)
+TRENDS_BURST = int(os.getenv("TRENDS_BURST", "2"))          # kova kapasitesi
+TRENDS_RETRIES = int(os.getenv("TRENDS_RETRIES", "3"))
+TRENDS_BACKOFF = float(os.getenv("TRENDS_BACKOFF", "2.0"))  # ilk bekleme (sn), her denemede x2
+
+Rows = List[Dict]   # [{"query": str, "value": int}, ...] — related_queries()["top"]
+
+
+class TokenBucket:
+    """Süreç genelinde paylaşılan basit token bucket (pytrends kotası IP başına)."""
+
+    def __init__(self, rate: float, capacity: int):
+        self.rate = max(rate, 1e-6)
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        self.ts = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+                self.ts = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class TrendsCache:
+    """(keyword, geo, timeframe) -> related query satırları; dosya başına bir anahtar, TTL'li."""
+
+    def __init__(self, root: str, ttl: int = TRENDS_CACHE_TTL):
+        self.root = root
+        self.ttl = ttl
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, kw: str, geo: str, timeframe: str) -> str:
+        h = hashlib.sha1(json.dumps([kw, geo, timeframe]).encode("utf-8")).hexdigest()
+        return os.path.join(self.root, f"{h}.json")
+
+    def get(self, kw: str, geo: str, timeframe: str) -> Optional[Rows]:
+        if self.ttl <= 0:
+            return None
+        p = self._path(kw, geo, timeframe)
+        try:
+            with open(p, "r", encoding="utf-8") as f:
+                obj = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - obj.get("ts", 0) > self.ttl:
+            return None
+        return obj.get("rows", [])
+
+    def put(self, kw: str, geo: str, timeframe: str, rows: Rows) -> None:
+        if self.ttl <= 0:
+            return
+        p = self._path(kw, geo, timeframe)
+        tmp = f"{p}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"kw": kw, "geo": geo, "timeframe": timeframe,
+                       "ts": int(time.time()), "rows": rows}, f, ensure_ascii=False)
+        os.replace(tmp, p)
+
+
+bucket = TokenBucket(TRENDS_RATE, TRENDS_BURST)
+cache = TrendsCache(TRENDS_CACHE_DIR or cache_dir("trends"))
+_local = threading.local()
+
+
+def _client(hl: str, tz: int):
+    # TrendReq thread-safe değil; her worker thread'i kendi oturumunu kullanır
+    from pytrends.request import TrendReq
+    key = (hl, tz)
+    if getattr(_local, "key", None) != key:
+        _local.client, _local.key = TrendReq(hl=hl, tz=tz), key
+    return _local.client
+
+
+def _fetch_one(kw: str, geo: str, timeframe: str, hl: str, tz: int) -> Rows:
+    last_err: Optional[Exception] = None
+    for attempt in range(max(1, TRENDS_RETRIES)):
+        bucket.acquire()
+        try:
+            with span("pytrends", kind="external", attempt=attempt + 1):
+                pytrends = _client(hl, tz)
+                pytrends.build_payload([kw], timeframe=timeframe, geo=geo)
+                rel = pytrends.related_queries() or {}
+            # {'kw': {'top': DataFrame(query, value), 'rising': DataFrame(...) }}
+            rows: Rows = []
+            for obj in rel.values():
+                if obj and obj.get("top") is not None:
+                    for _, row in obj["top"].iterrows():
+                        rows.append({"query": str(row.get("query", "")),
+                                     "value": int(row.get("value", 50) or 50)})
+            return rows
+        except Exception as e:   # çoğunlukla 429 / quota
+            last_err = e
+            _local.key = None    # oturumu sıfırla
+            if attempt + 1 < TRENDS_RETRIES:
+                time.sleep(TRENDS_BACKOFF * (2 ** attempt) * (1 + random.random() * 0.25))
+    raise last_err  # type: ignore[misc]
+
+
+def fetch_related(keywords: List[str], geo: str, timeframe: str, hl: str, tz: int
+                  ) -> Tuple[Dict[str, Rows], Dict[str, int]]:
+    """
+    Her keyword için related 'top' satırları. Önbellekte olmayanlar token bucket
+    altında paralel çekilir; hata veren keyword sonuçta yer almaz.
+    Dönüş: ({kw: rows}, {"hits", "misses", "errors"})
+    """
+    stats = {"hits": 0, "misses": 0, "errors": 0}
+    out: Dict[str, Rows] = {}
+    todo = []
+    for kw in keywords:
+        rows = cache.get(kw, geo, timeframe)
+        if rows is None:
+            todo.append(kw)
+        else:
+            out[kw] = rows
+            stats["hits"] += 1
+    stats["misses"] = len(todo)
+    if not todo:
+        return out, stats
+
+    with ThreadPoolExecutor(max_workers=max(1, min(TRENDS_CONCURRENCY, len(todo))),
+                            thread_name_prefix="trends") as ex:
+        futures = {kw: ex.submit(bind(_fetch_one), kw, geo, timeframe, hl, tz) for kw in todo}
+        for kw, fut in futures.items():
+            try:
+                out[kw] = fut.result()
+                cache.put(kw, geo, timeframe, out[kw])
+            except Exception:
+                stats["errors"] += 1
+    return out, stats
@@ -1,9 +1,11 @@
 # app/services/video.py
-import os, json, subprocess, shutil
-from typing import List, Dict, Union
-from scenedetect import VideoManager, SceneManager
-from scenedetect.detectors import ContentDetector
+import os, json, subprocess, shutil, tempfile
+from typing import Dict, Iterable, List, Tuple, Union
+import numpy as np
 from dotenv import load_dotenv
+
+from app.services.metrics import span
+
 load_dotenv()  # .env dosyasını belleğe al
 
 def _bin(name: str, env_name: str) -> str:
@@ -11,13 +13,22 @@ def _bin(name: str, env_name: str) -> str:
 
 FFMPEG  = _bin("ffmpeg",  "FFMPEG_PATH")
 FFPROBE = _bin("ffprobe", "FFPROBE_PATH")
-print("FFMPEG=", FFMPEG)
-print("FFPROBE=", FFPROBE)
 
-if not FFMPEG:
-    raise RuntimeError("ffmpeg bulunamadı. FFMPEG_PATH ortam değişkenini ayarla veya ffmpeg'i PATH'e ekle.")
-if not FFPROBE:
-    raise RuntimeError("ffprobe bulunamadı. FFPROBE_PATH ortam değişkenini ayarla veya ffprobe'u PATH'e ekle.")
+def require_tools():
+    # import sırasında değil, ffmpeg gerçekten gerektiğinde hata ver (hızlı açılış)
+    if not FFMPEG:
+        raise RuntimeError("ffmpeg bulunamadı. FFMPEG_PATH ortam değişkenini ayarla veya ffmpeg'i PATH'e ekle.")
+    if not FFPROBE:
+        raise RuntimeError("ffprobe bulunamadı. FFPROBE_PATH ortam değişkenini ayarla veya ffprobe'u PATH'e ekle.")
+
+KEYFRAME_MODE = os.getenv("KEYFRAME_MODE", "single")  # single | per_scene
+SCENE_DETECTOR = os.getenv("SCENE_DETECTOR", "pyscenedetect")  # pyscenedetect | fast
+SCENE_THRESHOLD = float(os.getenv("SCENE_THRESHOLD", "27"))
+MAX_SCENES = 12
+FAST_SCENE_FPS = float(os.getenv("FAST_SCENE_FPS", "4"))
+FAST_SCENE_THRESHOLD = float(os.getenv("FAST_SCENE_THRESHOLD", "25"))
+# BLIP öncesi yakın kopya kare eleme: 64 bit dHash arası Hamming mesafesi; < 0 = kapalı
+FRAME_DEDUPE_DISTANCE = int(os.getenv("FRAME_DEDUPE_DISTANCE", "6"))
 
 def _parse_tc_to_seconds(tc: Union[str, float, int, object]) -> float:
     if hasattr(tc, "get_seconds"):
@@ -34,9 +45,11 @@ def _parse_tc_to_seconds(tc: Union[str, float, int, object]) -> float:
         return 0.0
 
 def ffprobe_duration(video_path: str) -> float:
-    out = subprocess.check_output(
-        [FFPROBE, "-v", "error", "-show_entries", "format=duration", "-of", "json", video_path]
-    ).decode("utf-8", "ignore")
+    require_tools()
+    with span("ffprobe", kind="subprocess"):
+        out = subprocess.check_output(
+            [FFPROBE, "-v", "error", "-show_entries", "format=duration", "-of", "json", video_path]
+        ).decode("utf-8", "ignore")
     return float(json.loads(out)["format"]["duration"])
 
 def fixed_segments(duration: float, seg_len: float = 10.0) -> List[Dict]:
@@ -48,14 +61,17 @@ def fixed_segments(duration: float, seg_len: float = 10.0) -> List[Dict]:
     return out
 
 def detect_scenes(video_path: str, threshold: float = 27.0, max_scenes: int = 10):
-    vm = VideoManager([video_path])
-    sm = SceneManager()
-    sm.add_detector(ContentDetector(threshold=threshold))
-    vm.set_downscale_factor(2)
-    vm.start()
-    sm.detect_scenes(frame_source=vm)
-    scene_list = sm.get_scene_list()
-    vm.release()
+    from scenedetect import VideoManager, SceneManager   # opencv dahil ağır; ilk kullanımda yüklenir
+    from scenedetect.detectors import ContentDetector
+    with span("pyscenedetect", kind="step"):
+        vm = VideoManager([video_path])
+        sm = SceneManager()
+        sm.add_detector(ContentDetector(threshold=threshold))
+        vm.set_downscale_factor(2)
+        vm.start()
+        sm.detect_scenes(frame_source=vm)
+        scene_list = sm.get_scene_list()
+        vm.release()
 
     scenes = [{"start": _parse_tc_to_seconds(s), "end": _parse_tc_to_seconds(e)} for s, e in scene_list]
     if not scenes:
@@ -65,10 +81,173 @@ def detect_scenes(video_path: str, threshold: float = 27.0, max_scenes: int = 10
         scenes = scenes[:max_scenes]
     return scenes
 
+def ffprobe_fps(video_path: str) -> float:
+    require_tools()
+    with span("ffprobe", kind="subprocess"):
+        out = subprocess.check_output(
+            [FFPROBE, "-v", "error", "-select_streams", "v:0", "-show_entries", "stream=avg_frame_rate",
+             "-of", "json", video_path]
+        ).decode("utf-8", "ignore")
+    rate = (json.loads(out).get("streams") or [{}])[0].get("avg_frame_rate", "0/1")
+    num, _, den = rate.partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+def _gray_cuts(chunks: Iterable[np.ndarray], fps: float, threshold: float, min_gap: float,
+               max_cuts: int) -> Tuple[List[float], int]:
+    """
+    (n, h, w) uint8 gri kare blokları -> (kesim zamanları, görülen kare sayısı).
+    max_cuts kesime ulaşınca kalan bloklar okunmaz (çağıran decode'u keser).
+    """
+    cuts: List[float] = []
+    prev = None
+    n_seen = 0
+    for frames in chunks:
+        if len(cuts) >= max_cuts:
+            break
+        frames = frames.astype(np.int16)
+        stack = frames if prev is None else np.concatenate([prev[None], frames])
+        diffs = np.abs(np.diff(stack, axis=0)).mean(axis=(1, 2))
+        first = n_seen if prev is None else n_seen - 1   # diffs[i] -> kare (first + i + 1)
+        for i in np.nonzero(diffs >= threshold)[0]:
+            t = (first + int(i) + 1) / fps
+            if t - (cuts[-1] if cuts else 0.0) >= min_gap:
+                cuts.append(t)
+                if len(cuts) >= max_cuts:
+                    break
+        prev = frames[-1]
+        n_seen += len(frames)
+    return cuts, n_seen
+
+def detect_scenes_fast(video_path: str, threshold: float = 25.0, max_scenes: int = 10,
+                       fps_cap: float = 4.0, size=(64, 36), chunk: int = 64):
+    """
+    Hızlı sahne tespiti: ffmpeg küçük, düşük fps'li gri kareleri rawvideo olarak
+    pipe'a yazar; ardışık kare farkları NumPy ile toplu hesaplanır.
+
+    - threshold: ortalama mutlak gri fark (0-255) eşiği
+    - fps_cap: analiz fps'i (kaynak fps'inden büyükse kaynak kullanılır)
+    - Kesimler en az duration / (2 * max_scenes) aralıklı olmalı; max_scenes - 1
+      kesime ulaşınca decode erken kesilir, son sahne videonun sonunda kapanır.
+    Dönüş detect_scenes ile aynı: [{"start","end"}, ...]
+    """
+    duration = ffprobe_duration(video_path)
+    src_fps = ffprobe_fps(video_path)
+    fps = min(fps_cap, src_fps) if src_fps > 0 else fps_cap
+    min_gap = max(1.0 / fps, duration / (2 * max_scenes)) if duration > 0 else 1.0
+
+    w, h = size
+    frame_bytes = w * h
+    cmd = [FFMPEG, "-v", "error", "-i", video_path, "-an",
+           "-vf", f"fps={fps},scale={w}:{h},format=gray",
+           "-f", "rawvideo", "-pix_fmt", "gray", "pipe:1"]
+
+    def chunks(proc):
+        while True:
+            buf = proc.stdout.read(frame_bytes * chunk)
+            n = len(buf) // frame_bytes
+            if n == 0:
+                return
+            yield np.frombuffer(buf[: n * frame_bytes], dtype=np.uint8).reshape(n, h, w)
+
+    with span("ffmpeg:scene_pipe", kind="subprocess", fps=fps):
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            cuts, n_seen = _gray_cuts(chunks(proc), fps, threshold, min_gap, max(0, max_scenes - 1))
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            proc.wait()
+
+    if not cuts:
+        return fixed_segments(duration, seg_len=10.0)
+    return _scene_bounds(cuts, duration if duration > 0 else n_seen / fps)
+
+def _scene_bounds(cuts: List[float], end: float) -> List[Dict[str, float]]:
+    """Kesimler -> ardışık sahneler; son sahne her zaman end'de (video sonu) kapanır."""
+    bounds = [0.0] + [t for t in cuts if t < end] + [end]
+    return [{"start": a, "end": b} for a, b in zip(bounds, bounds[1:]) if b > a]
+
 def extract_keyframe(video_path: str, time_s: float, out_path: str):
+    require_tools()
     os.makedirs(os.path.dirname(out_path), exist_ok=True)
     cmd = [FFMPEG, "-y", "-ss", str(time_s), "-i", video_path, "-vf", "scale=720:-1", "-frames:v", "1", out_path]
-    subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+    with span("ffmpeg:keyframe", kind="subprocess"):
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+
+def extract_keyframes(video_path: str, times: List[float], out_paths: List[str]) -> bool:
+    """
+    Tek ffmpeg süreciyle videoyu bir kez decode eder ve her zaman damgasındaki
+    (>= t olan ilk) kareyi yazar. Kare sayısı tutmazsa False döner; çağıran
+    tarafta kare başına extract_keyframe'e düşülür.
+    """
+    if not times:
+        return True
+    require_tools()
+    if list(times) != sorted(times):
+        return False
+    out_dir = os.path.dirname(out_paths[0])
+    os.makedirs(out_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".keyframes_", dir=out_dir)
+    try:
+        conds = "+".join(
+            f"gte(t,{t:.3f})*(isnan(prev_pts)+lt(prev_pts*TB,{t:.3f}))" for t in times
+        )
+        cmd = [FFMPEG, "-y", "-i", video_path,
+               "-vf", f"select='{conds}',scale=720:-1", "-vsync", "vfr",
+               os.path.join(tmp_dir, "%04d.jpg")]
+        with span("ffmpeg:keyframes", kind="subprocess", frames=len(times)):
+            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+
+        produced = sorted(f for f in os.listdir(tmp_dir) if f.endswith(".jpg"))
+        if len(produced) != len(out_paths):
+            return False
+        for fn, out_path in zip(produced, out_paths):
+            os.replace(os.path.join(tmp_dir, fn), out_path)
+        return True
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+def scene_params() -> Dict:
+    """process_video çıktısını etkileyen ayarlar (önbellek anahtarı için)."""
+    params = {"detector": SCENE_DETECTOR, "max_scenes": MAX_SCENES}
+    if SCENE_DETECTOR == "fast":
+        params.update(threshold=FAST_SCENE_THRESHOLD, fps_cap=FAST_SCENE_FPS)
+    else:
+        params.update(threshold=SCENE_THRESHOLD)
+    return params
+
+def frame_hashes(images) -> np.ndarray:
+    """PIL görüntüleri -> (n, 64) bool dHash matrisi (9x8 gri, yatay komşu farkı)."""
+    if not images:
+        return np.zeros((0, 64), dtype=bool)
+    arr = np.stack([np.asarray(img.convert("L").resize((9, 8)), dtype=np.int16) for img in images])
+    return (arr[:, :, 1:] > arr[:, :, :-1]).reshape(len(images), 64)
+
+def duplicate_groups(hashes: np.ndarray, max_distance: int = FRAME_DEDUPE_DISTANCE) -> List[int]:
+    """
+    Her kare için temsilci indeksi: kendisi ya da mesafesi <= max_distance olan
+    ilk önceki temsilci. Mesafe matrisi tek seferde (n x n) hesaplanır.
+    """
+    n = len(hashes)
+    if n == 0 or max_distance < 0:
+        return list(range(n))
+    dist = (hashes[:, None, :] != hashes[None, :, :]).sum(axis=-1)
+    rep = [-1] * n
+    for i in range(n):
+        if rep[i] >= 0:
+            continue
+        rep[i] = i
+        for j in np.nonzero(dist[i, i + 1:] <= max_distance)[0] + i + 1:
+            if rep[j] < 0:
+                rep[j] = i
+    return rep
+
+def dedupe_params() -> Dict:
+    return {"hash": "dhash64", "max_distance": FRAME_DEDUPE_DISTANCE}
 
 def process_video(job_dir: str, video_path: str):
     results_dir = os.path.join(job_dir, "results")
@@ -76,13 +255,24 @@ def process_video(job_dir: str, video_path: str):
     os.makedirs(results_dir, exist_ok=True)
     os.makedirs(frames_dir, exist_ok=True)
 
-    scenes = detect_scenes(video_path, threshold=27.0, max_scenes=12)
+    if SCENE_DETECTOR == "fast":
+        scenes = detect_scenes_fast(video_path, threshold=FAST_SCENE_THRESHOLD, max_scenes=MAX_SCENES,
+                                    fps_cap=FAST_SCENE_FPS)
+    else:
+        scenes = detect_scenes(video_path, threshold=SCENE_THRESHOLD, max_scenes=MAX_SCENES)
+    mids, outs = [], []
     for i, s in enumerate(scenes, start=1):
         mid = (s["start"] + s["end"])/2.0 if s["end"] is not None else s["start"] + 5.0
         out_jpg = os.path.join(frames_dir, f"scene_{i:02d}.jpg")
-        extract_keyframe(video_path, mid, out_jpg)
+        mids.append(mid)
+        outs.append(out_jpg)
         s["keyframe"] = out_jpg
 
+    # single: tek decode ile tüm kareler; per_scene: sahne başına ayrı ffmpeg (eski yol)
+    if KEYFRAME_MODE == "per_scene" or not extract_keyframes(video_path, mids, outs):
+        for mid, out_jpg in zip(mids, outs):
+            extract_keyframe(video_path, mid, out_jpg)
+
     with open(os.path.join(results_dir, "scenes.json"), "w", encoding="utf-8") as f:
         json.dump(scenes, f, ensure_ascii=False, indent=2)
     return scenes
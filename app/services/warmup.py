@@ -0,0 +1,78 @@
+# app/services/warmup.py
+import os, threading, time
+from typing import Any, Dict, List, Optional
+
+from app.services.metrics import span
+
+# imports: langgraph akışı + video/ASR/ajan modülleri (torch, scenedetect ...)
+# blip | whisper | embed: app.services.models.preload ile model ağırlıkları
+WARMUP = os.getenv("WARMUP", "")
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "")     # eski ad; WARMUP'a eklenir
+WARMUP_BLOCKING = os.getenv("WARMUP_BLOCKING", "0") == "1"
+
+_IMPORTS = [
+    "app.graph.flow",
+    "app.services.video",
+    "app.services.asr",
+    "app.agents.content_understanding_agent",
+    "app.agents.generation_agent_llm",
+    "app.agents.qc_agent",
+]
+
+
+def _items(spec: str) -> List[str]:
+    return list(dict.fromkeys(k.strip() for k in spec.split(",") if k.strip()))
+
+
+class Warmup:
+    """
+    Açılışta isteğe bağlı ısınma. Her adımın süresi ölçülür (status() ve
+    /metrics'te kind="warmup"); varsayılan olarak arka plan thread'inde çalışır.
+    """
+
+    def __init__(self, items: Optional[List[str]] = None, blocking: bool = WARMUP_BLOCKING):
+        self.items = items if items is not None else _items(f"{WARMUP},{MODEL_PRELOAD}")
+        self.blocking = blocking
+        self._lock = threading.Lock()
+        self._state: Dict[str, Any] = {"status": "idle" if self.items else "disabled", "steps": []}
+
+    def start(self) -> None:
+        if not self.items:
+            return
+        with self._lock:
+            if self._state["status"] != "idle":
+                return
+            self._state.update(status="running", started_at=round(time.time(), 3))
+        if self.blocking:
+            self._run()
+        else:
+            threading.Thread(target=self._run, name="warmup", daemon=True).start()
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            return {**self._state, "steps": list(self._state["steps"])}
+
+    def _run(self) -> None:
+        import importlib
+        from app.services.models import preload
+        t0 = time.perf_counter()
+        for item in self.items:
+            step: Dict[str, Any] = {"item": item}
+            s0 = time.perf_counter()
+            try:
+                with span(item, kind="warmup"):
+                    if item == "imports":
+                        for mod in _IMPORTS:
+                            importlib.import_module(mod)
+                    else:
+                        preload([item])
+            except Exception as e:   # ısınma hatası sunucuyu düşürmesin; iş sırasında tekrar denenir
+                step["error"] = f"{type(e).__name__}: {e}"
+            step["seconds"] = round(time.perf_counter() - s0, 3)
+            with self._lock:
+                self._state["steps"].append(step)
+        with self._lock:
+            self._state.update(status="done", seconds=round(time.perf_counter() - t0, 3))
+
+
+warmup = Warmup()
@@ -0,0 +1,74 @@
+# bench/bench_asr.py
+"""
+Tek pass Whisper ile chunked (süreç havuzunda paralel) deşifreyi aynı video
+üzerinde karşılaştırır: süre, segment sınırı ve metin uyumu.
+
+    python -m bench.bench_asr gameplay.mp4 --model base --lang tr --repeat 1
+"""
+import argparse, difflib, json, statistics, time
+
+from app.services import asr
+
+
+def _time(fn, repeat: int):
+    runs, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        runs.append(time.perf_counter() - t0)
+    return out, runs
+
+
+def _boundary_agreement(ref, cand, tol: float) -> float:
+    """cand segment başlangıçlarından kaçı ref başlangıçlarına tol saniye içinde yakın (0-1)."""
+    ref_starts = [s["start"] for s in ref["segments"]]
+    cand_starts = [s["start"] for s in cand["segments"]]
+    if not cand_starts:
+        return 1.0 if not ref_starts else 0.0
+    hit = sum(1 for c in cand_starts if any(abs(c - r) <= tol for r in ref_starts))
+    return hit / len(cand_starts)
+
+
+def _text_similarity(ref, cand) -> float:
+    a = " ".join(s["text"].strip() for s in ref["segments"]).split()
+    b = " ".join(s["text"].strip() for s in cand["segments"]).split()
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("video")
+    ap.add_argument("--model", default="base")
+    ap.add_argument("--lang", default=None)
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--chunk-s", type=float, default=asr.ASR_CHUNK_SECONDS)
+    ap.add_argument("--tol", type=float, default=1.0, help="segment başlangıcı eşleşme toleransı (sn)")
+    args = ap.parse_args()
+
+    audio = asr.decode_audio(args.video)
+
+    # ısınma: model yükleme (ana süreç + havuz worker'ları) ölçüme girmesin
+    asr.transcribe(audio, args.model, args.lang, mode="single")
+    asr.transcribe(audio, args.model, args.lang, mode="chunked", chunk_s=args.chunk_s)
+
+    single, single_runs = _time(lambda: asr.transcribe(audio, args.model, args.lang, mode="single"),
+                                args.repeat)
+    chunked, chunked_runs = _time(lambda: asr.transcribe(audio, args.model, args.lang, mode="chunked",
+                                                         chunk_s=args.chunk_s), args.repeat)
+
+    report = {
+        "video": args.video,
+        "model": args.model,
+        "audio_s": round(len(audio) / asr.SAMPLE_RATE, 1),
+        "single": {"median_s": round(statistics.median(single_runs), 3), "segments": len(single["segments"])},
+        "chunked": {"median_s": round(statistics.median(chunked_runs), 3), "segments": len(chunked["segments"]),
+                    "chunk_s": args.chunk_s, "workers": asr.ASR_WORKERS},
+        "speedup": round(statistics.median(single_runs) / max(statistics.median(chunked_runs), 1e-9), 2),
+        "boundary_agreement": round(_boundary_agreement(single, chunked, args.tol), 3),
+        "text_similarity": round(_text_similarity(single, chunked), 3),
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# bench/bench_scenes.py
+"""
+PySceneDetect (detect_scenes) ile hızlı ffmpeg+NumPy dedektörünü (detect_scenes_fast)
+aynı video üzerinde karşılaştırır.
+
+    python -m bench.bench_scenes gameplay.mp4 --repeat 3 --max-scenes 12
+"""
+import argparse, json, statistics, time
+
+from app.services.video import (
+    FAST_SCENE_FPS, FAST_SCENE_THRESHOLD, detect_scenes, detect_scenes_fast,
+)
+
+
+def _time(fn, repeat: int):
+    runs, out = [], None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        runs.append(time.perf_counter() - t0)
+    return out, runs
+
+
+def _agreement(ref, cand, tol: float) -> float:
+    """cand kesimlerinden kaçı ref kesimlerine tol saniye içinde yakın (0-1)."""
+    ref_cuts = [s["start"] for s in ref[1:]]
+    cand_cuts = [s["start"] for s in cand[1:]]
+    if not cand_cuts:
+        return 1.0 if not ref_cuts else 0.0
+    hit = sum(1 for c in cand_cuts if any(abs(c - r) <= tol for r in ref_cuts))
+    return hit / len(cand_cuts)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("video")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--max-scenes", type=int, default=12)
+    ap.add_argument("--threshold", type=float, default=27.0)
+    ap.add_argument("--fast-threshold", type=float, default=FAST_SCENE_THRESHOLD)
+    ap.add_argument("--fps-cap", type=float, default=FAST_SCENE_FPS)
+    ap.add_argument("--tol", type=float, default=1.0, help="kesim eşleşme toleransı (sn)")
+    args = ap.parse_args()
+
+    ref, ref_runs = _time(lambda: detect_scenes(args.video, threshold=args.threshold,
+                                                max_scenes=args.max_scenes), args.repeat)
+    fast, fast_runs = _time(lambda: detect_scenes_fast(args.video, threshold=args.fast_threshold,
+                                                       max_scenes=args.max_scenes,
+                                                       fps_cap=args.fps_cap), args.repeat)
+    report = {
+        "video": args.video,
+        "pyscenedetect": {"median_s": round(statistics.median(ref_runs), 3), "scenes": len(ref)},
+        "fast": {"median_s": round(statistics.median(fast_runs), 3), "scenes": len(fast),
+                 "fps_cap": args.fps_cap, "threshold": args.fast_threshold},
+        "speedup": round(statistics.median(ref_runs) / max(statistics.median(fast_runs), 1e-9), 2),
+        "cut_agreement": round(_agreement(ref, fast, args.tol), 3),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
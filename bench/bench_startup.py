@@ -0,0 +1,49 @@
+# bench/bench_startup.py
+"""
+Soğuk açılış bütçesi: temiz bir yorumlayıcıda `import app.main` + /healthz
+handler'ı süresini ölçer ve ağır bağımlılıkların (torch, whisper, scenedetect,
+langgraph ...) açılışta yüklenmediğini doğrular. Bütçe aşılırsa exit 1.
+
+    python -m bench.bench_startup --repeat 5 --budget 1.0
+"""
+import argparse, json, os, statistics, subprocess, sys
+
+HEAVY = ["torch", "whisper", "scenedetect", "cv2", "langgraph", "transformers",
+         "sentence_transformers", "gdown", "google.generativeai", "pytrends"]
+
+_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import app.main
+app.main.healthz()
+dt = time.perf_counter() - t0
+print(json.dumps({"seconds": dt, "loaded": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def probe(modules=HEAVY) -> dict:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, "WARMUP": "", "MODEL_PRELOAD": ""}
+    out = subprocess.run([sys.executable, "-c", _PROBE % (list(modules),)], cwd=root, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--budget", type=float, default=float(os.getenv("STARTUP_BUDGET_S", "1.0")))
+    args = ap.parse_args()
+
+    runs = [probe() for _ in range(args.repeat)]
+    median = statistics.median(r["seconds"] for r in runs)
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+    report = {"median_s": round(median, 3), "max_s": round(max(r["seconds"] for r in runs), 3),
+              "budget_s": args.budget, "heavy_modules_loaded": loaded,
+              "ok": median <= args.budget and not loaded}
+    print(json.dumps(report, indent=2))
+    sys.exit(0 if report["ok"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+# bench/run_stages.py
+"""
+Çevrimdışı aşama benchmark'ı: sentetik videolar (ffmpeg lavfi) üzerinde her
+pipeline aşamasını ayrı ölçer. Drive (gdown), Gemini ve Google Trends
+(TrendReq) bench.stubs ile yerel taklitlere bağlanır; ağ/API anahtarı gerekmez.
+
+    python -m bench.run_stages --profiles short,medium --repeat 3 --out bench_results.json
+    python -m bench.run_stages --save-baseline            # bench/baseline.json'ı güncelle
+    python -m bench.run_stages --threshold 0.25           # baseline'a göre %25+ yavaşlama = regresyon (exit 1)
+
+Model yükleme süreleri ısınma turunda kalır ("cold_s"); "median_s" ısınmış süredir.
+"""
+import argparse, json, os, platform, statistics, subprocess, sys, tempfile, time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(HERE, "baseline.json")
+
+PROFILES = {
+    "short":  {"duration": 10, "size": "640x360",  "scenes": 3},
+    "medium": {"duration": 30, "size": "1280x720", "scenes": 6},
+    "long":   {"duration": 90, "size": "1280x720", "scenes": 12},
+}
+
+# aşama -> önce çalışmış olması gereken aşamalar (kareler, trend terimleri, varyantlar, skorlar)
+NEEDS = {
+    "vision": ["process_video"],
+    "generate": ["trend_run", "vision"],
+    "trendfit_score": ["generate"],
+    "qc_run": ["generate"],
+    "finalize_run": ["qc_run"],
+}
+
+STAGES = [
+    "ingest", "detect_scenes", "detect_scenes_fast", "process_video", "transcribe_to_srt", "vision",
+    "trend_run", "trendfit_score", "generate", "qc_run", "finalize_run",
+]
+
+
+def _isolate(work: str) -> None:
+    """Önbellekler ölçümü bozmasın; app modülleri import edilmeden önce çağrılır."""
+    os.environ["STORAGE_PATH"] = os.path.join(work, "storage")
+    os.environ["ANALYSIS_CACHE"] = "0"
+    os.environ["LLM_MODE"] = "live"
+    os.environ["LLM_CACHE_TTL"] = "0"
+    os.environ["TRENDS_CACHE_TTL"] = "0"
+    os.environ["TRENDS_RATE"] = "1000"
+    os.environ["TRENDS_BURST"] = "1000"
+    os.environ["EMBED_CACHE_DIR"] = ""
+
+
+def _time(fn, repeat: int):
+    t0 = time.perf_counter()
+    fn()
+    cold = time.perf_counter() - t0
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return {"cold_s": round(cold, 4), "median_s": round(statistics.median(runs), 4),
+            "min_s": round(min(runs), 4), "runs": [round(r, 4) for r in runs]}
+
+
+def _stage_fns(job_dir: str, video: str, args):
+    """Aşama adı -> argümansız çağrı; bazı aşamalar öncekilerin çıktısını (ctx) kullanır (NEEDS)."""
+    from app.services.drive import download_folder, index_assets
+    from app.services.video import detect_scenes, detect_scenes_fast, process_video
+    from app.services.asr import transcribe_to_srt
+    from app.services.embed_cache import embed_cache
+    from app.agents.content_understanding_agent import ContentUnderstandingAgent
+    from app.agents.trend_agent import TrendAgent
+    from app.agents.generation_agent_llm import GenerationAgentLLM
+    from app.agents.qc_agent import QCAgent, _probe_media
+    from app.agents.finalize_agent import FinalizeAgent
+
+    ctx = {}
+    seeds = ["polis oyunu", "devriye", "suçlu yakalama", "Patrol Officer"]
+
+    def ingest():
+        dest = os.path.join(job_dir, "assets")
+        download_folder("https://drive.google.com/drive/folders/bench", dest)
+        index_assets(dest)
+
+    def vision():
+        ctx["vision"] = ContentUnderstandingAgent()._vision(job_dir)
+
+    def trend_run():
+        ctx["trend"] = TrendAgent().run(job_dir, seeds)
+
+    def trendfit_score():
+        embed_cache.clear()
+        for v in ctx["variants"]["variants"]:
+            TrendAgent._trendfit_score(v["caption"], ctx["trend"]["terms"])
+
+    def generate():
+        ctx["variants"] = GenerationAgentLLM().run(job_dir, seeds[:3], "Şehirde devriye gez.",
+                                                   ctx["vision"].get("tags", []), ctx["trend"]["terms"])
+
+    def qc_run():
+        _probe_media.cache_clear()
+        embed_cache.clear()
+        ctx["scores"] = QCAgent().run(job_dir, ctx["variants"], ctx["trend"]["terms"], video)
+
+    return {
+        "ingest": ingest,
+        "detect_scenes": lambda: detect_scenes(video, max_scenes=args.max_scenes),
+        "detect_scenes_fast": lambda: detect_scenes_fast(video, max_scenes=args.max_scenes),
+        "process_video": lambda: process_video(job_dir, video),
+        "transcribe_to_srt": lambda: transcribe_to_srt(job_dir, video, model_name=args.whisper_model,
+                                                       language=args.lang),
+        "vision": vision,
+        "trend_run": trend_run,
+        "generate": generate,
+        "trendfit_score": trendfit_score,
+        "qc_run": qc_run,
+        "finalize_run": lambda: FinalizeAgent().run(job_dir, ctx["variants"], ctx["scores"]),
+    }
+
+
+def _env_info():
+    from app.services.video import FFMPEG
+    try:
+        ff = subprocess.run([FFMPEG, "-version"], capture_output=True, text=True).stdout.splitlines()[0]
+    except Exception:
+        ff = None
+    return {"python": platform.python_version(), "platform": platform.platform(),
+            "machine": platform.machine(), "cpus": os.cpu_count(), "ffmpeg": ff}
+
+
+def compare(results, baseline, threshold: float, min_delta: float):
+    """(profile, stage) başına median karşılaştırması; regresyon listesi döner."""
+    rows, regressions = [], []
+    for prof, stages in results["results"].items():
+        for stage, r in stages.items():
+            b = baseline.get("results", {}).get(prof, {}).get(stage)
+            if not b or "median_s" not in r or "median_s" not in b:
+                continue
+            ratio = r["median_s"] / max(b["median_s"], 1e-9)
+            regressed = ratio > 1 + threshold and r["median_s"] - b["median_s"] > min_delta
+            row = {"profile": prof, "stage": stage, "baseline_s": b["median_s"], "current_s": r["median_s"],
+                   "ratio": round(ratio, 3), "regression": regressed}
+            rows.append(row)
+            if regressed:
+                regressions.append(row)
+    return rows, regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--profiles", default="short,medium", help=f"virgülle: {', '.join(PROFILES)}")
+    ap.add_argument("--stages", default=",".join(STAGES))
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--whisper-model", default="tiny")
+    ap.add_argument("--lang", default="tr")
+    ap.add_argument("--max-scenes", type=int, default=12)
+    ap.add_argument("--latency", type=float, default=0.0, help="stub ağ çağrısı gecikmesi (sn)")
+    ap.add_argument("--work-dir", default=None, help="sentetik klipler + storage (varsayılan: geçici)")
+    ap.add_argument("--out", default=None, help="sonuç JSON dosyası (varsayılan: stdout)")
+    ap.add_argument("--baseline", default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true")
+    ap.add_argument("--threshold", type=float, default=0.25, help="izin verilen göreli yavaşlama")
+    ap.add_argument("--min-delta", type=float, default=0.05, help="bunun altındaki mutlak farklar (sn) yok sayılır")
+    args = ap.parse_args()
+
+    work = args.work_dir or tempfile.mkdtemp(prefix="bench_")
+    _isolate(work)
+    from bench import stubs
+    stubs.install(latency=args.latency)
+    from bench.synthetic import make_assets, clip_name
+
+    wanted = [s for s in args.stages.split(",") if s]
+    results = {"env": _env_info(), "repeat": args.repeat, "whisper_model": args.whisper_model,
+               "profiles": {}, "results": {}}
+    for prof in [p for p in args.profiles.split(",") if p]:
+        spec = PROFILES[prof]
+        assets = make_assets(os.path.join(work, "assets", prof), spec)
+        video = os.path.join(assets, clip_name(spec["duration"], spec["size"], spec["scenes"]))
+        stubs.ASSETS_DIR = assets
+        job_dir = os.path.join(work, "jobs", prof)
+        os.makedirs(os.path.join(job_dir, "results"), exist_ok=True)
+
+        fns = _stage_fns(job_dir, video, args)
+        out = {}
+        done = set()
+        def ensure(stage):
+            # istenmeyen bağımlılıklar ölçülmeden bir kez çalıştırılır
+            for dep in NEEDS.get(stage, []):
+                if dep not in done:
+                    ensure(dep)
+            if stage not in done:
+                if stage in wanted:
+                    out[stage] = _time(fns[stage], args.repeat)
+                else:
+                    fns[stage]()
+                done.add(stage)
+        for stage in STAGES:
+            if stage in wanted:
+                try:
+                    ensure(stage)
+                except Exception as e:
+                    out[stage] = {"error": f"{type(e).__name__}: {e}"}
+                    done.add(stage)
+                print(f"[{prof}] {stage}: {out[stage].get('median_s', out[stage].get('error'))}", file=sys.stderr)
+        results["profiles"][prof] = spec
+        results["results"][prof] = out
+
+    if os.path.isfile(args.baseline) and not args.save_baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows, regressions = compare(results, baseline, args.threshold, args.min_delta)
+        results["comparison"] = {"baseline": args.baseline, "threshold": args.threshold,
+                                 "min_delta": args.min_delta, "rows": rows,
+                                 "regressions": len(regressions)}
+        if baseline.get("env", {}).get("platform") != results["env"]["platform"]:
+            print("uyarı: baseline farklı bir makinede alınmış", file=sys.stderr)
+    else:
+        regressions = []
+
+    text = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"baseline yazıldı: {args.baseline}", file=sys.stderr)
+
+    for r in regressions:
+        print(f"REGRESSION {r['profile']}/{r['stage']}: {r['baseline_s']}s -> {r['current_s']}s (x{r['ratio']})",
+              file=sys.stderr)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
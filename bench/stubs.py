@@ -0,0 +1,145 @@
+# bench/stubs.py
+"""
+Benchmark'ların ağ/anahtar olmadan çalışması için dış servis taklitleri:
+gdown (yerel klasörden kopyalar), google.generativeai (deterministik JSON
+varyantları, akış destekli) ve pytrends.request.TrendReq (sabit related
+queries). install() app modülleri import edilmeden ÖNCE çağrılmalı.
+"""
+import os, re, shutil, sys, time, types
+from collections import namedtuple
+from typing import Dict, List, Optional
+
+# gdown.download_folder bu klasörü "indirir"
+ASSETS_DIR: Optional[str] = None
+LATENCY = 0.0   # her sahte ağ çağrısına eklenen gecikme (sn)
+
+
+def _sleep():
+    if LATENCY > 0:
+        time.sleep(LATENCY)
+
+
+# ---- gdown ----------------------------------------------------------------------
+# file id = ASSETS_DIR içindeki dosya adı
+# gdown 6.x ile aynı imza ve kayıt alanları (sürüm bilgisi yok)
+_DriveFile = namedtuple("GoogleDriveFileToDownload", ["id", "path", "local_path"])
+
+def _download_folder(url=None, id=None, output=None, quiet=False, proxy=None, speed=None, use_cookies=True,
+                     verify=True, user_agent=None, skip_download=False, resume=False, cookies_file=None,
+                     timeout=None, retries=0):
+    _sleep()
+    if not ASSETS_DIR or not output:
+        return []
+    out = []
+    for fn in sorted(os.listdir(ASSETS_DIR)):
+        src = os.path.join(ASSETS_DIR, fn)
+        if os.path.isfile(src):
+            dst = os.path.join(output, fn)
+            if not skip_download:
+                os.makedirs(output, exist_ok=True)
+                shutil.copyfile(src, dst)
+            out.append(_DriveFile(fn, fn, dst))
+    return out if skip_download else [f.local_path for f in out]
+
+def _download(url=None, output=None, quiet=False, use_cookies=True, **kwargs):
+    _sleep()
+    file_id = re.split(r"[=/]", url or "")[-1]
+    src = os.path.join(ASSETS_DIR or "", file_id)
+    if not os.path.isfile(src):
+        return None
+    shutil.copyfile(src, output)
+    return output
+
+
+# ---- google.generativeai ----------------------------------------------------------
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class GenerativeModel:
+    def __init__(self, model_name: str = "stub", **kwargs):
+        self.model_name = model_name
+
+    @staticmethod
+    def _answer(prompt: str) -> str:
+        ids = list(dict.fromkeys(re.findall(r'"id"\s*:\s*"(v\d+)"', prompt))) or ["v1", "v2", "v3"]
+        items = []
+        for i, vid in enumerate(ids, start=1):
+            items.append('{"id": "%s", "caption": "Devriyeye çık, suçluları yakala! Şehrin kahramanı ol %d. '
+                         'Hemen indir ve kovalamacaya katıl.", "hashtags": ["#polis", "#oyun", "#devriye", '
+                         '"#mobilgame", "#kovalamaca", "#trend%d"]}' % (vid, i, i))
+        return '{"variants": [' + ", ".join(items) + "]}"
+
+    def generate_content(self, prompt, stream: bool = False, generation_config=None, **kwargs):
+        _sleep()
+        text = self._answer(str(prompt))
+        if not stream:
+            return _Response(text)
+        step = max(1, len(text) // 8)
+        return iter([_Response(text[i:i + step]) for i in range(0, len(text), step)])
+
+
+def _configure(**kwargs):
+    return None
+
+
+# ---- pytrends ------------------------------------------------------------------------
+class _Frame:
+    """DataFrame yerine: yalnızca iterrows() (satırlar dict, row.get çalışır)."""
+
+    def __init__(self, rows: List[Dict]):
+        self.rows = rows
+
+    def iterrows(self):
+        return iter(enumerate(self.rows))
+
+
+class TrendReq:
+    def __init__(self, hl: str = "tr-TR", tz: int = 180, **kwargs):
+        self.kw: List[str] = []
+
+    def build_payload(self, kw_list, timeframe=None, geo=None, **kwargs):
+        self.kw = list(kw_list)
+
+    def related_queries(self):
+        _sleep()
+        out = {}
+        for kw in self.kw:
+            base = kw.split()[0].lower() if kw.split() else "oyun"
+            rows = [{"query": f"{base} {s}", "value": 100 - 10 * i}
+                    for i, s in enumerate(["oyunu", "indir", "mobil", "hile", "simulator", "yeni"])]
+            out[kw] = {"top": _Frame(rows), "rising": None}
+        return out
+
+
+def install(assets_dir: Optional[str] = None, latency: float = 0.0) -> None:
+    global ASSETS_DIR, LATENCY
+    ASSETS_DIR, LATENCY = assets_dir, latency
+    os.environ.setdefault("GEMINI_API_KEY", "bench-stub")
+    # drive._probe'un HEAD isteği ağa çıkmasın (bilinmeyen şema -> sürüm yok, dosya indirilir)
+    os.environ.setdefault("DRIVE_URL_TEMPLATE", "stub://{id}")
+
+    gdown = types.ModuleType("gdown")
+    gdown.download_folder = _download_folder
+    gdown.download = _download
+    sys.modules["gdown"] = gdown
+
+    try:
+        import google
+    except ImportError:
+        google = types.ModuleType("google")
+        google.__path__ = []
+        sys.modules["google"] = google
+    genai = types.ModuleType("google.generativeai")
+    genai.configure = _configure
+    genai.GenerativeModel = GenerativeModel
+    google.generativeai = genai
+    sys.modules["google.generativeai"] = genai
+
+    pytrends = types.ModuleType("pytrends")
+    request = types.ModuleType("pytrends.request")
+    request.TrendReq = TrendReq
+    pytrends.request = request
+    sys.modules["pytrends"] = pytrends
+    sys.modules["pytrends.request"] = request
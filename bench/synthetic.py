@@ -0,0 +1,58 @@
+# bench/synthetic.py
+"""
+ffmpeg lavfi kaynaklarıyla sentetik test videoları: istenen süre, çözünürlük
+ve sahne sayısı. Her sahne farklı bir kaynak/renk tonuyla üretilir, böylece
+sahne dedektörleri kesimleri görebilir; ses sahne başına frekansı değişen sinüs
++ hafif gürültüdür.
+"""
+import os, subprocess
+from typing import Dict, List
+
+from app.services.video import FFMPEG
+
+_SOURCES = ["testsrc2", "smptebars", "rgbtestsrc", "testsrc"]
+
+
+def clip_name(duration: float, size: str, scenes: int) -> str:
+    return f"clip_{int(duration)}s_{size}_{scenes}sc.mp4"
+
+
+def make_clip(out_dir: str, duration: float = 10.0, size: str = "640x360", scenes: int = 3,
+              fps: int = 25, audio: bool = True) -> str:
+    """Videoyu out_dir altına yazar (varsa yeniden üretmez) ve yolunu döndürür."""
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, clip_name(duration, size, scenes))
+    if os.path.isfile(path):
+        return path
+
+    scenes = max(1, scenes)
+    seg = duration / scenes
+    args: List[str] = [FFMPEG, "-y", "-v", "error"]
+    chains: List[str] = []
+    for i in range(scenes):
+        src = _SOURCES[i % len(_SOURCES)]
+        args += ["-f", "lavfi", "-i", f"{src}=s={size}:r={fps}:d={seg:.3f}"]
+        # aynı kaynak tekrar ederse renk tonu kaydırılır -> yine belirgin kesim
+        chains.append(f"[{i}:v]hue=h={(i * 137) % 360},format=yuv420p,setsar=1[v{i}]")
+    if audio:
+        for i in range(scenes):
+            args += ["-f", "lavfi", "-i", f"sine=frequency={220 + 110 * i}:sample_rate=44100:duration={seg:.3f}"]
+    filt = ";".join(chains) + ";" + "".join(f"[v{i}]" for i in range(scenes)) + f"concat=n={scenes}:v=1:a=0[v]"
+    maps = ["-map", "[v]"]
+    if audio:
+        filt += ";" + "".join(f"[{scenes + i}:a]" for i in range(scenes)) + f"concat=n={scenes}:v=0:a=1[a]"
+        maps += ["-map", "[a]", "-c:a", "aac"]
+    args += ["-filter_complex", filt, *maps, "-c:v", "libx264", "-preset", "veryfast", "-pix_fmt", "yuv420p", path]
+    subprocess.run(args, check=True)
+    return path
+
+
+def make_assets(out_dir: str, profile: Dict) -> str:
+    """Drive klasörü taklidi: video + aso_keywords.txt + description.txt."""
+    os.makedirs(out_dir, exist_ok=True)
+    make_clip(out_dir, profile["duration"], profile["size"], profile["scenes"])
+    with open(os.path.join(out_dir, "aso_keywords.txt"), "w", encoding="utf-8") as f:
+        f.write("polis oyunu\ndevriye\nsuçlu yakalama\naraç kovalamaca\n")
+    with open(os.path.join(out_dir, "description.txt"), "w", encoding="utf-8") as f:
+        f.write("Şehirde devriye gez, suçluları yakala ve kovalamacalarda hızını göster.")
+    return out_dir
@@ -0,0 +1,28 @@
+# tests/test_analysis_cache.py
+import multiprocessing as mp
+import time
+
+import pytest
+
+pytest.importorskip("fcntl")
+
+from app.services.analysis_cache import AnalysisCache
+
+
+def _hold(root, q):
+    with AnalysisCache(root).claim("k"):
+        q.put(("in", time.time()))
+        time.sleep(0.3)
+        q.put(("out", time.time()))
+
+
+def test_claim_serializes_across_processes(tmp_path):
+    ctx = mp.get_context("spawn")   # video worker'ları gibi
+    q = ctx.Queue()
+    procs = [ctx.Process(target=_hold, args=(str(tmp_path), q)) for _ in range(2)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+    events = sorted((q.get(timeout=5) for _ in range(4)), key=lambda e: e[1])
+    assert [kind for kind, _ in events] == ["in", "out", "in", "out"]
@@ -0,0 +1,76 @@
+# tests/test_bundle.py
+import io, os, time, zipfile
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("httpx")
+
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app.services.bundle import BundleCache, bundle_members, stream_zip
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    results = tmp_path / "storage" / "j1" / "results"
+    (results / "frames").mkdir(parents=True)
+    (results / "captions.json").write_text('{"variants": []}', encoding="utf-8")
+    (results / "hashtags.txt").write_text("#polis #oyun\n" * 200, encoding="utf-8")
+    (results / "frames" / "scene_01.jpg").write_bytes(os.urandom(5000))
+    monkeypatch.setattr(main, "STORAGE", str(tmp_path / "storage"))
+    monkeypatch.setattr(main, "bundle_cache", BundleCache(str(tmp_path / "bundles")))
+    c = TestClient(main.app)
+    full = c.get("/jobs/j1/bundle")
+    assert full.status_code == 200
+    return c, full.content, full.headers["etag"], results
+
+
+def test_rebuilt_bundle_is_byte_identical(client):
+    _, body, _, results = client
+    items = bundle_members(str(results))
+    for fp, _ in items:   # içerik aynı, mtime farklı
+        os.utime(fp, (time.time() + 3600, time.time() + 3600))
+    assert b"".join(stream_zip(items)) == body
+    assert zipfile.ZipFile(io.BytesIO(body)).getinfo("hashtags.txt").date_time == (1980, 1, 1, 0, 0, 0)
+
+
+def test_if_none_match_returns_304(client):
+    c, _, etag, _ = client
+    r = c.get("/jobs/j1/bundle", headers={"If-None-Match": etag})
+    assert r.status_code == 304 and r.headers["etag"] == etag and not r.content
+
+
+@pytest.mark.parametrize("rng, start, end", [
+    ("bytes=0-99", 0, 99),      # geçerli
+    ("bytes=100-", 100, None),  # açık uçlu
+    ("bytes=-50", -50, None),   # son n bayt
+])
+def test_range(client, rng, start, end):
+    c, body, etag, _ = client
+    r = c.get("/jobs/j1/bundle", headers={"Range": rng, "If-Range": etag})
+    want = body[start:end + 1] if end is not None else body[start:]
+    assert r.status_code == 206
+    assert r.content == want
+    first = start if start >= 0 else len(body) + start
+    assert r.headers["content-range"] == f"bytes {first}-{first + len(want) - 1}/{len(body)}"
+
+
+def test_unsatisfiable_range_is_416(client):
+    c, body, _, _ = client
+    r = c.get("/jobs/j1/bundle", headers={"Range": f"bytes={len(body)}-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{len(body)}"
+
+
+def test_multi_range_gets_whole_bundle(client):
+    c, body, _, _ = client
+    r = c.get("/jobs/j1/bundle", headers={"Range": "bytes=0-9,20-29"})
+    assert r.status_code == 200 and r.content == body
+
+
+def test_if_range_mismatch_gets_whole_bundle(client):
+    c, body, _, _ = client
+    r = c.get("/jobs/j1/bundle", headers={"Range": "bytes=0-99", "If-Range": '"eski-paket"'})
+    assert r.status_code == 200 and r.content == body
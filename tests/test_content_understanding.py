@@ -0,0 +1,41 @@
+# tests/test_content_understanding.py
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("PIL")
+
+from app.agents import content_understanding_agent as cu
+from app.services.analysis_cache import AnalysisCache
+
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.setattr(cu, "analysis_cache", AnalysisCache(str(tmp_path / "cache")))
+    calls = []
+
+    def analyze(self, job_dir, video_path, whisper_model, lang):
+        calls.append(job_dir)
+        return {"scenes": [], "srt_path": None,
+                "vision": {"frames": [], "captions": [], "tags": [], "caption_failed": self.failed}}
+
+    monkeypatch.setattr(cu.ContentUnderstandingAgent, "_analyze", analyze)
+    video = tmp_path / "gameplay.mp4"
+    video.write_bytes(b"\0" * 64)
+    a = cu.ContentUnderstandingAgent()
+    return a, str(video), calls
+
+
+def test_failed_captions_are_not_cached(agent, tmp_path):
+    a, video, calls = agent
+    a.failed = 4   # ör. generate OOM: hiçbir kare caption almadı
+    assert a.run(str(tmp_path / "j1"), video)["cache"]["hit"] is False
+    assert a.run(str(tmp_path / "j2"), video)["cache"]["hit"] is False
+    assert len(calls) == 2
+
+
+def test_complete_analysis_is_cached(agent, tmp_path):
+    a, video, calls = agent
+    a.failed = 0
+    a.run(str(tmp_path / "j1"), video)
+    assert a.run(str(tmp_path / "j2"), video)["cache"]["hit"] is True
+    assert len(calls) == 1
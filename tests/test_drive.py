@@ -0,0 +1,123 @@
+# tests/test_drive.py
+import functools, inspect, os, threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+gdown = pytest.importorskip("gdown")
+
+from gdown.download import GoogleDriveFileToDownload
+
+from app.services import drive
+
+
+def _listing(names):
+    """gdown 6.x download_folder ile aynı imza; skip_download=True'da yalnızca listeler."""
+    def download_folder(url=None, id=None, output=None, quiet=False, proxy=None, speed=None, use_cookies=True,
+                        verify=True, user_agent=None, skip_download=False, resume=False, cookies_file=None,
+                        timeout=None, retries=0):
+        assert skip_download, "list_folder indirmemeli"
+        return [GoogleDriveFileToDownload(id=fn, path=fn, local_path=os.path.join(output, fn)) for fn in names()]
+    return download_folder
+
+
+class _Handler(SimpleHTTPRequestHandler):
+    requests = []
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        _Handler.requests.append(("GET", self.path))
+        super().do_GET()
+
+    def do_HEAD(self):
+        _Handler.requests.append(("HEAD", self.path))
+        super().do_HEAD()
+
+
+@pytest.fixture
+def remote(tmp_path, monkeypatch):
+    """Yerel HTTP sunucusu Drive'ın yerine: file id = src/ içindeki dosya adı."""
+    src = tmp_path / "src"
+    src.mkdir()
+    (src / "gameplay.mp4").write_bytes(os.urandom(4096))
+    (src / "aso_keywords.txt").write_text("polis\ndevriye\n", encoding="utf-8")
+    (src / "notes.pdf").write_bytes(b"%PDF")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_Handler, directory=str(src)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    _Handler.requests = []
+
+    monkeypatch.setattr(drive, "DRIVE_URL_TEMPLATE", f"http://127.0.0.1:{server.server_port}/{{id}}")
+    monkeypatch.setattr(drive, "_store", drive.AssetStore(str(tmp_path / "store")))
+    monkeypatch.setattr(gdown, "download_folder", _listing(lambda: sorted(os.listdir(src))))
+    yield src
+    server.shutdown()
+
+
+def _gets(name):
+    return [p for m, p in _Handler.requests if m == "GET" and p == f"/{name}"]
+
+
+def test_download_filters_and_renames_parts(remote, tmp_path, monkeypatch):
+    import gdown
+    outputs = []
+    real = gdown.download
+    monkeypatch.setattr(gdown, "download", lambda url, output, **kw: outputs.append(output) or real(url, output, **kw))
+    dest = tmp_path / "j1" / "assets"
+    stats = drive.download_folder("folder", str(dest))
+    assert stats == {"listed": 3, "skipped": 1, "linked": 0, "downloaded": 2, "errors": 0}
+    assert sorted(os.listdir(dest)) == ["aso_keywords.txt", "gameplay.mp4"]   # .part kalmadı, pdf alınmadı
+    assert (dest / "gameplay.mp4").read_bytes() == (remote / "gameplay.mp4").read_bytes()
+    assert sorted(outputs) == [str(dest / "aso_keywords.txt.part"), str(dest / "gameplay.mp4.part")]
+
+
+def test_second_job_links_media_and_refetches_text(remote, tmp_path):
+    drive.download_folder("folder", str(tmp_path / "j1" / "assets"))
+    (remote / "aso_keywords.txt").write_text("polis\nkovalamaca\n", encoding="utf-8")
+    dest = tmp_path / "j2" / "assets"
+
+    stats = drive.download_folder("folder", str(dest))
+    assert stats["linked"] == 1 and stats["downloaded"] == 1
+    assert len(_gets("gameplay.mp4")) == 1
+    assert os.path.samefile(dest / "gameplay.mp4", tmp_path / "j1" / "assets" / "gameplay.mp4")
+    assert (dest / "aso_keywords.txt").read_text(encoding="utf-8") == "polis\nkovalamaca\n"
+    assert os.stat(dest / "aso_keywords.txt").st_nlink == 1
+
+
+def test_changed_media_is_downloaded_again(remote, tmp_path):
+    drive.download_folder("folder", str(tmp_path / "j1" / "assets"))
+    (remote / "gameplay.mp4").write_bytes(os.urandom(8192))   # aynı id, yeni sürüm
+    dest = tmp_path / "j2" / "assets"
+
+    stats = drive.download_folder("folder", str(dest))
+    assert stats["linked"] == 0 and stats["downloaded"] == 2
+    assert (dest / "gameplay.mp4").read_bytes() == (remote / "gameplay.mp4").read_bytes()
+
+
+def test_listing_stub_matches_installed_gdown():
+    real = inspect.signature(gdown.download_folder).parameters
+    assert list(inspect.signature(_listing(list)).parameters) == list(real)
+    assert "remaining_ok" not in real
+
+
+def test_list_folder_uses_real_gdown_records(tmp_path, monkeypatch):
+    monkeypatch.setattr(gdown, "download_folder", _listing(lambda: ["a.mp4", "sub/b.txt"]))
+    assert drive.list_folder("folder", str(tmp_path)) == [("a.mp4", "a.mp4"), ("sub/b.txt", os.path.join("sub", "b.txt"))]
+
+
+def test_old_gdown_falls_back_to_full_download(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setattr(gdown, "download_folder", lambda url=None, output=None, quiet=False, use_cookies=True:
+                        calls.append((url, output)))
+    assert drive.download_folder("folder", str(tmp_path)) == {"legacy": True}
+    assert calls == [("folder", str(tmp_path))]
+
+
+def test_failed_download_leaves_no_part_file(remote, tmp_path, monkeypatch):
+    monkeypatch.setattr(gdown, "download_folder", _listing(lambda: ["missing.mp4"]))
+    dest = tmp_path / "j1" / "assets"
+    stats = drive.download_folder("folder", str(dest))
+    assert stats["errors"] == 1
+    assert os.listdir(dest) == []
@@ -0,0 +1,63 @@
+# tests/test_embed_cache.py
+import json
+import multiprocessing as mp
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from app.services.embed_cache import _DiskStore
+
+DIM = 8
+
+
+def _vec(i):
+    return np.full(DIM, float(i), dtype="float32")
+
+
+def _writer(root, start, q):
+    store = _DiskStore(root, "m")
+    for i in range(start, start + 50):
+        store.add([f"k{i}"], _vec(i)[None, :])
+    q.put(start)
+
+
+def test_two_processes_share_one_store(tmp_path):
+    ctx = mp.get_context("spawn")
+    q = ctx.Queue()
+    procs = [ctx.Process(target=_writer, args=(str(tmp_path), start, q)) for start in (0, 1000)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(60)
+    assert sorted(q.get(timeout=5) for _ in procs) == [0, 1000]
+
+    store = _DiskStore(str(tmp_path), "m")
+    assert len(store.rows) == 100
+    for i in [*range(50), *range(1000, 1050)]:
+        assert (store.get(f"k{i}") == _vec(i)).all()
+
+
+def test_crash_before_index_write(tmp_path):
+    store = _DiskStore(str(tmp_path), "m")
+    store.add(["a", "b"], np.stack([_vec(1), _vec(2)]))
+    with open(store.vec_path, "ab") as f:   # vektör yazıldı, index.json yazılamadan çöktü
+        f.write(_vec(99).tobytes() + b"\0\0")
+
+    store = _DiskStore(str(tmp_path), "m")
+    assert store.get("c") is None
+    store.add(["c"], _vec(3)[None, :])
+    store = _DiskStore(str(tmp_path), "m")
+    assert [float(store.get(k)[0]) for k in "abc"] == [1.0, 2.0, 3.0]
+
+
+def test_index_rows_past_end_are_dropped(tmp_path):
+    store = _DiskStore(str(tmp_path), "m")
+    store.add(["a"], _vec(1)[None, :])
+    with open(store.idx_path, "w", encoding="utf-8") as f:   # index yeni, vektör dosyası kısa kalmış
+        json.dump({"dim": DIM, "rows": {"a": 0, "b": 1}}, f)
+
+    store = _DiskStore(str(tmp_path), "m")
+    assert store.get("b") is None
+    store.add(["b"], _vec(2)[None, :])
+    assert float(store.get("b")[0]) == 2.0 and float(store.get("a")[0]) == 1.0
@@ -0,0 +1,31 @@
+# tests/test_events.py
+import asyncio, threading, time
+
+from app.services.events import EventBus
+
+
+def _collect(bus, job_id, keepalive=0.05):
+    async def run():
+        return [ev async for ev in bus.stream(job_id, 0, keepalive=keepalive)]
+    return asyncio.run(run())
+
+
+def test_stream_wakes_on_publish_from_thread():
+    bus = EventBus()
+    bus.publish("j", "status", {"status": "running"})
+
+    def worker():
+        time.sleep(0.1)
+        bus.publish("j", "variant", {"id": "v1"})
+        bus.publish("j", "status", {"status": "finished"}, final=True)
+
+    threading.Thread(target=worker).start()
+    events = [ev for ev in _collect(bus, "j") if ev is not None]
+    assert [kind for _, kind, _ in events] == ["status", "variant", "status"]
+    assert bus._waiters == {}
+
+
+def test_stream_closes_for_unknown_job():
+    bus = EventBus()
+    assert not bus.has("missing")
+    assert _collect(bus, "missing") == []
@@ -0,0 +1,66 @@
+# tests/test_flow_revision.py
+import json, sys, types
+
+import pytest
+
+pytest.importorskip("langgraph")
+pytest.importorskip("pydantic")
+
+from app.graph import flow
+
+
+class _FakeGenerator:
+    calls = {"run": 0, "revise": 0}
+
+    def run(self, job_dir, aso, desc, tags, trends, critique=None, fresh=False, on_variant=None):
+        self.calls["run"] += 1
+        return {"variants": [{"id": "v1", "caption": "ilk tur", "hashtags": []}]}
+
+    def revise(self, *args, **kwargs):
+        self.calls["revise"] += 1
+        raise TimeoutError("gemini timeout")
+
+
+class _LowQC:
+    def run(self, job_dir, variants, trend_terms, video_path, known=None, video_by_id=None):
+        return {v["id"]: {"total": 10.0, "trendfit": 0.0} for v in variants["variants"]}
+
+
+@pytest.fixture
+def job(tmp_path, monkeypatch):
+    (tmp_path / "meta.json").write_text(json.dumps({"aso_keywords": [], "description": ""}), encoding="utf-8")
+    _FakeGenerator.calls.update(run=0, revise=0)
+    gen = types.ModuleType("app.agents.generation_agent_llm")
+    gen.GenerationAgentLLM = _FakeGenerator
+    qc = types.ModuleType("app.agents.qc_agent")
+    qc.QCAgent = _LowQC
+    monkeypatch.setitem(sys.modules, "app.agents.generation_agent_llm", gen)
+    monkeypatch.setitem(sys.modules, "app.agents.qc_agent", qc)
+    monkeypatch.setattr(flow, "GEN_STREAM", False)
+    return tmp_path
+
+
+def _state(job_dir, **kw):
+    return flow.FlowState(job_id="t", job_dir=str(job_dir), video_path="none.mp4", **kw)
+
+
+def test_failed_revision_consumes_budget(job):
+    state = _state(job, need_revision=True, failing=["v1"],
+                   variants={"variants": [{"id": "v1", "caption": "ilk tur", "hashtags": []}]})
+    out = flow.node_generate(state)
+    assert out["revision_count"] == 1
+    assert out["need_revision"] is False
+    assert out["errors"] and out["errors"][0].startswith("[generate_llm]")
+
+
+def test_failed_revision_reaches_finalize(job, monkeypatch):
+    finalized = []
+    monkeypatch.setattr(flow, "node_content_understanding", lambda s: {})
+    monkeypatch.setattr(flow, "node_trend", lambda s: {})
+    monkeypatch.setattr(flow, "node_trend_enrich", lambda s: {})
+    monkeypatch.setattr(flow, "node_finalize", lambda s: finalized.append(s.variants) or {})
+
+    final = flow.build_graph().invoke(_state(job))
+    assert _FakeGenerator.calls == {"run": 1, "revise": 1}
+    assert finalized == [{"variants": [{"id": "v1", "caption": "ilk tur", "hashtags": []}]}]
+    assert final["revision_count"] == 1
@@ -0,0 +1,48 @@
+# tests/test_generation_stream.py
+import json
+
+import pytest
+
+pytest.importorskip("dotenv")
+pytest.importorskip("google.generativeai")
+
+from app.agents.generation_agent_llm import VariantStreamParser
+
+VARIANTS = [
+    {"id": "v1", "caption": 'Polis "devriye" başladı {kovalamaca} [gece]', "hashtags": ["#polis", "#oyun"]},
+    {"id": "v2", "caption": "Ters bölü \\ ve kapanış } içeride", "hashtags": ["#mobil"]},
+    {"id": "v3", "caption": "Üçüncü varyant", "hashtags": ["#simulator", "#yeni"]},
+]
+RAW = "Elbette! İşte varyantlar:\n```json\n" + json.dumps({"variants": VARIANTS}, ensure_ascii=False, indent=2) + "\n```\n"
+
+
+def _feed(text, size):
+    parser, out = VariantStreamParser(), []
+    for i in range(0, len(text), size):
+        out.append(parser.feed(text[i:i + size]))
+    return out
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(RAW)])
+def test_variants_survive_any_chunking(size):
+    got = [v for batch in _feed(RAW, size) for v in batch]
+    assert got == VARIANTS
+
+
+def test_variant_is_emitted_as_soon_as_it_closes():
+    batches = _feed(RAW, 1)
+    closes = [i for i, b in enumerate(batches) if b]
+    assert len(closes) == 3
+    # ilk varyant ikinci başlamadan önce verilir
+    assert closes[0] < RAW.index('"v2"')
+
+
+def test_truncated_stream_keeps_only_complete_variants():
+    cut = RAW.index('"v3"') + 10
+    got = [v for batch in _feed(RAW[:cut], 5) for v in batch]
+    assert [v["id"] for v in got] == ["v1", "v2"]
+
+
+def test_invalid_variants_are_skipped():
+    raw = json.dumps({"variants": [{"id": "x", "caption": "etiketsiz", "hashtags": []}, VARIANTS[0]]})
+    assert [v["id"] for b in _feed(raw, 4) for v in b] == ["v1"]
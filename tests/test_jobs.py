@@ -0,0 +1,52 @@
+# tests/test_jobs.py
+import json
+
+import pytest
+
+pytest.importorskip("dotenv")
+
+from app.services import jobs as jobs_mod
+from app.services.job_index import JobIndex
+from app.services.jobs import INTERRUPTED, JobQueue, read_status
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    idx = JobIndex(str(tmp_path / "_jobs.sqlite3"))
+    monkeypatch.setattr(jobs_mod, "job_index", lambda: idx)
+    return idx
+
+
+def _job(storage, job_id, status):
+    job_dir = storage / job_id
+    job_dir.mkdir(parents=True)
+    st = {"job_id": job_id, "status": status, "node": "content_understanding", "error": None,
+          "queued_at": 1.0, "started_at": 2.0, "finished_at": None, "updated_at": 2.0, "nodes": []}
+    (job_dir / "status.json").write_text(json.dumps(st), encoding="utf-8")
+    return job_dir
+
+
+def test_recover_fails_jobs_left_active(tmp_path, index):
+    storage = tmp_path / "storage"
+    running = _job(storage, "a", "running")
+    queued = _job(storage, "b", "queued")
+    done = _job(storage, "c", "finished")
+    index.upsert("d", status="running")   # dizini silinmiş, yalnızca indekste
+
+    assert JobQueue(workers=1).recover(str(storage)) == 3
+
+    for job_dir in (running, queued):
+        st = read_status(str(job_dir))
+        assert st["status"] == "failed" and st["error"] == INTERRUPTED and st["finished_at"]
+    assert read_status(str(done))["status"] == "finished"
+    assert index.list(status="queued,running")["total"] == 0
+    assert index.get("a")["error"] == INTERRUPTED
+    assert index.get("d")["status"] == "failed"
+
+
+def test_index_status_filter_strips_values(index):
+    index.upsert("a", status="finished")
+    index.upsert("b", status="failed")
+    index.upsert("c", status="running")
+    got = index.list(status="finished, failed")
+    assert {r["job_id"] for r in got["items"]} == {"a", "b"}
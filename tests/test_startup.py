@@ -0,0 +1,20 @@
+# tests/test_startup.py
+import os, statistics
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from bench.bench_startup import HEAVY, probe
+
+STARTUP_BUDGET_S = float(os.getenv("STARTUP_BUDGET_S", "1.0"))
+MODULES = sorted({"torch", "whisper", "transformers", "sentence_transformers", "scenedetect", *HEAVY})
+
+
+def test_import_app_main_stays_light():
+    """Temiz yorumlayıcıda `import app.main`: ağır modeller yüklenmez, süre bütçede kalır."""
+    runs = [probe(MODULES) for _ in range(3)]
+    loaded = sorted({m for r in runs for m in r["loaded"]})
+    assert loaded == [], f"startup'ta yüklenen ağır modüller: {loaded}"
+    median = statistics.median(r["seconds"] for r in runs)
+    assert median <= STARTUP_BUDGET_S, f"import app.main {median:.3f}s > bütçe {STARTUP_BUDGET_S}s"
@@ -0,0 +1,58 @@
+# tests/test_video_scenes.py
+import io
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("dotenv")
+
+from app.services import video
+
+FPS, H, W = 4.0, 36, 64
+
+
+def _gray(levels, per=8):
+    """Her gri seviye bir sahne: per kare (per / FPS sn)."""
+    return np.concatenate([np.full((per, H, W), lv, dtype=np.uint8) for lv in levels])
+
+
+def test_gray_cuts_across_chunk_boundaries():
+    frames = _gray([0, 100, 200, 50])
+    chunks = [frames[i:i + 5] for i in range(0, len(frames), 5)]
+    cuts, seen = video._gray_cuts(iter(chunks), FPS, threshold=25, min_gap=0.5, max_cuts=10)
+    assert cuts == [2.0, 4.0, 6.0] and seen == 32
+
+
+class _Proc:
+    def __init__(self, data):
+        self.stdout = io.BytesIO(data)
+
+    def poll(self):
+        return None
+
+    def kill(self):
+        pass
+
+    def wait(self):
+        return 0
+
+
+@pytest.fixture
+def fake_ffmpeg(monkeypatch):
+    def install(frames, duration):
+        monkeypatch.setattr(video, "ffprobe_duration", lambda p: duration)
+        monkeypatch.setattr(video, "ffprobe_fps", lambda p: 30.0)
+        monkeypatch.setattr(video.subprocess, "Popen", lambda *a, **kw: _Proc(frames.tobytes()))
+    return install
+
+
+def test_last_scene_closes_at_duration_when_max_scenes_reached(fake_ffmpeg):
+    fake_ffmpeg(_gray([0, 100, 200, 50, 150, 250]), duration=12.0)
+    scenes = video.detect_scenes_fast("x.mp4", max_scenes=3, fps_cap=FPS, size=(W, H), chunk=4)
+    assert scenes == [{"start": 0.0, "end": 2.0}, {"start": 2.0, "end": 4.0}, {"start": 4.0, "end": 12.0}]
+
+
+def test_all_scenes_when_under_max(fake_ffmpeg):
+    fake_ffmpeg(_gray([0, 100, 200]), duration=6.0)
+    scenes = video.detect_scenes_fast("x.mp4", max_scenes=10, fps_cap=FPS, size=(W, H))
+    assert [s["end"] for s in scenes] == [2.0, 4.0, 6.0]